@@ -0,0 +1,289 @@
+"""Benchmark cases for the storage hot paths.
+
+Each case factory receives a private working directory and returns the operation
+that is timed; setup done in the factory is excluded from the measurement.
+Payloads come from fixed seeds so runs are comparable across machines.
+
+Service modules are imported by their bare names, the way ``server`` imports its
+siblings, so a case and the app share one copy of each module. The backup
+modules are the exception: ``backup_service`` imports ``backup_backends``
+package-relative, so both load as ``src.*`` and no bare import of them exists.
+``run.py`` refuses to report if any module ends up loaded under both names.
+"""
+
+from __future__ import annotations
+
+import base64
+import itertools
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from harness import service_environment
+
+
+Operation = Callable[[], Any]
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    factory: Callable[[Path], Operation]
+    iterations: int
+    warmup: int = 5
+
+
+CASES: list[Case] = []
+
+
+def case(name: str, iterations: int = 200, warmup: int = 5):
+    def register(factory: Callable[[Path], Operation]) -> Callable[[Path], Operation]:
+        CASES.append(Case(name, factory, iterations, warmup))
+        return factory
+    return register
+
+
+def payload(size: int, seed: int = 7) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+_CLIENT: Any = None
+
+
+def _service(workdir: Path) -> Any:
+    """Build one in-process client for the FastAPI app against a private SQLite database."""
+    global _CLIENT
+    if _CLIENT is None:
+        service_environment(workdir / "service")
+        from fastapi.testclient import TestClient
+        from server import app
+
+        _CLIENT = TestClient(app)
+    return _CLIENT
+
+
+@case("kv.put")
+def kv_put(workdir: Path) -> Operation:
+    client, keys = _service(workdir), itertools.count()
+    return lambda: client.put(f"/kv/bench/key-{next(keys)}", json={"value": {"n": 1}}).raise_for_status()
+
+
+@case("kv.get")
+def kv_get(workdir: Path) -> Operation:
+    client = _service(workdir)
+    client.put("/kv/bench/hot", json={"value": {"n": 1}}).raise_for_status()
+    return lambda: client.get("/kv/bench/hot").raise_for_status()
+
+
+@case("memory.put")
+def memory_put(workdir: Path) -> Operation:
+    client, sessions = _service(workdir), itertools.count()
+    body = {"person_id": "bench-person", "data": {"turns": ["hello"] * 8}}
+    return lambda: client.post("/memory", json={**body, "session_id": f"s-{next(sessions)}"}).raise_for_status()
+
+
+@case("memory.get")
+def memory_get(workdir: Path) -> Operation:
+    client = _service(workdir)
+    client.post("/memory", json={"session_id": "hot", "data": {"turns": ["hello"] * 8}}).raise_for_status()
+    return lambda: client.get("/memory/hot").raise_for_status()
+
+
+def _object_cases(size: int, label: str) -> None:
+    encoded = base64.b64encode(payload(size)).decode()
+
+    @case(f"object.put.{label}", iterations=100)
+    def object_put(workdir: Path) -> Operation:
+        client, ids = _service(workdir), itertools.count()
+        return lambda: client.post("/objects", json={
+            "id": f"put-{label}-{next(ids)}", "content_b64": encoded,
+        }).raise_for_status()
+
+    @case(f"object.get.{label}", iterations=100)
+    def object_get(workdir: Path) -> Operation:
+        client = _service(workdir)
+        client.post("/objects", json={"id": f"get-{label}", "content_b64": encoded}).raise_for_status()
+        return lambda: client.get(f"/objects/get-{label}").raise_for_status()
+
+
+for _size, _label in ((1024, "1k"), (64 * 1024, "64k"), (1024 * 1024, "1m")):
+    _object_cases(_size, _label)
+
+
+@case("sources.ingest", iterations=100)
+def sources_ingest(workdir: Path) -> Operation:
+    from cryptography.fernet import Fernet
+    from life_operations import SourceLibrary
+
+    library = SourceLibrary(workdir / "sources", Fernet.generate_key())
+    session = library.start("bench-person", "private:bench-person")
+    documents = itertools.count()
+    body = payload(2048).hex()
+
+    def ingest() -> None:
+        index = next(documents)
+        library.ingest(session["session_id"], f"statement-{index}.txt", "text/plain",
+                       f"Statement {index}\n{body}".encode())
+    return ingest
+
+
+@case("sources.ingest_batch_100", iterations=10, warmup=1)
+def sources_ingest_batch(workdir: Path) -> Operation:
+    from cryptography.fernet import Fernet
+    from life_operations import BatchFile, SourceLibrary
+
+    library = SourceLibrary(workdir / "sources", Fernet.generate_key())
+    session = library.start("bench-person", "private:bench-person", "folder")
+    documents = itertools.count()
+    body = payload(2048).hex()
+
+    def ingest_batch() -> None:
+        files = []
+        for _ in range(100):
+            index = next(documents)
+            files.append(BatchFile(f"statement-{index}.txt", "text/plain", f"Statement {index}\n{body}".encode()))
+        library.ingest_batch(session["session_id"], files)
+    return ingest_batch
+
+
+@case("sources.list", iterations=100)
+def sources_list(workdir: Path) -> Operation:
+    from cryptography.fernet import Fernet
+    from life_operations import SourceLibrary
+
+    library = SourceLibrary(workdir / "sources", Fernet.generate_key())
+    session = library.start("bench-person", "private:bench-person")
+    for index in range(200):
+        library.ingest(session["session_id"], f"statement-{index}.txt", "text/plain", f"Statement {index}".encode())
+    return lambda: library.list_sources("bench-person")
+
+
+@case("sources.page", iterations=100)
+def sources_page(workdir: Path) -> Operation:
+    from cryptography.fernet import Fernet
+    from life_operations import BatchFile, SourceLibrary
+
+    library = SourceLibrary(workdir / "sources", Fernet.generate_key())
+    session = library.start("bench-person", "private:bench-person")
+    for start in range(0, 5000, 1000):
+        library.ingest_batch(session["session_id"], [
+            BatchFile(f"statement-{index}.{'csv' if index % 10 == 0 else 'txt'}",
+                      "text/csv" if index % 10 == 0 else "text/plain", f"Statement {index}".encode())
+            for index in range(start, start + 1000)])
+    first = library.page_sources("bench-person", media_type="text/csv", limit=50)
+    # A middle page of a filtered listing: the cost a scrolling client pays for each page.
+    return lambda: library.page_sources("bench-person", media_type="text/csv", limit=50,
+                                        cursor=first["next_cursor"], projection=["filename", "state"])
+
+
+@case("sources.search", iterations=100)
+def sources_search(workdir: Path) -> Operation:
+    from cryptography.fernet import Fernet
+    from life_operations import BatchFile, SourceLibrary
+
+    library = SourceLibrary(workdir / "sources", Fernet.generate_key())
+    session = library.start("bench-person", "private:bench-person")
+    words = payload(4096).hex()
+    for start in range(0, 2000, 500):
+        library.ingest_batch(session["session_id"], [
+            BatchFile(f"statement-{index}.txt", "text/plain",
+                      f"Statement {index} {'electricity' if index % 50 == 0 else 'water'} {words}".encode())
+            for index in range(start, start + 500)])
+    return lambda: library.search("bench-person", "electricity statement")
+
+
+def _domain_store(workdir: Path, records: int) -> Any:
+    from cryptography.fernet import Fernet
+    from domain_operations import LifeDomainStore
+
+    store = LifeDomainStore(workdir / "domains", Fernet.generate_key())
+    for index in range(records):
+        store.create_record("bench-person", "private:bench-person", "household", "item",
+                            {"name": f"item-{index}"}, [f"src-{index}"], "observed", 1.0)
+    return store
+
+
+@case("domain.create_record", iterations=100)
+def domain_create_record(workdir: Path) -> Operation:
+    store, records = _domain_store(workdir, 0), itertools.count()
+    return lambda: store.create_record("bench-person", "private:bench-person", "household", "item",
+                                       {"name": f"item-{next(records)}"}, ["src-1"], "observed", 1.0)
+
+
+@case("domain.records", iterations=100)
+def domain_records(workdir: Path) -> Operation:
+    store = _domain_store(workdir, 200)
+    return lambda: store.records("bench-person", "household")
+
+
+def _backup_cases(backend_name: str) -> None:
+    def coordinator(workdir: Path) -> tuple[Any, Any]:
+        from src.backup_backends import FileSystemBackend, HostileMemoryBackend
+        from src.backup_service import BackupCoordinator, FileCheckpointWitness
+
+        backend = FileSystemBackend(workdir / "blobs") if backend_name == "filesystem" else HostileMemoryBackend()
+        return BackupCoordinator(backend, FileCheckpointWitness(workdir / "witness"),
+                                 journal_root=workdir / "journals", chunk_size=16 * 1024), backend
+
+    def scope() -> Any:
+        from src.backup_service import ScopeSecrets
+        from unison_common.backup import ScopeKind
+
+        return ScopeSecrets.create(ScopeKind.PERSON, "bench-person")
+
+    data = payload(256 * 1024)
+
+    @case(f"backup.{backend_name}.create_snapshot", iterations=30, warmup=2)
+    def create_snapshot(workdir: Path) -> Operation:
+        backup, _ = coordinator(workdir)
+        return lambda: backup.create_snapshot(scope(), data)
+
+    @case(f"backup.{backend_name}.verify", iterations=30, warmup=2)
+    def verify(workdir: Path) -> Operation:
+        backup, _ = coordinator(workdir)
+        secrets = scope()
+        backup.create_snapshot(secrets, data)
+        return lambda: backup.verify(secrets)
+
+    @case(f"backup.{backend_name}.restore", iterations=30, warmup=2)
+    def restore(workdir: Path) -> Operation:
+        backup, _ = coordinator(workdir)
+        secrets = scope()
+        backup.create_snapshot(secrets, data)
+        targets = itertools.count()
+
+        def run() -> None:
+            plan = backup.plan_restore(secrets, target_device_id="bench-device")
+            backup.restore(secrets, plan, target=workdir / f"restored-{next(targets)}.bin")
+        return run
+
+
+for _backend in ("filesystem", "hostile-memory"):
+    _backup_cases(_backend)
+
+
+def _key_round_trip(sealer: Any) -> Operation:
+    data = payload(4096)
+
+    def run() -> None:
+        sealed = sealer.encrypt(key_handle="kh-bench", plaintext=data, associated_data=b"bench")
+        sealer.decrypt(key_handle="kh-bench", ciphertext=sealed, associated_data=b"bench")
+    return run
+
+
+@case("object_keys.broker_round_trip", iterations=2000, warmup=50)
+def object_key_broker_round_trip(workdir: Path) -> Operation:
+    from object_keys import ObjectKeyBroker
+
+    return _key_round_trip(ObjectKeyBroker(payload(32, seed=1)))
+
+
+@case("object_keys.cached_round_trip", iterations=2000, warmup=50)
+def object_key_cached_round_trip(workdir: Path) -> Operation:
+    from object_keys import ObjectKeyBroker, ObjectKeyCache
+
+    return _key_round_trip(ObjectKeyCache(ObjectKeyBroker(payload(32, seed=1))))
+
+
+__all__ = ["CASES", "Case", "case", "payload"]
@@ -0,0 +1,70 @@
+"""Compare single-pass signature scanning with one search per signature.
+
+Run with ``PYTHONPATH=src python benchmarks/content_scan_throughput.py``. For
+each signature count, the script adds synthetic literal and regex signatures
+to the built-in ones. It then scans ``--megabytes`` of clean text, which has
+no match, so every byte is examined. The combined scanner is timed against
+running each signature's regex over the content on its own, which is how
+security flags were computed before.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+
+from content_scanner import BUILTIN_SIGNATURES, ContentScanner, Signature
+
+
+def _signatures(count: int) -> list[Signature]:
+    extra = []
+    for index in range(count):
+        if index % 2:
+            extra.append(Signature(f"literal-{index}", "bench-literal", re.escape(f"forbidden-marker-{index:04d}".encode())))
+        else:
+            extra.append(Signature(f"regex-{index}", "bench-regex", f"wire \\d+ to account {index:04d}".encode(),
+                                   ignore_case=True))
+    return [*BUILTIN_SIGNATURES, *extra]
+
+
+def _per_signature(signatures: list[Signature], content: bytes) -> float:
+    compiled = [re.compile(signature.pattern, re.I if signature.ignore_case else 0) for signature in signatures]
+    started = time.perf_counter()
+    for regex in compiled:
+        regex.search(content)
+    return time.perf_counter() - started
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=25, help="size of the scanned content")
+    parser.add_argument("--signatures", default="0,50,200", help="comma-separated extra signature counts")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="chunk size fed to the streaming scanner")
+    args = parser.parse_args(argv)
+
+    line = b"Statement line: paid 42.00 to the grocery store on 2026-10-01, balance 1,234.56\n"
+    content = line * (args.megabytes * 1024 * 1024 // len(line))
+    chunk = args.chunk_kb * 1024
+    results = []
+    for count in (int(value) for value in args.signatures.split(",")):
+        signatures = _signatures(count)
+        scanner = ContentScanner(signatures)
+        started = time.perf_counter()
+        stream = scanner.stream()
+        for offset in range(0, len(content), chunk):
+            stream.feed(content[offset:offset + chunk])
+        combined = time.perf_counter() - started
+        assert stream.flags() == []
+        separate = _per_signature(signatures, content)
+        results.append({
+            "signatures": len(signatures),
+            "combined_mb_per_s": round(len(content) / 2**20 / combined, 1),
+            "per_signature_mb_per_s": round(len(content) / 2**20 / separate, 1),
+        })
+    print(json.dumps({"megabytes": args.megabytes, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
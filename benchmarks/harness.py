@@ -0,0 +1,123 @@
+"""Timing, result, and baseline comparison helpers for the benchmark suite."""
+
+from __future__ import annotations
+
+import gc
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+
+RESULT_SCHEMA = "unison-storage-bench.v1"
+
+
+@dataclass(frozen=True)
+class CaseResult:
+    name: str
+    iterations: int
+    median_s: float
+    p95_s: float
+    mean_s: float
+    min_s: float
+    ops_per_s: float
+
+
+def service_environment(root: Path, *, bypass_principals: bool = True) -> None:
+    """Point the service at private state under ``root``; call before importing ``server``."""
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    if bypass_principals:
+        os.environ["UNISON_PRINCIPAL_BINDING_TEST_BYPASS"] = "true"
+    os.environ["UNISON_STORAGE_DB"] = str(root / "store.db")
+    os.environ["UNISON_LIFE_OPERATIONS_ROOT"] = str(root / "life-operations")
+    os.environ["UNISON_LIFE_DOMAINS_ROOT"] = str(root / "life-domains")
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(name: str, operation: Callable[[], Any], *, iterations: int, warmup: int) -> CaseResult:
+    for _ in range(warmup):
+        operation()
+    gc.collect()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    median = statistics.median(samples)
+    return CaseResult(
+        name=name,
+        iterations=iterations,
+        median_s=median,
+        p95_s=percentile(samples, 0.95),
+        mean_s=statistics.fmean(samples),
+        min_s=samples[0],
+        ops_per_s=1 / median if median else float("inf"),
+    )
+
+
+def duplicate_modules() -> list[str]:
+    """Service modules loaded both bare and as ``src.<name>``; each copy has its own state."""
+    return sorted(name for name in list(sys.modules) if name.startswith("src.") and name[4:] in sys.modules)
+
+
+def report(results: list[CaseResult], skipped: dict[str, str],
+           failed: dict[str, str] | None = None) -> dict[str, Any]:
+    return {
+        "schema": RESULT_SCHEMA,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": {result.name: asdict(result) for result in results},
+        "skipped": skipped,
+        "failed": failed or {},
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], max_regression: float,
+            selected: Callable[[str], bool] = lambda name: True) -> list[str]:
+    """Return one line per selected case that failed, regressed past ``max_regression`` or no longer ran.
+
+    A case that raised fails the gate whether or not the baseline has it. A baseline
+    case that is missing or skipped in the current run fails it too; otherwise
+    breaking or renaming a case would pass silently.
+    """
+    if baseline.get("schema") != RESULT_SCHEMA:
+        raise ValueError("baseline was not produced by this benchmark suite")
+    failed = current.get("failed", {})
+    regressions = [f"{name}: failed ({reason})" for name, reason in sorted(failed.items()) if selected(name)]
+    for name in sorted(baseline["results"]):
+        if not selected(name) or name in current["results"] or name in failed:
+            continue
+        reason = current.get("skipped", {}).get(name)
+        regressions.append(f"{name}: in baseline but {'skipped (' + reason + ')' if reason else 'did not run'}")
+    for name, result in sorted(current["results"].items()):
+        previous = baseline["results"].get(name)
+        if not previous or not previous["median_s"]:
+            continue
+        ratio = result["median_s"] / previous["median_s"]
+        if ratio > 1 + max_regression:
+            regressions.append(
+                f"{name}: median {result['median_s'] * 1e3:.3f} ms vs baseline "
+                f"{previous['median_s'] * 1e3:.3f} ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+__all__ = [
+    "CaseResult",
+    "RESULT_SCHEMA",
+    "compare",
+    "measure",
+    "percentile",
+    "report",
+    "service_environment",
+]
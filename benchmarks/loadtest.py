@@ -0,0 +1,250 @@
+"""Drive ``server.app`` end to end through an in-process ASGI transport.
+
+Many simulated principals run a weighted mix of kv, memory, object, import, and
+domain calls concurrently, with no network in between. The report gives per-route
+throughput, latency percentiles, and error rates.
+
+    python benchmarks/loadtest.py --principals 50 --duration 20
+    python benchmarks/loadtest.py --header 'X-Test-Principal={person_id}' --no-bypass
+
+By default ``UNISON_PRINCIPAL_BINDING_TEST_BYPASS`` is enabled and each synthetic
+principal is identified by the ``person_id`` it sends. ``--header`` adds headers
+rendered per principal (``{person_id}`` and ``{index}`` are substituted) for
+deployments whose binding middleware accepts synthetic test principals.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+for _path in (ROOT, ROOT / "src", Path(__file__).resolve().parent):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+from harness import percentile, service_environment  # noqa: E402
+
+
+@dataclass
+class SyntheticPrincipal:
+    index: int
+    person_id: str
+    headers: dict[str, str]
+    rng: random.Random
+    kv_keys: list[str] = field(default_factory=list)
+    memory_sessions: list[str] = field(default_factory=list)
+    object_ids: list[str] = field(default_factory=list)
+    counter: int = 0
+
+    def next_id(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}-{self.index}-{self.counter}"
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+Call = Callable[[Any, SyntheticPrincipal], Awaitable[tuple[str, Any]]]
+
+
+def _ok(response: Any) -> bool:
+    if response.status_code >= 400:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return True
+    return not (isinstance(body, dict) and body.get("ok") is False and body.get("error") != "not-found")
+
+
+async def kv_put(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    key = principal.next_id("key")
+    principal.kv_keys.append(key)
+    response = await client.put(f"/kv/load/{key}", json={"value": {"n": principal.counter}},
+                                headers=principal.headers)
+    return "PUT /kv/{namespace}/{key}", response
+
+
+async def kv_get(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    key = principal.rng.choice(principal.kv_keys) if principal.kv_keys else "absent"
+    return "GET /kv/{namespace}/{key}", await client.get(f"/kv/load/{key}", headers=principal.headers)
+
+
+async def memory_put(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    session_id = principal.next_id("session")
+    principal.memory_sessions.append(session_id)
+    response = await client.post("/memory", headers=principal.headers, json={
+        "session_id": session_id, "person_id": principal.person_id, "data": {"turns": ["hello"] * 4},
+    })
+    return "POST /memory", response
+
+
+async def memory_get(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    session_id = principal.rng.choice(principal.memory_sessions) if principal.memory_sessions else "absent"
+    return "GET /memory/{session_id}", await client.get(f"/memory/{session_id}", headers=principal.headers)
+
+
+async def object_put(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    obj_id = principal.next_id("object")
+    principal.object_ids.append(obj_id)
+    size = principal.rng.choice((512, 8 * 1024, 64 * 1024))
+    content = base64.b64encode(principal.rng.randbytes(size)).decode()
+    response = await client.post("/objects", headers=principal.headers, json={
+        "id": obj_id, "person_id": principal.person_id, "content_b64": content,
+    })
+    return "POST /objects", response
+
+
+async def object_get(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    obj_id = principal.rng.choice(principal.object_ids) if principal.object_ids else "absent"
+    return "GET /objects/{obj_id}", await client.get(f"/objects/{obj_id}", headers=principal.headers)
+
+
+async def import_source(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    started = await client.post("/v1/imports", headers=principal.headers, json={"person_id": principal.person_id})
+    if started.status_code >= 400:
+        return "POST /v1/imports", started
+    body = f"Statement {principal.next_id('doc')}\nAmount: {principal.rng.randint(1, 500)}".encode()
+    response = await client.post(f"/v1/imports/{started.json()['session_id']}/sources", headers=principal.headers,
+                                 json={"person_id": principal.person_id, "filename": "statement.txt",
+                                       "media_type": "text/plain", "content_b64": base64.b64encode(body).decode()})
+    return "POST /v1/imports/{session_id}/sources", response
+
+
+async def domain_create(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    response = await client.post("/v1/domain/records", headers=principal.headers, json={
+        "person_id": principal.person_id, "domain": "household", "record_type": "item",
+        "facts": {"name": principal.next_id("item")}, "source_ids": ["src-load"],
+    })
+    return "POST /v1/domain/records", response
+
+
+async def domain_list(client: Any, principal: SyntheticPrincipal) -> tuple[str, Any]:
+    response = await client.get("/v1/domain/records", headers=principal.headers,
+                                params={"person_id": principal.person_id, "domain": "household"})
+    return "GET /v1/domain/records", response
+
+
+WORKLOAD_MIX: tuple[tuple[Call, int], ...] = (
+    (kv_put, 20), (kv_get, 30), (memory_put, 8), (memory_get, 12), (object_put, 8),
+    (object_get, 10), (import_source, 4), (domain_create, 5), (domain_list, 3),
+)
+
+
+async def _principal_loop(client: Any, principal: SyntheticPrincipal, deadline: float,
+                          request_budget: int | None, stats: dict[str, RouteStats]) -> None:
+    calls, weights = zip(*WORKLOAD_MIX)
+    issued = 0
+    while time.perf_counter() < deadline and (request_budget is None or issued < request_budget):
+        call = principal.rng.choices(calls, weights)[0]
+        started = time.perf_counter()
+        try:
+            route, response = await call(client, principal)
+            failed = not _ok(response)
+        except Exception:
+            route, failed = call.__name__, True
+        route_stats = stats.setdefault(route, RouteStats())
+        route_stats.latencies.append(time.perf_counter() - started)
+        route_stats.errors += int(failed)
+        issued += 1
+
+
+async def run_load(app: Any, *, principals: int, duration: float, requests_per_principal: int | None,
+                   headers: dict[str, str], seed: int) -> dict[str, Any]:
+    import httpx
+
+    stats: dict[str, RouteStats] = {}
+    population = [
+        SyntheticPrincipal(
+            index=index,
+            person_id=f"load-person-{index}",
+            headers={name: value.format(person_id=f"load-person-{index}", index=index)
+                     for name, value in headers.items()},
+            rng=random.Random(seed + index),
+        )
+        for index in range(principals)
+    ]
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://storage") as client:
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*(
+                _principal_loop(client, principal, deadline, requests_per_principal, stats)
+                for principal in population
+            ))
+            elapsed = time.perf_counter() - started
+    routes = {}
+    for route, route_stats in sorted(stats.items()):
+        ordered = sorted(route_stats.latencies)
+        count = len(ordered)
+        routes[route] = {
+            "requests": count,
+            "throughput_rps": count / elapsed if elapsed else 0.0,
+            "error_rate": route_stats.errors / count if count else 0.0,
+            "p50_ms": percentile(ordered, 0.50) * 1e3,
+            "p90_ms": percentile(ordered, 0.90) * 1e3,
+            "p99_ms": percentile(ordered, 0.99) * 1e3,
+            "max_ms": ordered[-1] * 1e3 if ordered else 0.0,
+        }
+    total = sum(route["requests"] for route in routes.values())
+    errors = sum(stats[name].errors for name in routes)
+    return {
+        "principals": principals,
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "error_rate": errors / total if total else 0.0,
+        "routes": routes,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--principals", type=int, default=20, help="concurrent simulated principals")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop each principal after this many requests")
+    parser.add_argument("--header", action="append", default=[], metavar="NAME=TEMPLATE",
+                        help="per-principal header; {person_id} and {index} are substituted")
+    parser.add_argument("--no-bypass", action="store_true",
+                        help="do not enable UNISON_PRINCIPAL_BINDING_TEST_BYPASS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+    headers = dict(item.split("=", 1) for item in args.header)
+
+    with tempfile.TemporaryDirectory(prefix="unison-storage-load-") as scratch:
+        service_environment(Path(scratch), bypass_principals=not args.no_bypass)
+        from server import app
+
+        result = asyncio.run(run_load(app, principals=args.principals, duration=args.duration,
+                                      requests_per_principal=args.requests, headers=headers, seed=args.seed))
+
+    print(f"{'route':<42}{'requests':>9}{'rps':>9}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}",
+          file=sys.stderr)
+    for route, row in result["routes"].items():
+        print(f"{route:<42}{row['requests']:>9}{row['throughput_rps']:>9.1f}{row['error_rate']:>8.1%}"
+              f"{row['p50_ms']:>9.2f}{row['p90_ms']:>9.2f}{row['p99_ms']:>9.2f}", file=sys.stderr)
+    document = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(document + "\n", encoding="utf-8")
+    else:
+        print(document)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
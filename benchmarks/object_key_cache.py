@@ -0,0 +1,44 @@
+"""Compare per-call key derivation with the same broker behind ``ObjectKeyCache``.
+
+Run with ``PYTHONPATH=src python benchmarks/object_key_cache.py``. The baseline
+derives a fresh per-handle context on every call; the cache derives once per
+handle and reuses it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from object_keys import ObjectKeyBroker, ObjectKeyCache
+
+
+def _run(sealer, iterations: int, payload: bytes) -> float:
+    started = time.perf_counter()
+    for index in range(iterations):
+        handle = f"kh-{index % 8}"
+        sealed = sealer.encrypt(key_handle=handle, plaintext=payload, associated_data=b"bench")
+        sealer.decrypt(key_handle=handle, ciphertext=sealed, associated_data=b"bench")
+    return (time.perf_counter() - started) / iterations
+
+
+def main() -> None:
+    payload = os.urandom(4096)
+    iterations = 20_000
+    broker = ObjectKeyBroker(os.urandom(32))
+    cache = ObjectKeyCache(broker)
+    direct = _run(broker, iterations, payload)
+    cached = _run(cache, iterations, payload)
+    print(json.dumps({
+        "payload_bytes": len(payload),
+        "iterations": iterations,
+        "broker_us_per_round_trip": round(direct * 1e6, 2),
+        "cached_us_per_round_trip": round(cached * 1e6, 2),
+        "speedup": round(direct / cached, 2),
+        "cache": cache.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Run the storage benchmark suite and optionally compare it with a saved baseline.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --baseline bench.json --max-regression 0.25
+
+The comparison exits non-zero when any case's median regresses past the limit.
+Any run exits non-zero when a case raises while it is set up or timed.
+Everything runs in process against temporary directories and SQLite, so no
+network or external service is needed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+for _path in (ROOT, ROOT / "src", Path(__file__).resolve().parent):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+from cases import CASES  # noqa: E402
+from harness import compare, duplicate_modules, measure, report  # noqa: E402
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="write machine-readable results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare against results saved with --output")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed median slowdown versus baseline, as a fraction")
+    parser.add_argument("--cases", default="*", help="glob selecting case names, e.g. 'object.*'")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every case's iteration count")
+    args = parser.parse_args(argv)
+
+    results, skipped, failed = [], {}, {}
+    with tempfile.TemporaryDirectory(prefix="unison-storage-bench-") as scratch:
+        for index, case in enumerate(CASES):
+            if not fnmatch.fnmatch(case.name, args.cases):
+                continue
+            workdir = Path(scratch) / f"{index:03d}"
+            workdir.mkdir()
+            try:
+                operation = case.factory(workdir)
+            except ImportError as exc:
+                skipped[case.name] = f"dependency unavailable: {exc.name or exc}"
+                continue
+            except Exception as exc:
+                failed[case.name] = f"setup raised {type(exc).__name__}: {exc}"
+                continue
+            try:
+                result = measure(case.name, operation, iterations=max(1, int(case.iterations * args.scale)),
+                                 warmup=case.warmup)
+            except Exception as exc:
+                failed[case.name] = f"raised {type(exc).__name__}: {exc}"
+                continue
+            results.append(result)
+            print(f"{case.name:<40} median {result.median_s * 1e3:9.3f} ms  p95 {result.p95_s * 1e3:9.3f} ms",
+                  file=sys.stderr)
+
+    duplicates = duplicate_modules()
+    if duplicates:
+        print(f"service modules loaded twice: {', '.join(duplicates)}", file=sys.stderr)
+        return 1
+    document = report(results, skipped, failed)
+    for name, reason in sorted(skipped.items()):
+        print(f"{name:<40} skipped ({reason})", file=sys.stderr)
+    for name, reason in sorted(failed.items()):
+        print(f"{name:<40} FAILED ({reason})", file=sys.stderr)
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    else:
+        print(json.dumps(document, indent=2, sort_keys=True))
+    if args.baseline:
+        regressions = compare(document, json.loads(args.baseline.read_text(encoding="utf-8")), args.max_regression,
+                              selected=lambda name: fnmatch.fnmatch(name, args.cases))
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+"""Show how ``SourceLibrary.ingest`` throughput scales with worker processes.
+
+Run with ``PYTHONPATH=src python benchmarks/source_library_concurrency.py``.
+Every worker process opens the same library root, the way uvicorn workers do,
+and ingests into its own person's session. Each person has their own index
+shard, so workers only meet on the shared session catalog and throughput should
+grow with the number of cores. After each round the script checks that every
+ingest was kept.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from life_operations import SourceLibrary
+
+
+def _worker(root: str, key: bytes, session_id: str, ingests: int) -> None:
+    library = SourceLibrary(Path(root), key)
+    for index in range(ingests):
+        library.ingest(session_id, f"upload-{index}.txt", "text/plain", f"upload {session_id} {index}".encode())
+
+
+def _round(processes: int, ingests: int) -> dict:
+    key = Fernet.generate_key()
+    with tempfile.TemporaryDirectory(prefix="unison-source-concurrency-") as scratch:
+        library = SourceLibrary(Path(scratch), key)
+        sessions = [library.start(f"person-{worker}", f"private:person-{worker}")["session_id"]
+                    for worker in range(processes)]
+        workers = [multiprocessing.Process(target=_worker, args=(scratch, key, session_id, ingests))
+                   for session_id in sessions]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if any(worker.exitcode for worker in workers):
+            raise SystemExit("an ingest worker failed")
+        kept = sum(len(library.list_sources(f"person-{worker}")) for worker in range(processes))
+    return {"processes": processes, "ingests": processes * ingests, "kept": kept,
+            "ingests_per_s": round(processes * ingests / elapsed, 1)}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", default="1,2,4", help="comma-separated worker process counts")
+    parser.add_argument("--ingests", type=int, default=200, help="ingests per worker process")
+    args = parser.parse_args(argv)
+
+    results = [_round(int(count), args.ingests) for count in args.processes.split(",")]
+    print(json.dumps({
+        "cpus": os.cpu_count(),
+        "results": results,
+        "largest_over_smallest": round(results[-1]["ingests_per_s"] / results[0]["ingests_per_s"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
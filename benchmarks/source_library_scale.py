@@ -0,0 +1,75 @@
+"""Show that ``SourceLibrary.ingest`` latency stays flat as one person's library grows.
+
+Run with ``PYTHONPATH=src python benchmarks/source_library_scale.py``. The
+library is filled directly through its store, which is much faster than real
+ingests. At each size the script times real ingests that each look up a
+duplicate checksum and a prior version. Every fifth upload reuses an existing
+filename, so both lookups find matches as well as misses.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from life_operations import SourceLibrary
+
+
+PERSON = "bench-person"
+
+
+def _fill(library: SourceLibrary, session_id: str, start: int, stop: int) -> None:
+    with library.shards.for_person(PERSON).transaction() as tx:
+        for index in range(start, stop):
+            source_id = f"src_fill_{index}"
+            tx.put_source({
+                "schema_version": "source-object.v1", "source_id": source_id, "person_id": PERSON,
+                "space_id": f"private:{PERSON}", "import_session_id": session_id, "media_type": "text/plain",
+                "filename": f"statement-{index}.txt",
+                "checksum_sha256": hashlib.sha256(str(index).encode()).hexdigest(),
+                "size_bytes": 32, "state": "quarantined", "visibility": "private", "version": 1,
+                "prior_version_id": None, "duplicate_of": None, "security_flags": ["untrusted-content"],
+                "created_at": time.time(),
+            })
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated library sizes")
+    parser.add_argument("--ingests", type=int, default=200, help="timed ingests per size")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="unison-source-scale-") as scratch:
+        library = SourceLibrary(Path(scratch), Fernet.generate_key())
+        session = library.start(PERSON, f"private:{PERSON}")
+        filled = 0
+        for size in sizes:
+            _fill(library, session["session_id"], filled, size)
+            filled = size
+            timings = []
+            for attempt in range(args.ingests):
+                filename = f"statement-{attempt}.txt" if attempt % 5 == 0 else f"upload-{size}-{attempt}.txt"
+                started = time.perf_counter()
+                library.ingest(session["session_id"], filename, "text/plain", f"upload {size} {attempt}".encode())
+                timings.append(time.perf_counter() - started)
+            # Timed ingests stay in the library; that is at most a few hundred extra rows per size.
+            results.append({"sources": size, "median_ms": round(statistics.median(timings) * 1e3, 3),
+                            "p95_ms": round(sorted(timings)[int(0.95 * (len(timings) - 1))] * 1e3, 3)})
+    print(json.dumps({
+        "ingests_per_size": args.ingests,
+        "results": results,
+        "largest_over_smallest": round(results[-1]["median_ms"] / results[0]["median_ms"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
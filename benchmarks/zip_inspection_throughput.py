@@ -0,0 +1,78 @@
+"""Measure streaming zip inspection throughput and peak memory on large archives.
+
+Run with ``PYTHONPATH=src python benchmarks/zip_inspection_throughput.py``. The script
+builds two archives of ``--megabytes`` expanded bytes in a temporary directory.
+One stores incompressible data, so the archive on disk is that large. The other
+deflates zeros, which is the shape of a zip bomb. Each archive is inspected
+from an open file, timed without tracing, and then inspected once more under
+``tracemalloc`` to report the peak memory the inspector allocated.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+from archive_inspection import inspect_zip
+
+
+MEMBER_BYTES = 8 * 1024 * 1024
+
+
+def _build(path: Path, megabytes: int, compression: int, block: bytes) -> None:
+    remaining = megabytes * 1024 * 1024
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        index = 0
+        while remaining:
+            with archive.open(f"member-{index}.bin", "w") as member:
+                for _ in range(min(remaining, MEMBER_BYTES) // len(block)):
+                    member.write(block)
+            remaining -= min(remaining, MEMBER_BYTES)
+            index += 1
+
+
+def _inspect(path: Path, budget: int):
+    with open(path, "rb") as handle:
+        return inspect_zip(handle, max_members=1000, max_expanded_bytes=budget)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=100, help="expanded size of each archive")
+    args = parser.parse_args(argv)
+
+    budget = args.megabytes * 1024 * 1024
+    results = []
+    with tempfile.TemporaryDirectory(prefix="unison-archive-bench-") as scratch:
+        shapes = (("stored-random", zipfile.ZIP_STORED, os.urandom(1024 * 1024)),
+                  ("deflated-zeros", zipfile.ZIP_DEFLATED, b"\0" * 1024 * 1024))
+        for name, compression, block in shapes:
+            path = Path(scratch) / f"{name}.zip"
+            _build(path, args.megabytes, compression, block)
+            started = time.perf_counter()
+            summary = _inspect(path, budget)
+            elapsed = time.perf_counter() - started
+            tracemalloc.start()
+            try:
+                _inspect(path, budget)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            results.append({
+                "archive": name, "archive_mb": round(path.stat().st_size / 2**20, 1),
+                "expanded_mb": round(summary.expanded_bytes / 2**20, 1), "members": summary.members,
+                "mb_per_s": round(summary.expanded_bytes / 2**20 / elapsed, 1),
+                "peak_traced_kb": round(peak / 1024, 1),
+            })
+            path.unlink()
+    print(json.dumps({"results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
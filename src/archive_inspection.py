@@ -0,0 +1,120 @@
+"""Streaming inspection of zip archives offered for intake.
+
+The sizes in a zip's central directory are whatever the archive's author
+wrote, so this inspector does not trust them. ``inspect_zip`` does four things:
+
+1. It reads the end-of-central-directory record and refuses archives that
+   declare too many members, or too large a directory, before ``zipfile``
+   parses any of it.
+2. It checks every member path for traversal.
+3. It decompresses every member in fixed-size chunks and counts the bytes that
+   actually come out against a hard budget. It stops at the first chunk that
+   goes over.
+4. It checks each member's CRC, via ``zipfile``, and its actual length
+   against the declared one, so a forged size is caught here rather than by
+   whatever expands the archive later.
+
+Memory stays constant in the size of the archive. At most one chunk of
+decompressed output, plus the decompressor's window, is held at a time.
+"""
+
+from __future__ import annotations
+
+import io
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import BinaryIO
+
+
+# Decompressed bytes read per call while streaming a member.
+CHUNK_BYTES = 64 * 1024
+# Central directory bytes allowed per declared member: the 46-byte fixed header plus name, extra and comment.
+MAX_DIRECTORY_BYTES_PER_MEMBER = 4096
+
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_SIGNATURE = b"PK\x05\x06"
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+_ZIP64_END_RECORD = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_END_SIGNATURE = b"PK\x06\x06"
+
+
+class ArchiveRejected(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ArchiveSummary:
+    members: int
+    expanded_bytes: int
+
+
+def _directory_extent(handle: BinaryIO) -> tuple[int, int]:
+    """``(declared members, central directory bytes)`` from the end records."""
+    size = handle.seek(0, io.SEEK_END)
+    # The end record is the last thing in the file apart from a comment of at most 64 KiB.
+    tail_length = min(size, _END_RECORD.size + 0xFFFF)
+    handle.seek(size - tail_length)
+    tail = handle.read(tail_length)
+    at = tail.rfind(_END_SIGNATURE)
+    if at < 0 or len(tail) - at < _END_RECORD.size:
+        raise ArchiveRejected("invalid archive")
+    _, _, _, _, members, directory_bytes, _, _ = _END_RECORD.unpack_from(tail, at)
+    if members != 0xFFFF and directory_bytes != 0xFFFFFFFF:
+        return members, directory_bytes
+    locator_at = at - _ZIP64_LOCATOR.size
+    if locator_at < 0 or tail[locator_at:locator_at + 4] != _ZIP64_LOCATOR_SIGNATURE:
+        raise ArchiveRejected("invalid archive")
+    _, _, record_offset, _ = _ZIP64_LOCATOR.unpack_from(tail, locator_at)
+    handle.seek(record_offset)
+    record = handle.read(_ZIP64_END_RECORD.size)
+    if len(record) < _ZIP64_END_RECORD.size or not record.startswith(_ZIP64_END_SIGNATURE):
+        raise ArchiveRejected("invalid archive")
+    fields = _ZIP64_END_RECORD.unpack(record)
+    return fields[7], fields[8]
+
+
+def inspect_zip(handle: BinaryIO, *, max_members: int, max_expanded_bytes: int,
+                chunk_bytes: int = CHUNK_BYTES) -> ArchiveSummary:
+    """Decompress every member of the seekable ``handle`` within the limits, or raise ``ArchiveRejected``."""
+    declared_members, directory_bytes = _directory_extent(handle)
+    if declared_members > max_members or directory_bytes > max_members * MAX_DIRECTORY_BYTES_PER_MEMBER:
+        raise ArchiveRejected("archive has too many members")
+    handle.seek(0)
+    try:
+        with zipfile.ZipFile(handle) as archive:
+            members = archive.infolist()
+            if len(members) > max_members:
+                raise ArchiveRejected("archive has too many members")
+            for member in members:
+                path = PurePosixPath(member.filename.replace("\\", "/"))
+                if path.is_absolute() or ".." in path.parts:
+                    raise ArchiveRejected("archive path traversal detected")
+            # The declared sizes are cheap to check first, even though they are not trusted.
+            if sum(member.file_size for member in members) > max_expanded_bytes:
+                raise ArchiveRejected("archive expansion limit exceeded")
+            expanded = 0
+            for member in members:
+                if member.flag_bits & 0x1:
+                    raise ArchiveRejected("archive member is encrypted")
+                member_bytes = 0
+                with archive.open(member) as stream:
+                    while chunk := stream.read(chunk_bytes):
+                        member_bytes += len(chunk)
+                        expanded += len(chunk)
+                        if expanded > max_expanded_bytes:
+                            raise ArchiveRejected("archive expansion limit exceeded")
+                if member_bytes != member.file_size:
+                    raise ArchiveRejected("archive member size is forged")
+    except NotImplementedError as exc:
+        raise ArchiveRejected("unsupported archive compression") from exc
+    except (zipfile.BadZipFile, zlib.error, EOFError) as exc:
+        # Includes the CRC mismatch zipfile raises when a member's declared size is smaller than its data.
+        raise ArchiveRejected("invalid archive") from exc
+    return ArchiveSummary(members=len(members), expanded_bytes=expanded)
+
+
+__all__ = ["ArchiveRejected", "ArchiveSummary", "CHUNK_BYTES", "inspect_zip"]
@@ -0,0 +1,277 @@
+"""Single-pass signature scanning of imported content for security flags.
+
+Every signature, from the built-in set and from any packs loaded from disk,
+is compiled into one engine. By default that is an alternation regex for the
+case-sensitive signatures and one for the case-insensitive ones, so each byte
+is examined by one regex per case mode, however many signatures there are. The
+whole content is scanned, not just a prefix.
+
+Content can be scanned whole or fed in chunks. Consecutive chunks overlap by
+``max_match_bytes``, so a match that crosses a chunk boundary is still found
+as long as it is no longer than that. Signatures that can match more than
+``max_match_bytes`` bytes are only guaranteed to be found within a chunk.
+
+A signature pack is a JSON file such as::
+
+    {"pack": "site-rules", "version": "2026.10", "max_match_bytes": 512,
+     "signatures": [
+        {"id": "exfil-1", "flag": "document-prompt-injection",
+         "regex": "send (the|all) (files|records) to", "ignore_case": true},
+        {"id": "eicar", "flag": "malware-signature", "literal": "EICAR-STANDARD-ANTIVIRUS-TEST-FILE"}]}
+
+Each signature has either ``regex``, which is compiled against bytes, or
+``literal``. A source records the ``flag`` of every signature that matches
+it. The engine is pluggable: ``ContentScanner`` takes any factory that turns the
+signatures into an object with a ``matches(window)`` method yielding
+signature indexes.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Protocol, Sequence
+
+
+DEFAULT_MAX_MATCH_BYTES = 256
+
+
+@dataclass(frozen=True)
+class Signature:
+    signature_id: str
+    flag: str
+    pattern: bytes
+    ignore_case: bool = False
+    pack: str = "builtin"
+
+
+BUILTIN_SIGNATURES = (
+    Signature("prompt-ignore-instructions", "document-prompt-injection",
+              rb"ignore (all|any|the) (prior|previous) instructions", ignore_case=True),
+    Signature("prompt-reveal-secret", "document-prompt-injection",
+              rb"(export|reveal|print).{0,30}(token|secret|credential|password)", ignore_case=True),
+    Signature("eicar-test-file", "malware-signature", re.escape(b"EICAR-STANDARD-ANTIVIRUS-TEST-FILE")),
+)
+
+
+class ScanEngine(Protocol):
+    def matches(self, window: bytes) -> Iterator[int]: ...
+
+
+def _fold_pattern(pattern: bytes) -> bytes:
+    """``pattern`` lowercased to match lowercased content; escapes like ``\\D`` and ``(?P`` are left alone."""
+    folded = bytearray()
+    escaped = False
+    for at, byte in enumerate(pattern):
+        keep = escaped or pattern[max(at - 2, 0):at] == b"(?"
+        folded.append(byte if keep else bytes((byte,)).lower()[0])
+        escaped = not escaped and byte == 0x5C
+    return bytes(folded)
+
+
+def _signature_pattern(signature: Signature) -> bytes:
+    return _fold_pattern(signature.pattern) if signature.ignore_case else signature.pattern
+
+
+def compile_signature(signature: Signature) -> re.Pattern[bytes]:
+    """The regex for ``signature``; case-insensitive ones are folded and run against lowercased content."""
+    # Grouped, so a pattern that could not be one alternative among others is rejected here.
+    return re.compile(b"(?:" + _signature_pattern(signature) + b")")
+
+
+_METACHARACTERS = frozenset(b".^$*+?{}[]\\|()")
+_QUANTIFIERS = frozenset(b"*+?{")
+
+
+def _top_level_alternation(pattern: bytes) -> bool:
+    depth = 0
+    at = 0
+    in_class = False
+    while at < len(pattern):
+        byte = pattern[at]
+        if byte == 0x5C:
+            at += 2
+            continue
+        if in_class:
+            in_class = byte != ord("]")
+        elif byte == ord("["):
+            in_class = True
+            # A ``]`` straight after ``[`` or ``[^`` is a member of the class, not its end.
+            at += 2 if pattern[at + 1:at + 3] == b"^]" else 1 if pattern[at + 1:at + 2] == b"]" else 0
+        elif byte == ord("("):
+            depth += 1
+        elif byte == ord(")"):
+            depth -= 1
+        elif byte == ord("|") and depth == 0:
+            return True
+        at += 1
+    return False
+
+
+def _literal_prefix(pattern: bytes) -> tuple[bytes, bytes]:
+    """The bytes every match of ``pattern`` starts with, and the regex for the rest of the match."""
+    if _top_level_alternation(pattern):
+        return b"", pattern
+    literal = bytearray()
+    at = 0
+    while at < len(pattern):
+        if pattern[at] == 0x5C and at + 1 < len(pattern) and not bytes((pattern[at + 1],)).isalnum():
+            byte, width = pattern[at + 1], 2
+        elif pattern[at] not in _METACHARACTERS:
+            byte, width = pattern[at], 1
+        else:
+            break
+        if at + width < len(pattern) and pattern[at + width] in _QUANTIFIERS:
+            break
+        literal.append(byte)
+        at += width
+    return bytes(literal), pattern[at:]
+
+
+def _trie_pattern(entries: list[tuple[bytes, bytes]]) -> bytes:
+    """One alternation for ``(literal prefix, rest)`` entries, with shared prefixes factored out.
+
+    ``re`` tries the alternatives of a group one after another at every candidate position, so a
+    flat alternation of hundreds of signatures costs hundreds of attempts per byte. Factored,
+    each position only follows the branch for the bytes it actually has.
+    """
+    children: dict[int, list[tuple[bytes, bytes]]] = {}
+    unprefixed = []
+    for prefix, rest in entries:
+        if prefix:
+            children.setdefault(prefix[0], []).append((prefix[1:], rest))
+        else:
+            unprefixed.append(b"(?:" + rest + b")")
+    alternatives = [re.escape(bytes((byte,))) + _trie_pattern(group) for byte, group in children.items()]
+    alternatives.extend(unprefixed)
+    return b"(?:" + b"|".join(alternatives) + b")"
+
+
+class CombinedRegexEngine:
+    """All signatures as one regex per case mode; yields the index of each signature that matches.
+
+    The combined regexes have no capturing groups and no ``re.IGNORECASE``. Either one stops ``re``
+    from skipping straight to bytes that can start a match. Content is lowercased once for the
+    case-insensitive signatures. Only where a combined regex matches are the signatures tried one
+    at a time to find which ones matched.
+    """
+
+    def __init__(self, signatures: Sequence[Signature]):
+        self._passes = []
+        for folded in (False, True):
+            members = [(index, compile_signature(signature)) for index, signature in enumerate(signatures)
+                       if signature.ignore_case == folded]
+            if members:
+                prefixes = [_literal_prefix(_signature_pattern(signatures[index])) for index, _ in members]
+                combined = re.compile(_trie_pattern(prefixes))
+                self._passes.append((folded, combined, members))
+
+    def matches(self, window: bytes) -> Iterator[int]:
+        for folded, combined, members in self._passes:
+            text = window.lower() if folded else window
+            match = combined.search(text)
+            while match:
+                for index, regex in members:
+                    if regex.match(text, match.start()):
+                        yield index
+                match = combined.search(text, match.start() + 1)
+
+
+def load_signature_packs(paths: Iterable[Path]) -> tuple[list[Signature], int]:
+    """Signatures from JSON packs, a directory meaning every ``*.json`` in it, and the largest ``max_match_bytes``."""
+    signatures: list[Signature] = []
+    max_match_bytes = DEFAULT_MAX_MATCH_BYTES
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob("*.json")) if path.is_dir() else [path])
+    for file in files:
+        try:
+            pack = json.loads(file.read_text(encoding="utf-8"))
+            name = str(pack.get("pack") or file.stem)
+            max_match_bytes = max(max_match_bytes, int(pack.get("max_match_bytes", DEFAULT_MAX_MATCH_BYTES)))
+            for entry in pack["signatures"]:
+                if ("regex" in entry) == ("literal" in entry) or not entry.get("flag"):
+                    raise ValueError(f"signature {entry.get('id')!r} needs a flag and one of regex or literal")
+                pattern = entry["regex"].encode() if "regex" in entry else re.escape(entry["literal"].encode())
+                signature = Signature(str(entry.get("id") or f"{name}-{len(signatures)}"), entry["flag"],
+                                      pattern, bool(entry.get("ignore_case")), name)
+                compile_signature(signature)
+                signatures.append(signature)
+        except (OSError, KeyError, TypeError, ValueError, re.error) as exc:
+            raise ValueError(f"invalid signature pack {file}: {exc}") from exc
+    return signatures, max_match_bytes
+
+
+class ContentScanner:
+    def __init__(self, signatures: Sequence[Signature] = BUILTIN_SIGNATURES, *,
+                 max_match_bytes: int = DEFAULT_MAX_MATCH_BYTES,
+                 engine: Callable[[Sequence[Signature]], ScanEngine] = CombinedRegexEngine):
+        self.signatures = tuple(signatures)
+        self.max_match_bytes = max_match_bytes
+        self._engine = engine(self.signatures)
+        # Flags in the order their first signature is listed, so results are stable.
+        self.flags = tuple(dict.fromkeys(signature.flag for signature in self.signatures))
+        self._lock = threading.Lock()
+        self.bytes_scanned = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def with_packs(cls, paths: Iterable[Path]) -> "ContentScanner":
+        """The built-in signatures plus those in the packs at ``paths``."""
+        loaded, max_match_bytes = load_signature_packs(paths)
+        return cls((*BUILTIN_SIGNATURES, *loaded), max_match_bytes=max_match_bytes)
+
+    def stream(self) -> "ScanStream":
+        return ScanStream(self)
+
+    def scan(self, content: bytes) -> list[str]:
+        return self.stream().feed(content).flags()
+
+    def _scan_window(self, window: bytes, new_bytes: int, found: set[str]) -> None:
+        started = time.perf_counter()
+        for index in self._engine.matches(window):
+            found.add(self.signatures[index].flag)
+            if len(found) == len(self.flags):
+                break
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.bytes_scanned += new_bytes
+            self.seconds += elapsed
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "signatures": len(self.signatures),
+                "bytes_scanned": self.bytes_scanned,
+                "seconds": self.seconds,
+                "bytes_per_second": self.bytes_scanned / self.seconds if self.seconds else 0.0,
+            }
+
+
+class ScanStream:
+    """Flags found in content fed to it in order, across chunk boundaries."""
+
+    def __init__(self, scanner: ContentScanner):
+        self.scanner = scanner
+        self.found: set[str] = set()
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> "ScanStream":
+        if len(self.found) < len(self.scanner.flags):
+            window = self._tail + chunk
+            self.scanner._scan_window(window, len(chunk), self.found)
+            self._tail = window[-self.scanner.max_match_bytes:]
+        return self
+
+    def flags(self) -> list[str]:
+        return [flag for flag in self.scanner.flags if flag in self.found]
+
+
+__all__ = [
+    "BUILTIN_SIGNATURES", "CombinedRegexEngine", "ContentScanner", "DEFAULT_MAX_MATCH_BYTES", "ScanEngine",
+    "ScanStream", "Signature", "compile_signature", "load_signature_packs",
+]
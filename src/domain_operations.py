@@ -10,8 +10,6 @@ from datetime import date
 from pathlib import Path
 from typing import Any
 
-from cryptography.fernet import Fernet, InvalidToken
-
 
 HOUSEHOLD_TYPES = frozenset({
     "item", "product", "property", "warranty", "receipt", "manual", "service-event",
@@ -65,11 +63,15 @@ class LifeDomainStore:
         self.root.mkdir(parents=True, exist_ok=True)
         self.state_path = root / "domain-state.enc"
         self.pending_path = root / "domain-state.pending"
+        from cryptography.fernet import Fernet
+
         self.fernet = Fernet(encryption_key)
         if not self.state_path.exists():
             self._write({"records": {}, "links": {}, "attention": {}, "briefs": {}, "drafts": {}, "pilots": {}})
 
     def _read(self) -> dict[str, Any]:
+        from cryptography.fernet import InvalidToken
+
         try:
             return json.loads(self.fernet.decrypt(self.state_path.read_bytes()).decode())
         except (InvalidToken, OSError, json.JSONDecodeError) as exc:
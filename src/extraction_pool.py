@@ -0,0 +1,137 @@
+"""Background extraction for source intake: a bounded worker pool and its metrics.
+
+OCR and text extraction run on a fixed number of worker threads instead of in
+the HTTP request. Jobs wait in a bounded queue. When the queue is full,
+``submit`` refuses the job and the caller runs it inline, so a burst of uploads
+slows the requests that caused it instead of growing memory without limit.
+
+The workers are threads rather than processes. The OCR callable is injected
+and need not be picklable, and the engines it usually wraps release the GIL
+while they work.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from request_metrics import MetricValues, histogram_lines, observe_histogram, series_lines
+from shared_metrics import LocalValues, MetricKey
+
+
+_LOG = logging.getLogger("unison-storage.extraction")
+
+# OCR on a large scan takes seconds, so the buckets reach further than request latency does.
+EXTRACTION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class ExtractionMetrics:
+    def __init__(self, values: MetricValues | None = None, buckets: tuple[float, ...] = EXTRACTION_BUCKETS):
+        self.values = values if values is not None else LocalValues()
+        self.buckets = tuple(sorted(buckets))
+
+    def queued(self, amount: int) -> None:
+        self.values.inc(("unison_storage_extraction_queue_depth",), amount, live=True)
+
+    def running(self, amount: int) -> None:
+        self.values.inc(("unison_storage_extraction_running",), amount, live=True)
+
+    def observe(self, processor: str, seconds: float, ok: bool) -> None:
+        observe_histogram(self.values, "unison_storage_extraction_duration_seconds", (processor,),
+                          self.buckets, seconds)
+        self.values.inc(("unison_storage_extractions_total", processor, "ok" if ok else "error"))
+
+    def job_failed(self) -> None:
+        self.values.inc(("unison_storage_extraction_job_failures_total",))
+
+    def cache(self, hit: bool) -> None:
+        self.values.inc(("unison_storage_extraction_cache_total", "hit" if hit else "miss"))
+
+    def render(self, snapshot: dict[MetricKey, float] | None = None) -> list[str]:
+        snapshot = self.values.snapshot() if snapshot is None else snapshot
+        lines = [
+            "# HELP unison_storage_extraction_queue_depth Extraction jobs waiting for a worker",
+            "# TYPE unison_storage_extraction_queue_depth gauge",
+            f"unison_storage_extraction_queue_depth {snapshot.get(('unison_storage_extraction_queue_depth',), 0):g}",
+            "# HELP unison_storage_extraction_running Extraction jobs being worked on",
+            "# TYPE unison_storage_extraction_running gauge",
+            f"unison_storage_extraction_running {snapshot.get(('unison_storage_extraction_running',), 0):g}",
+            "# HELP unison_storage_extraction_duration_seconds Extraction latency by processor",
+            "# TYPE unison_storage_extraction_duration_seconds histogram",
+        ]
+        lines.extend(histogram_lines(snapshot, "unison_storage_extraction_duration_seconds", ("processor",),
+                                     self.buckets))
+        lines.extend([
+            "# HELP unison_storage_extractions_total Extractions by processor and outcome",
+            "# TYPE unison_storage_extractions_total counter",
+        ])
+        lines.extend(series_lines(snapshot, "unison_storage_extractions_total", ("processor", "outcome")))
+        lines.extend([
+            "# HELP unison_storage_extraction_job_failures_total Background extraction jobs that raised",
+            "# TYPE unison_storage_extraction_job_failures_total counter",
+            "unison_storage_extraction_job_failures_total "
+            f"{snapshot.get(('unison_storage_extraction_job_failures_total',), 0):g}",
+        ])
+        lines.extend([
+            "# HELP unison_storage_extraction_cache_total Extraction cache lookups by result",
+            "# TYPE unison_storage_extraction_cache_total counter",
+        ])
+        lines.extend(series_lines(snapshot, "unison_storage_extraction_cache_total", ("result",)))
+        return lines
+
+
+class ExtractionPool:
+    """``workers`` threads with room for ``max_queued`` waiting jobs."""
+
+    def __init__(self, workers: int = 2, max_queued: int = 64, metrics: ExtractionMetrics | None = None):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.workers = workers
+        self.max_queued = max_queued
+        self.metrics = metrics or ExtractionMetrics()
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="source-extraction")
+
+    def submit(self, job: Callable[[], None]) -> bool:
+        """Queue ``job``; False when the queue is full and the caller should run it itself."""
+        if not self._slots.acquire(blocking=False):
+            return False
+        self.metrics.queued(1)
+
+        def run() -> None:
+            self.metrics.queued(-1)
+            self.metrics.running(1)
+            try:
+                job()
+            except Exception:
+                # Nobody waits on the future, so a failure would otherwise vanish with it.
+                self.metrics.job_failed()
+                _LOG.exception("background extraction job failed")
+            finally:
+                self.metrics.running(-1)
+                self._slots.release()
+
+        def dropped(future: Future) -> None:
+            # Cancelled at shutdown before it started, so ``run`` never gave its slot back.
+            if future.cancelled():
+                self.metrics.queued(-1)
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(run)
+        except RuntimeError:
+            # Shutting down: the caller runs the job inline instead.
+            self.metrics.queued(-1)
+            self._slots.release()
+            return False
+        future.add_done_callback(dropped)
+        return True
+
+    def shutdown(self) -> None:
+        """Finish running jobs and drop queued ones; their sources are requeued when their session is polled."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+__all__ = ["EXTRACTION_BUCKETS", "ExtractionMetrics", "ExtractionPool"]
@@ -8,33 +8,55 @@ from __future__ import annotations
 
 import base64
 import hashlib
-import json
+import io
 import mimetypes
+import os
 import re
 import secrets
+import threading
 import time
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Callable, Sequence
 
-from cryptography.fernet import Fernet
+from archive_inspection import ArchiveRejected, inspect_zip
+from content_scanner import ContentScanner
+from extraction_pool import ExtractionMetrics, ExtractionPool
+from source_frames import FRAME_MAGIC, FramedReader, encode_frame, is_framed, iter_plaintext
+from source_store import SOURCE_FILTERS, SourceShards, SourceStore, SourceTransaction, person_shard
 
 
 ALLOWED_MEDIA_TYPES = frozenset({
     "application/pdf", "image/jpeg", "image/png", "text/plain", "text/csv",
     "application/json", "application/zip",
 })
-PROMPT_INJECTION_PATTERNS = (
-    re.compile(rb"ignore (all|any|the) (prior|previous) instructions", re.I),
-    re.compile(rb"(export|reveal|print).{0,30}(token|secret|credential|password)", re.I),
-)
+# Text extraction keeps 100k characters, which is at most this many UTF-8 bytes.
+EXTRACT_HEAD_BYTES = 400_000
+# A source still marked as extracting this long after it was queued is queued again.
+EXTRACTION_LEASE_SECONDS = 600.0
+# Chunked uploads whose running hash and scan are kept between chunks; others are replayed from disk.
+MAX_TRACKED_UPLOADS = 256
+MAX_SEARCH_RESULTS = 100
+MAX_SOURCE_PAGE = 500
+# Wrap matched terms in search snippets and highlights; private-use characters, so extracted text never has them.
+_MATCH_MARKS = ("\ue000", "\ue001")
 
 
 class IntakeRejected(ValueError):
     pass
 
 
+class UploadConflict(IntakeRejected):
+    """A chunk was sent for an offset other than the one the upload continues at."""
+
+    def __init__(self, received_bytes: int):
+        super().__init__(f"upload continues at offset {received_bytes}")
+        self.received_bytes = received_bytes
+
+
 class ConnectionRejected(ValueError):
     pass
 
@@ -48,29 +70,100 @@ def _safe_component(value: str) -> str:
 @dataclass(frozen=True)
 class IntakeLimits:
     max_bytes: int = 25 * 1024 * 1024
+    max_chunk_bytes: int = 8 * 1024 * 1024
     max_archive_members: int = 200
     max_archive_expanded_bytes: int = 100 * 1024 * 1024
+    max_batch_files: int = 1000
+    # Threads that check, scan and encrypt the files of one batch.
+    batch_workers: int = 4
+
+
+@dataclass(frozen=True)
+class IndexLimits:
+    max_open_shards: int = 64
+    # Journal pages that trigger a checkpoint into the shard's database file.
+    checkpoint_pages: int = 1000
+    # Size a journal file is truncated back to after a checkpoint.
+    journal_size_limit_bytes: int = 4 * 1024 * 1024
+    # Extracted fields kept per person for reuse on identical bytes; 0 turns the cache off.
+    extraction_cache_bytes: int = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class BatchFile:
+    """One file of ``ingest_batch``; ``content`` may be a callable so the file is only read by its worker."""
+
+    filename: str
+    media_type: str
+    content: bytes | Callable[[], bytes]
+
+
+@dataclass
+class _PreparedSource:
+    source_id: str
+    filename: str
+    media_type: str
+    checksum: str
+    size_bytes: int
+    security_flags: list[str]
+    fields: list[dict[str, Any]]
+    encrypted: Path
+    expanded_from: dict[str, str] | None = None
+
+
+class _ContentScan:
+    """Checksum and security flags of content fed to it in order."""
+
+    def __init__(self, scanner: ContentScanner):
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+        self.signatures = scanner.stream()
+
+    def feed(self, chunk: bytes) -> "_ContentScan":
+        self.signatures.feed(chunk)
+        self.sha256.update(chunk)
+        self.received += len(chunk)
+        return self
+
+    def flags(self) -> list[str]:
+        return ["untrusted-content", *self.signatures.flags()]
 
 
 class SourceLibrary:
     def __init__(self, root: Path, encryption_key: bytes, limits: IntakeLimits | None = None,
-                 ocr: Any | None = None):
+                 ocr: Any | None = None, index_limits: IndexLimits | None = None,
+                 extraction: ExtractionPool | None = None, extraction_metrics: ExtractionMetrics | None = None,
+                 scanner: ContentScanner | None = None):
+        """Without an ``extraction`` pool, sources are extracted inline before ``ingest`` returns."""
         self.root = root
         self.root.mkdir(parents=True, exist_ok=True)
+        # Deferred so importing the service does not load cryptography before first use.
+        from cryptography.fernet import Fernet
+
         self.fernet = Fernet(encryption_key)
         self.limits = limits or IntakeLimits()
         self.ocr = ocr
-        self.index_path = root / "source-index.json"
-        if not self.index_path.exists():
-            self._write_index({"sessions": {}, "sources": {}, "fields": {}})
-
-    def _read_index(self) -> dict[str, Any]:
-        return json.loads(self.index_path.read_text(encoding="utf-8"))
-
-    def _write_index(self, index: dict[str, Any]) -> None:
-        pending = self.index_path.with_suffix(".pending")
-        pending.write_text(json.dumps(index, sort_keys=True, indent=2), encoding="utf-8")
-        pending.replace(self.index_path)
+        self.scanner = scanner or ContentScanner()
+        self.extraction = extraction
+        self.extraction_metrics = extraction_metrics or (extraction.metrics if extraction else ExtractionMetrics())
+        self.index_limits = index_limits or IndexLimits()
+        self.shards = SourceShards(root, max_open=self.index_limits.max_open_shards,
+                                   checkpoint_pages=self.index_limits.checkpoint_pages,
+                                   journal_size_limit=self.index_limits.journal_size_limit_bytes)
+        self._scans: OrderedDict[str, _ContentScan] = OrderedDict()
+        self._scans_lock = threading.Lock()
+
+    def _person_store(self, person_id: str, missing: str) -> SourceStore:
+        store = self.shards.for_person(person_id, create=False)
+        if store is None:
+            raise IntakeRejected(missing)
+        return store
+
+    def _session_store(self, session_id: str) -> SourceStore:
+        store = self.shards.for_session(session_id)
+        if store is None:
+            raise IntakeRejected("import session is not resumable")
+        return store
 
     def start(self, person_id: str, space_id: str, channel: str = "file") -> dict[str, Any]:
         if channel not in {"file", "camera", "folder", "share", "provider"}:
@@ -82,74 +175,474 @@ class SourceLibrary:
             "state": "receiving", "source_ids": [], "checkpoint": "created",
             "created_at": time.time(), "updated_at": time.time(),
         }
-        index = self._read_index()
-        index["sessions"][session_id] = session
-        self._write_index(index)
+        with self.shards.for_person(person_id).transaction() as tx:
+            tx.put_session(session)
+        self.shards.register_session(session_id, person_id)
         return session
 
     def ingest(self, session_id: str, filename: str, media_type: str, content: bytes,
                actor_person_id: str | None = None) -> dict[str, Any]:
+        filename = self._check_declared(filename, media_type, len(content))
+        self._verify_signature(media_type, content)
+        self._inspect_archive(media_type, content)
+        store = self._session_store(session_id)
+        with store.read() as tx:
+            person_id = self._resumable_session(tx, session_id, actor_person_id)["person_id"]
+        prepared = self._prepare(store, person_id, filename, media_type, content)
+        try:
+            with store.transaction() as tx:
+                # Re-checked: the session may have been admitted or rolled back meanwhile.
+                session = self._resumable_session(tx, session_id, actor_person_id)
+                source = self._record_prepared(tx, session, prepared)
+        except BaseException:
+            prepared.encrypted.unlink(missing_ok=True)
+            raise
+        return self._queue_extraction(source, prepared.fields)
+
+    def ingest_batch(self, session_id: str, files: Sequence[BatchFile],
+                     actor_person_id: str | None = None) -> dict[str, Any]:
+        """Ingest many files with one index transaction; a file that fails its checks is reported, not raised.
+
+        Each file is checked, scanned, encrypted and (without an extraction pool)
+        extracted on one of ``batch_workers`` threads. The files that pass are then
+        recorded together, so the batch lands in the index entirely or not at all.
+        """
+        return self._ingest_many(session_id, files, actor_person_id)
+
+    def expand_archive(self, session_id: str, source_id: str, actor_person_id: str | None = None) -> dict[str, Any]:
+        """Ingest each member of a zip source in the session as a source of its own, as one batch.
+
+        The archive passed ``inspect_zip`` when it was ingested, so its members are
+        known to expand within the limits. Each member is read by the batch worker
+        that checks it. A member's media type is guessed from its name, and its path
+        in the archive is kept in ``expanded_from``.
+        """
+        store = self._session_store(session_id)
+        with store.read() as tx:
+            person_id = self._resumable_session(tx, session_id, actor_person_id)["person_id"]
+            archive_source = tx.source(source_id)
+        if (not archive_source or archive_source["import_session_id"] != session_id
+                or archive_source["media_type"] != "application/zip" or archive_source["state"] == "deleted"):
+            raise IntakeRejected("archive source not found")
+        if archive_source.get("expanded_at"):
+            raise IntakeRejected("archive was already expanded")
+        encrypted = self.root / person_shard(person_id) / f"{source_id}.enc"
+        if is_framed(encrypted):
+            handle: BinaryIO = io.BufferedReader(FramedReader(encrypted, self.fernet))
+        else:
+            handle = io.BytesIO(self.fernet.decrypt(encrypted.read_bytes()))
+        with handle, zipfile.ZipFile(handle) as archive:
+            files = [
+                BatchFile(member.filename, mimetypes.guess_type(member.filename)[0] or "application/octet-stream",
+                          self._member_loader(archive, member))
+                for member in archive.infolist() if not member.is_dir()
+            ]
+            return self._ingest_many(session_id, files, actor_person_id, archive_source_id=source_id)
+
+    def _member_loader(self, archive: zipfile.ZipFile, member: zipfile.ZipInfo) -> Callable[[], bytes]:
+        def load() -> bytes:
+            # One byte past the limit is enough for the size check to refuse the member.
+            with archive.open(member) as stream:
+                return stream.read(self.limits.max_bytes + 1)
+        return load
+
+    def _ingest_many(self, session_id: str, files: Sequence[BatchFile], actor_person_id: str | None,
+                     archive_source_id: str | None = None) -> dict[str, Any]:
+        if not files or len(files) > self.limits.max_batch_files:
+            raise IntakeRejected("batch is empty or exceeds the configured number of files")
+        store = self._session_store(session_id)
+        with store.read() as tx:
+            person_id = self._resumable_session(tx, session_id, actor_person_id)["person_id"]
+
+        def check(file: BatchFile) -> _PreparedSource | Exception:
+            try:
+                content = file.content() if callable(file.content) else file.content
+                filename = self._check_declared(file.filename, file.media_type, len(content))
+                self._verify_signature(file.media_type, content)
+                self._inspect_archive(file.media_type, content)
+                prepared = self._prepare(store, person_id, filename, file.media_type, content)
+            except Exception as exc:
+                # Returned rather than raised, so the files other workers already encrypted can be cleaned up.
+                return exc
+            if archive_source_id:
+                prepared.expanded_from = {"source_id": archive_source_id, "member": file.filename}
+            return prepared
+
+        with ThreadPoolExecutor(max_workers=min(self.limits.batch_workers, len(files)),
+                                thread_name_prefix="source-batch") as pool:
+            checked = list(pool.map(check, files))
+        prepared = [item for item in checked if isinstance(item, _PreparedSource)]
+        failure = next((item for item in checked
+                        if isinstance(item, Exception) and not isinstance(item, IntakeRejected)), None)
+        sources = {}
+        try:
+            if failure is not None:
+                raise failure
+            with store.transaction() as tx:
+                session = self._resumable_session(tx, session_id, actor_person_id)
+                if archive_source_id:
+                    archive_source = tx.source(archive_source_id)
+                    if not archive_source or archive_source.get("expanded_at"):
+                        raise IntakeRejected("archive was already expanded")
+                    archive_source["expanded_at"] = time.time()
+                    tx.put_source(archive_source)
+                for item in prepared:
+                    sources[item.source_id] = self._record_prepared(tx, session, item)
+        except BaseException:
+            for item in prepared:
+                item.encrypted.unlink(missing_ok=True)
+            raise
+        results = []
+        for file, item in zip(files, checked):
+            if isinstance(item, IntakeRejected):
+                results.append({"filename": file.filename, "status": "rejected", "error": str(item)})
+            else:
+                source = self._queue_extraction(sources[item.source_id], item.fields)
+                results.append({"filename": file.filename, "status": "accepted", "source": source})
+        return {"session_id": session_id, "accepted": len(prepared), "rejected": len(files) - len(prepared),
+                "results": results}
+
+    def begin_upload(self, session_id: str, filename: str, media_type: str, size_bytes: int,
+                     actor_person_id: str | None = None) -> dict[str, Any]:
+        """Start a chunked upload of ``size_bytes``; chunks follow with ``upload_chunk``."""
+        if size_bytes < 1:
+            raise IntakeRejected("file is empty or exceeds the configured limit")
+        filename = self._check_declared(filename, media_type, size_bytes)
+        store = self._session_store(session_id)
+        upload_id = f"upl_{secrets.token_urlsafe(12)}"
+        with store.transaction() as tx:
+            session = self._resumable_session(tx, session_id, actor_person_id)
+            upload = {
+                "schema_version": "source-upload.v1", "upload_id": upload_id, "session_id": session_id,
+                "person_id": session["person_id"], "filename": filename, "media_type": media_type,
+                "size_bytes": size_bytes, "received_bytes": 0, "stored_bytes": len(FRAME_MAGIC),
+                "created_at": time.time(), "updated_at": time.time(),
+            }
+            part = self._upload_path(upload)
+            part.parent.mkdir(parents=True, exist_ok=True)
+            part.write_bytes(FRAME_MAGIC)
+            tx.put_upload(upload)
+        return upload
+
+    def upload_status(self, session_id: str, upload_id: str, actor_person_id: str | None = None) -> dict[str, Any]:
+        with self._session_store(session_id).read() as tx:
+            return self._open_upload(tx, session_id, upload_id, actor_person_id)
+
+    def upload_chunk(self, session_id: str, upload_id: str, offset: int, chunk: bytes,
+                     actor_person_id: str | None = None) -> dict[str, Any]:
+        """Encrypt and append the chunk that starts at ``offset``; it must be where the upload left off."""
+        if not chunk or len(chunk) > self.limits.max_chunk_bytes:
+            raise IntakeRejected("chunk is empty or exceeds the configured limit")
+        store = self._session_store(session_id)
+        with store.read() as tx:
+            upload = self._open_upload(tx, session_id, upload_id, actor_person_id)
+        self._check_offset(upload, offset, chunk)
+        if offset == 0:
+            self._verify_signature(upload["media_type"], chunk)
+        # Encrypted before the write transaction so it does not hold the write lock.
+        frame = encode_frame(self.fernet, chunk)
+        with store.transaction() as tx:
+            upload = self._open_upload(tx, session_id, upload_id, actor_person_id)
+            self._check_offset(upload, offset, chunk)
+            with open(self._upload_path(upload), "r+b") as handle:
+                # Drops whatever a crashed earlier append left past the committed length.
+                handle.truncate(upload["stored_bytes"])
+                handle.seek(upload["stored_bytes"])
+                handle.write(frame)
+                handle.flush()
+                os.fsync(handle.fileno())
+            upload.update(received_bytes=offset + len(chunk), stored_bytes=upload["stored_bytes"] + len(frame),
+                          updated_at=time.time())
+            tx.put_upload(upload)
+        with self._scans_lock:
+            scan = self._scans.pop(upload_id, None)
+        if offset == 0:
+            scan = _ContentScan(self.scanner)
+        if scan is not None and scan.received == offset:
+            # Chunks that raced each other leave no scan; completing then replays the file instead.
+            scan.feed(chunk)
+            with self._scans_lock:
+                self._scans[upload_id] = scan
+                while len(self._scans) > MAX_TRACKED_UPLOADS:
+                    self._scans.popitem(last=False)
+        return upload
+
+    def complete_upload(self, session_id: str, upload_id: str, actor_person_id: str | None = None) -> dict[str, Any]:
+        """Check the assembled upload like ``ingest`` does and record it as a source."""
+        store = self._session_store(session_id)
+        with store.read() as tx:
+            upload = self._open_upload(tx, session_id, upload_id, actor_person_id)
+        if upload["received_bytes"] != upload["size_bytes"]:
+            raise IntakeRejected("upload is incomplete")
+        media_type, part = upload["media_type"], self._upload_path(upload)
+        with self._scans_lock:
+            scan = self._scans.pop(upload_id, None)
+        try:
+            if scan is None or scan.received != upload["received_bytes"]:
+                scan = _ContentScan(self.scanner)
+                for chunk in iter_plaintext(part, self.fernet):
+                    scan.feed(chunk)
+            if media_type == "application/zip":
+                # Buffered, because zipfile expects reads of a fixed length not to stop at a frame boundary.
+                with io.BufferedReader(FramedReader(part, self.fernet)) as reader:
+                    self._inspect_archive(media_type, reader)
+            source_id = f"src_{secrets.token_urlsafe(12)}"
+            fields = [] if self.extraction else self._extract_cached(
+                store, source_id, upload["filename"], media_type, scan.sha256.hexdigest(), upload["size_bytes"],
+                lambda: self._extraction_input(part, media_type))
+        except FileNotFoundError as exc:
+            # Completed by a concurrent call, which moved the file.
+            raise IntakeRejected("upload not found") from exc
+        encrypted = part.parent.parent / f"{source_id}.enc"
+        try:
+            with store.transaction() as tx:
+                session = self._resumable_session(tx, session_id, actor_person_id)
+                if tx.upload(upload_id) is None:
+                    raise IntakeRejected("upload not found")
+                source = self._record_source(tx, session, source_id, upload["filename"], media_type,
+                                             scan.sha256.hexdigest(), upload["size_bytes"], scan.flags(), fields)
+                tx.remove_upload(upload_id)
+                os.replace(part, encrypted)
+        except BaseException:
+            if encrypted.exists():
+                os.replace(encrypted, part)
+            raise
+        return self._queue_extraction(source, fields)
+
+    def session_status(self, session_id: str, actor_person_id: str | None = None) -> dict[str, Any]:
+        """The session with the state of each of its sources; stale extractions are queued again."""
+        with self._session_store(session_id).read() as tx:
+            session = tx.session(session_id)
+            if not session or (actor_person_id and session["person_id"] != actor_person_id):
+                raise IntakeRejected("import session not found")
+            sources = tx.session_source_states(session_id)
+        now = time.time()
+        for source in sources:
+            if source["state"] == "extracting" and now - source["extraction_queued_at"] > EXTRACTION_LEASE_SECONDS:
+                # Its job was lost with a restarted worker; redoing it is harmless if it was only slow.
+                touched = self._touch_extraction(session["person_id"], source["source_id"])
+                if touched is not None:
+                    self._queue_extraction(touched, [])
+        extracting = sum(1 for source in sources if source["state"] == "extracting")
+        return {**session, "sources": [{"source_id": source["source_id"], "state": source["state"]}
+                                       for source in sources], "extracting": extracting}
+
+    def _check_declared(self, filename: str, media_type: str, size_bytes: int) -> str:
         filename = Path(filename).name
-        if not filename or len(content) > self.limits.max_bytes:
+        if not filename or size_bytes > self.limits.max_bytes:
             raise IntakeRejected("file is empty or exceeds the configured limit")
         if media_type not in ALLOWED_MEDIA_TYPES:
             raise IntakeRejected("unsupported media type")
-        self._verify_signature(media_type, content)
         guessed = mimetypes.guess_type(filename)[0]
         if guessed and media_type not in {guessed, "application/octet-stream"}:
             raise IntakeRejected("declared media type does not match filename")
-        self._inspect_archive(media_type, content)
-        index = self._read_index()
-        session = index["sessions"].get(session_id)
-        if not session or session["state"] in {"admitted", "rejected", "rolled_back"}:
-            raise IntakeRejected("import session is not resumable")
-        if actor_person_id and session["person_id"] != actor_person_id:
-            raise IntakeRejected("import session not found")
-        checksum = hashlib.sha256(content).hexdigest()
-        duplicate = next((v for v in index["sources"].values()
-                          if v["person_id"] == session["person_id"] and v["checksum_sha256"] == checksum
-                          and v["state"] != "deleted"), None)
+        return filename
+
+    def _prepare(self, store: SourceStore, person_id: str, filename: str, media_type: str,
+                 content: bytes) -> _PreparedSource:
+        """Checksum, scan, encrypt and (inline) extract checked content, before any write transaction."""
+        # Done outside the transaction so they do not hold the write lock.
         source_id = f"src_{secrets.token_urlsafe(12)}"
-        prior = self._find_prior(index, session["person_id"], filename)
+        checksum = hashlib.sha256(content).hexdigest()
+        encrypted = self.root / person_shard(person_id) / f"{source_id}.enc"
+        encrypted.write_bytes(self.fernet.encrypt(content))
+        try:
+            security_flags = self._security_flags(content)
+            fields = [] if self.extraction else self._extract_cached(store, source_id, filename, media_type, checksum,
+                                                                     len(content), lambda: content)
+        except BaseException:
+            encrypted.unlink(missing_ok=True)
+            raise
+        return _PreparedSource(source_id, filename, media_type, checksum, len(content), security_flags, fields,
+                               encrypted)
+
+    def _record_prepared(self, tx: SourceTransaction, session: dict[str, Any],
+                         prepared: _PreparedSource) -> dict[str, Any]:
+        return self._record_source(tx, session, prepared.source_id, prepared.filename, prepared.media_type,
+                                   prepared.checksum, prepared.size_bytes, prepared.security_flags, prepared.fields,
+                                   expanded_from=prepared.expanded_from)
+
+    def _record_source(self, tx: SourceTransaction, session: dict[str, Any], source_id: str, filename: str,
+                       media_type: str, checksum: str, size_bytes: int, security_flags: list[str],
+                       fields: list[dict[str, Any]], expanded_from: dict[str, str] | None = None) -> dict[str, Any]:
+        duplicate = tx.find_source(session["person_id"], checksum_sha256=checksum)
+        prior = tx.find_source(session["person_id"], filename=filename)
         source = {
             "schema_version": "source-object.v1", "source_id": source_id,
             "person_id": session["person_id"], "space_id": session["space_id"],
-            "import_session_id": session_id, "media_type": media_type, "filename": filename,
-            "checksum_sha256": checksum, "size_bytes": len(content), "state": "quarantined",
+            "import_session_id": session["session_id"], "media_type": media_type, "filename": filename,
+            "checksum_sha256": checksum, "size_bytes": size_bytes, "state": "quarantined",
             "visibility": "private", "version": (prior or {}).get("version", 0) + 1,
             "prior_version_id": (prior or {}).get("source_id"),
             "duplicate_of": (duplicate or {}).get("source_id"),
-            "security_flags": self._security_flags(content), "created_at": time.time(),
+            "security_flags": security_flags, "created_at": time.time(),
         }
-        person_dir = self.root / hashlib.sha256(session["person_id"].encode()).hexdigest()
-        person_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
-        (person_dir / f"{source_id}.enc").write_bytes(self.fernet.encrypt(content))
-        index["sources"][source_id] = source
-        session["source_ids"].append(source_id)
+        if expanded_from:
+            source["expanded_from"] = expanded_from
+        if self.extraction:
+            source.update(state="extracting", extraction_queued_at=time.time())
+        tx.put_source(source)
+        tx.put_fields(source_id, fields)
+        self._remember_extraction(tx, checksum, fields)
         session.update(state="preview", checkpoint=f"source:{source_id}", updated_at=time.time())
-        index["fields"][source_id] = self._extract(source_id, filename, media_type, content)
-        self._write_index(index)
-        return {**source, "fields": index["fields"][source_id]}
+        tx.put_session(session)
+        return source
 
-    def _inspect_archive(self, media_type: str, content: bytes) -> None:
+    def _queue_extraction(self, source: dict[str, Any], fields: list[dict[str, Any]]) -> dict[str, Any]:
+        if source["state"] != "extracting":
+            return {**source, "fields": fields}
+        person_id, source_id = source["person_id"], source["source_id"]
+        if self.extraction.submit(lambda: self._finish_extraction(person_id, source_id)):
+            return {**source, "fields": fields}
+        # The queue is full: extract in this request, which slows the caller instead of queueing without bound.
+        finished = self._finish_extraction(person_id, source_id)
+        return finished or {**source, "fields": fields}
+
+    def _touch_extraction(self, person_id: str, source_id: str) -> dict[str, Any] | None:
+        with self._person_store(person_id, "source not found").transaction() as tx:
+            source = tx.source(source_id)
+            if not source or source["state"] != "extracting":
+                return None
+            source["extraction_queued_at"] = time.time()
+            tx.put_source(source)
+        return source
+
+    def _finish_extraction(self, person_id: str, source_id: str) -> dict[str, Any] | None:
+        """Extract a source left in the ``extracting`` state; None if it was removed or finished meanwhile."""
+        store = self._person_store(person_id, "source not found")
+        with store.read() as tx:
+            source = tx.source(source_id)
+        if not source or source["state"] != "extracting":
+            return None
+        filename, media_type, size_bytes = source["filename"], source["media_type"], source["size_bytes"]
+        encrypted = self.root / person_shard(person_id) / f"{source_id}.enc"
+        try:
+            fields = self._extract_cached(store, source_id, filename, media_type, source["checksum_sha256"],
+                                          size_bytes, lambda: self._extraction_input(encrypted, media_type))
+        except FileNotFoundError:
+            # Rolled back or deleted while queued.
+            return None
+        except Exception:
+            fields = [self._metadata_field(source_id, filename, media_type, size_bytes, "extraction-failed")]
+        with store.transaction() as tx:
+            source = tx.source(source_id)
+            if not source or source["state"] != "extracting":
+                return None
+            source["state"] = "quarantined"
+            source.pop("extraction_queued_at", None)
+            tx.put_source(source)
+            tx.put_fields(source_id, fields)
+            self._remember_extraction(tx, source["checksum_sha256"], fields)
+        return {**source, "fields": fields}
+
+    def _extract_cached(self, store: SourceStore, source_id: str, filename: str, media_type: str, checksum: str,
+                        byte_length: int, load: Callable[[], bytes]) -> list[dict[str, Any]]:
+        """``_extract``, reusing what the same processor version extracted from the same bytes before.
+
+        Cached fields are kept in the person's own shard, without the source id, and
+        are given the new source's ids on reuse. ``load`` is only called on a miss, so
+        a hit does not decrypt the content either. ``_remember_extraction`` fills the
+        cache when the source is recorded.
+        """
+        processor = self._processor(media_type)
+        version = self._processor_version(processor)
+        cacheable = processor != "binary-metadata.v1" and self.index_limits.extraction_cache_bytes > 0
+        if cacheable:
+            with store.transaction() as tx:
+                cached = tx.cached_fields(checksum, version)
+            self.extraction_metrics.cache(hit=cached is not None)
+            if cached is not None:
+                return [self._metadata_field(source_id, filename, media_type, byte_length, processor)] + [
+                    {**field, "source_id": source_id, "field_id": f"fld_{source_id}{field['field_id']}"}
+                    for field in cached]
+        started = time.perf_counter()
+        try:
+            fields = self._extract(source_id, filename, media_type, load(), byte_length=byte_length)
+        except FileNotFoundError:
+            raise
+        except Exception:
+            self.extraction_metrics.observe(processor, time.perf_counter() - started, ok=False)
+            raise
+        self.extraction_metrics.observe(processor, time.perf_counter() - started, ok=True)
+        return fields
+
+    def _remember_extraction(self, tx: SourceTransaction, checksum: str, fields: list[dict[str, Any]]) -> None:
+        """Cache freshly extracted fields in the transaction that records them, so no cache entry outlives a failed write."""
+        processor = fields[0]["value"]["processor"] if fields else "binary-metadata.v1"
+        if processor in {"binary-metadata.v1", "extraction-failed"} or self.index_limits.extraction_cache_bytes <= 0:
+            return
+        # The metadata field names the file, so it is rebuilt for each source instead of cached.
+        prefix = f"fld_{fields[0]['source_id']}"
+        content_fields = [{**field, "source_id": "", "field_id": field["field_id"][len(prefix):]}
+                          for field in fields[1:]]
+        tx.put_cached_fields(checksum, self._processor_version(processor), content_fields,
+                             self.index_limits.extraction_cache_bytes)
+
+    def _processor_version(self, processor: str) -> str:
+        if processor != "local-ocr.v1":
+            return processor
+        # An OCR callable may expose ``version``; changing it stops earlier results from being reused.
+        engine = getattr(self.ocr, "version", None) or getattr(self.ocr, "__qualname__", type(self.ocr).__qualname__)
+        return f"{processor}+{engine}"
+
+    def _extraction_input(self, encrypted: Path, media_type: str) -> bytes:
+        processor = self._processor(media_type)
+        if processor == "binary-metadata.v1":
+            return b""
+        chunks = iter_plaintext(encrypted, self.fernet) if is_framed(encrypted) else [
+            self.fernet.decrypt(encrypted.read_bytes())]
+        if processor == "local-ocr.v1":
+            return b"".join(chunks)
+        head = b""
+        for chunk in chunks:
+            head += chunk[:EXTRACT_HEAD_BYTES - len(head)]
+            if len(head) >= EXTRACT_HEAD_BYTES:
+                break
+        return head
+
+    def _open_upload(self, tx: SourceTransaction, session_id: str, upload_id: str,
+                     actor_person_id: str | None) -> dict[str, Any]:
+        self._resumable_session(tx, session_id, actor_person_id)
+        upload = tx.upload(upload_id)
+        if not upload or upload["session_id"] != session_id:
+            raise IntakeRejected("upload not found")
+        return upload
+
+    @staticmethod
+    def _check_offset(upload: dict[str, Any], offset: int, chunk: bytes) -> None:
+        if offset != upload["received_bytes"]:
+            raise UploadConflict(upload["received_bytes"])
+        if offset + len(chunk) > upload["size_bytes"]:
+            raise IntakeRejected("chunk extends past the declared size")
+
+    def _upload_path(self, upload: dict[str, Any]) -> Path:
+        return self.root / person_shard(upload["person_id"]) / "uploads" / f"{upload['upload_id']}.part"
+
+    def _discard_uploads(self, tx: SourceTransaction, session_id: str) -> None:
+        for upload in tx.session_uploads(session_id):
+            self._upload_path(upload).unlink(missing_ok=True)
+            tx.remove_upload(upload["upload_id"])
+            with self._scans_lock:
+                self._scans.pop(upload["upload_id"], None)
+
+    @staticmethod
+    def _resumable_session(tx: SourceTransaction, session_id: str, actor_person_id: str | None) -> dict[str, Any]:
+        session = tx.session(session_id)
+        if not session or session["state"] in {"admitted", "rejected", "rolled_back"}:
+            raise IntakeRejected("import session is not resumable")
+        if actor_person_id and session["person_id"] != actor_person_id:
+            raise IntakeRejected("import session not found")
+        return session
+
+    def _inspect_archive(self, media_type: str, content: bytes | BinaryIO) -> None:
         if media_type != "application/zip":
             return
         try:
-            from io import BytesIO
-            with zipfile.ZipFile(BytesIO(content)) as archive:
-                members = archive.infolist()
-                if len(members) > self.limits.max_archive_members:
-                    raise IntakeRejected("archive has too many members")
-                total = 0
-                for member in members:
-                    path = Path(member.filename)
-                    if path.is_absolute() or ".." in path.parts:
-                        raise IntakeRejected("archive path traversal detected")
-                    total += member.file_size
-                if total > self.limits.max_archive_expanded_bytes:
-                    raise IntakeRejected("archive expansion limit exceeded")
-        except zipfile.BadZipFile as exc:
-            raise IntakeRejected("invalid archive") from exc
+            inspect_zip(io.BytesIO(content) if isinstance(content, bytes) else content,
+                        max_members=self.limits.max_archive_members,
+                        max_expanded_bytes=self.limits.max_archive_expanded_bytes)
+        except ArchiveRejected as exc:
+            raise IntakeRejected(str(exc)) from exc
 
     @staticmethod
     def _verify_signature(media_type: str, content: bytes) -> None:
@@ -163,32 +656,20 @@ class SourceLibrary:
         if expected and not any(content.startswith(value) for value in expected):
             raise IntakeRejected("file signature does not match declared media type")
 
-    @staticmethod
-    def _security_flags(content: bytes) -> list[str]:
-        flags = ["untrusted-content"]
-        if any(pattern.search(content[:2_000_000]) for pattern in PROMPT_INJECTION_PATTERNS):
-            flags.append("document-prompt-injection")
-        if b"EICAR-STANDARD-ANTIVIRUS-TEST-FILE" in content:
-            flags.append("malware-signature")
-        return flags
-
-    def _extract(self, source_id: str, filename: str, media_type: str, content: bytes) -> list[dict[str, Any]]:
+    def _security_flags(self, content: bytes) -> list[str]:
+        return ["untrusted-content", *self.scanner.scan(content)]
+
+    def _extract(self, source_id: str, filename: str, media_type: str, content: bytes,
+                 byte_length: int | None = None) -> list[dict[str, Any]]:
+        """``content`` may be just the leading ``EXTRACT_HEAD_BYTES`` of text; ``byte_length`` is the full size."""
         text = ""
-        processor = "binary-metadata.v1"
-        if media_type.startswith("text/") or media_type == "application/json":
+        processor = self._processor(media_type)
+        if processor == "local-structured-text.v1":
             text = content.decode("utf-8", errors="replace")[:100_000]
-            processor = "local-structured-text.v1"
-        elif media_type.startswith("image/") and self.ocr:
+        elif processor == "local-ocr.v1":
             text = str(self.ocr(content, media_type))[:100_000]
-            processor = "local-ocr.v1"
-        fields: list[dict[str, Any]] = [{
-            "schema_version": "extracted-field.v1", "field_id": f"fld_{source_id}_metadata",
-            "source_id": source_id, "name": "source_metadata",
-            "value": {"filename": filename, "media_type": media_type, "byte_length": len(content),
-                      "processor": processor},
-            "region": {"label": "source metadata"}, "confidence": 1.0,
-            "corrected_value": None, "correction_actor": None,
-        }]
+        fields = [self._metadata_field(source_id, filename, media_type,
+                                       len(content) if byte_length is None else byte_length, processor)]
         if not text:
             return fields
         fields.append({
@@ -211,92 +692,215 @@ class SourceLibrary:
                            "confidence": 0.95, "corrected_value": None, "correction_actor": None})
         return fields
 
+    def _processor(self, media_type: str) -> str:
+        if media_type.startswith("text/") or media_type == "application/json":
+            return "local-structured-text.v1"
+        if media_type.startswith("image/") and self.ocr:
+            return "local-ocr.v1"
+        return "binary-metadata.v1"
+
     @staticmethod
-    def _find_prior(index: dict[str, Any], person_id: str, filename: str) -> dict[str, Any] | None:
-        matches = [v for v in index["sources"].values()
-                   if v["person_id"] == person_id and v["filename"] == filename and v["state"] != "deleted"]
-        return max(matches, key=lambda item: item["version"], default=None)
+    def _metadata_field(source_id: str, filename: str, media_type: str, byte_length: int,
+                        processor: str) -> dict[str, Any]:
+        return {
+            "schema_version": "extracted-field.v1", "field_id": f"fld_{source_id}_metadata",
+            "source_id": source_id, "name": "source_metadata",
+            "value": {"filename": filename, "media_type": media_type, "byte_length": byte_length,
+                      "processor": processor},
+            "region": {"label": "source metadata"}, "confidence": 1.0,
+            "corrected_value": None, "correction_actor": None,
+        }
 
     def correct_field(self, person_id: str, source_id: str, field_id: str, value: Any) -> dict[str, Any]:
-        index = self._read_index()
-        source = index["sources"].get(source_id)
-        if not source or source["person_id"] != person_id:
-            raise IntakeRejected("source not found")
-        field = next((f for f in index["fields"].get(source_id, []) if f["field_id"] == field_id), None)
-        if not field:
-            raise IntakeRejected("field not found")
-        field.update(corrected_value=value, correction_actor="person")
-        self._write_index(index)
+        with self._person_store(person_id, "source not found").transaction() as tx:
+            source = tx.source(source_id)
+            if not source or source["person_id"] != person_id:
+                raise IntakeRejected("source not found")
+            field = next((f for f in tx.fields(source_id) if f["field_id"] == field_id), None)
+            if not field:
+                raise IntakeRejected("field not found")
+            field.update(corrected_value=value, correction_actor="person")
+            tx.put_field(field)
         return field
 
     def admit(self, person_id: str, session_id: str) -> dict[str, Any]:
-        index = self._read_index()
-        session = index["sessions"].get(session_id)
-        if not session or session["person_id"] != person_id:
-            raise IntakeRejected("session not found")
-        blocked = []
-        for source_id in session["source_ids"]:
-            source = index["sources"][source_id]
-            if "malware-signature" in source["security_flags"]:
-                blocked.append(source_id)
-            else:
-                source["state"] = "admitted"
-        session["state"] = "rejected" if blocked else "admitted"
-        session["checkpoint"] = session["state"]
-        session["updated_at"] = time.time()
-        self._write_index(index)
+        with self._person_store(person_id, "session not found").transaction() as tx:
+            session = tx.session(session_id)
+            if not session or session["person_id"] != person_id:
+                raise IntakeRejected("session not found")
+            session["source_ids"] = tx.session_source_ids(session_id)
+            sources = [tx.source(source_id) for source_id in session["source_ids"]]
+            if any(source["state"] == "extracting" for source in sources):
+                raise IntakeRejected("sources are still being extracted")
+            blocked = []
+            for source in sources:
+                source_id = source["source_id"]
+                if "malware-signature" in source["security_flags"]:
+                    blocked.append(source_id)
+                else:
+                    source["state"] = "admitted"
+                    tx.put_source(source)
+            self._discard_uploads(tx, session_id)
+            session["state"] = "rejected" if blocked else "admitted"
+            session["checkpoint"] = session["state"]
+            session["updated_at"] = time.time()
+            tx.put_session(session)
         if blocked:
             raise IntakeRejected("malware policy rejected the import")
         return session
 
     def list_sources(self, person_id: str) -> list[dict[str, Any]]:
-        return [v for v in self._read_index()["sources"].values()
-                if v["person_id"] == person_id and v["state"] != "deleted"]
+        store = self.shards.for_person(person_id, create=False)
+        if store is None:
+            return []
+        with store.read() as tx:
+            return tx.sources(person_id)
+
+    def page_sources(self, person_id: str, *, limit: int | None = None, cursor: str | None = None,
+                     created_after: float | None = None, created_before: float | None = None,
+                     projection: Sequence[str] | None = None, **filters: str) -> dict[str, Any]:
+        """One page of ``list_sources``, narrowed by ``SOURCE_FILTERS`` and a ``created_at`` range.
+
+        ``cursor`` is the ``next_cursor`` of the previous page, which is None on the last
+        one; without ``limit`` every match is returned at once. ``projection`` keeps only
+        those keys of each source, plus ``source_id``.
+        """
+        unknown = set(filters) - set(SOURCE_FILTERS)
+        if unknown:
+            raise IntakeRejected(f"unknown source filter {sorted(unknown)[0]}")
+        after = 0
+        if cursor:
+            try:
+                after = int(base64.urlsafe_b64decode(cursor.encode() + b"=" * (-len(cursor) % 4)))
+            except ValueError as exc:
+                raise IntakeRejected("invalid cursor") from exc
+        if limit is not None:
+            limit = min(max(limit, 1), MAX_SOURCE_PAGE)
+        store = self.shards.for_person(person_id, create=False)
+        if store is None:
+            return {"sources": [], "next_cursor": None}
+        with store.read() as tx:
+            # One row past the page says whether there is another page.
+            rows = tx.page_sources(person_id, after=after, limit=None if limit is None else limit + 1,
+                                   created_after=created_after, created_before=created_before, **filters)
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = base64.urlsafe_b64encode(str(rows[-1][0]).encode()).decode().rstrip("=")
+        sources = [source for _, source in rows]
+        if projection:
+            keys = {"source_id", *projection}
+            sources = [{key: value for key, value in source.items() if key in keys} for source in sources]
+        return {"sources": sources, "next_cursor": next_cursor}
+
+    def search(self, person_id: str, query: str, limit: int = 20, offset: int = 0) -> dict[str, Any]:
+        """Fields of the person's sources that contain every word of ``query``, best match first.
+
+        A word ending in ``*`` matches as a prefix. Each result cites the character
+        ranges of the matches in the source's text. For a corrected field it cites the
+        field's whole region, since the correction's offsets are not the document's.
+        ``next_offset`` is None on the last page.
+        """
+        terms = re.findall(r"(\w+)(\*?)", query)
+        if not terms:
+            raise IntakeRejected("search query has no words")
+        limit = min(max(limit, 1), MAX_SEARCH_RESULTS)
+        offset = max(offset, 0)
+        store = self.shards.for_person(person_id, create=False)
+        if store is None:
+            return {"query": query, "results": [], "next_offset": None}
+        match = " ".join(f'"{word}"{star}' for word, star in terms)
+        with store.read() as tx:
+            rows = tx.search_fields(person_id, match, limit + 1, offset, _MATCH_MARKS)
+        results = []
+        for field, source, score, snippet, highlighted in rows[:limit]:
+            snippet_text, snippet_ranges = _unmark(snippet)
+            _, ranges = _unmark(highlighted)
+            region = field.get("region", {}).get("character_range")
+            corrected = field.get("corrected_value") is not None
+            if region and not corrected:
+                citations = [[region[0] + start, region[0] + end] for start, end in ranges]
+            else:
+                citations = [region] if region else []
+            results.append({
+                "source_id": source["source_id"], "filename": source["filename"], "space_id": source["space_id"],
+                "field_id": field["field_id"], "field_name": field["name"], "corrected": corrected,
+                # bm25 is lower for better matches; negated so that a higher score ranks first.
+                "score": -score, "snippet": snippet_text, "snippet_highlights": snippet_ranges,
+                "character_ranges": citations,
+            })
+        return {"query": query, "results": results, "next_offset": offset + limit if len(rows) > limit else None}
 
     def reclassify(self, person_id: str, source_id: str, space_id: str, classification: str) -> dict[str, Any]:
-        index = self._read_index()
-        source = index["sources"].get(source_id)
-        if not source or source["person_id"] != person_id or source["state"] == "deleted":
-            raise IntakeRejected("source not found")
-        source["space_id"] = space_id
-        source["classification"] = classification
-        source["version"] += 1
-        self._write_index(index)
+        with self._person_store(person_id, "source not found").transaction() as tx:
+            source = tx.source(source_id)
+            if not source or source["person_id"] != person_id or source["state"] == "deleted":
+                raise IntakeRejected("source not found")
+            source["space_id"] = space_id
+            source["classification"] = classification
+            source["version"] += 1
+            tx.put_source(source)
         return source
 
     def export_source(self, person_id: str, source_id: str) -> bytes:
-        index = self._read_index()
-        source = index["sources"].get(source_id)
+        with self._person_store(person_id, "source not found").read() as tx:
+            source = tx.source(source_id)
         if not source or source["person_id"] != person_id or source["state"] == "deleted":
             raise IntakeRejected("source not found")
-        person_dir = self.root / hashlib.sha256(person_id.encode()).hexdigest()
-        return self.fernet.decrypt((person_dir / f"{source_id}.enc").read_bytes())
+        encrypted = self.root / person_shard(person_id) / f"{source_id}.enc"
+        if is_framed(encrypted):
+            return b"".join(iter_plaintext(encrypted, self.fernet))
+        return self.fernet.decrypt(encrypted.read_bytes())
 
     def delete_source(self, person_id: str, source_id: str) -> None:
-        index = self._read_index()
-        source = index["sources"].get(source_id)
-        if not source or source["person_id"] != person_id:
-            raise IntakeRejected("source not found")
-        person_dir = self.root / hashlib.sha256(person_id.encode()).hexdigest()
-        (person_dir / f"{source_id}.enc").unlink(missing_ok=True)
-        index["fields"].pop(source_id, None)
-        source.update(state="deleted", checksum_sha256="", size_bytes=0)
-        self._write_index(index)
+        with self._person_store(person_id, "source not found").transaction() as tx:
+            source = tx.source(source_id)
+            if not source or source["person_id"] != person_id:
+                raise IntakeRejected("source not found")
+            (self.root / person_shard(person_id) / f"{source_id}.enc").unlink(missing_ok=True)
+            tx.remove_fields(source_id)
+            checksum = source["checksum_sha256"]
+            source.update(state="deleted", checksum_sha256="", size_bytes=0)
+            tx.put_source(source)
+            self._forget_extraction(tx, person_id, checksum)
+
+    @staticmethod
+    def _forget_extraction(tx: SourceTransaction, person_id: str, checksum: str) -> None:
+        # Cached fields are derived from the content, so they go once no live source has those bytes.
+        if checksum and tx.find_source(person_id, checksum_sha256=checksum) is None:
+            tx.drop_cached_fields(checksum)
 
     def rollback(self, person_id: str, session_id: str) -> None:
-        index = self._read_index()
-        session = index["sessions"].get(session_id)
-        if not session or session["person_id"] != person_id:
-            raise IntakeRejected("session not found")
-        for source_id in list(session["source_ids"]):
-            source = index["sources"].get(source_id)
-            if source:
-                person_dir = self.root / hashlib.sha256(person_id.encode()).hexdigest()
+        with self._person_store(person_id, "session not found").transaction() as tx:
+            session = tx.session(session_id)
+            if not session or session["person_id"] != person_id:
+                raise IntakeRejected("session not found")
+            person_dir = self.root / person_shard(person_id)
+            checksums = set()
+            for source_id in tx.session_source_ids(session_id):
                 (person_dir / f"{source_id}.enc").unlink(missing_ok=True)
-                index["fields"].pop(source_id, None)
-                index["sources"].pop(source_id, None)
-        session.update(state="rolled_back", checkpoint="rolled_back", updated_at=time.time())
-        self._write_index(index)
+                checksums.add(tx.source(source_id)["checksum_sha256"])
+                tx.remove_source(source_id)
+            for checksum in checksums:
+                self._forget_extraction(tx, person_id, checksum)
+            self._discard_uploads(tx, session_id)
+            session.update(state="rolled_back", checkpoint="rolled_back", updated_at=time.time())
+            tx.put_session(session)
+
+
+def _unmark(marked: str) -> tuple[str, list[list[int]]]:
+    """``marked`` without ``_MATCH_MARKS``, and the ``[start, end)`` of each span they wrapped."""
+    opening, closing = _MATCH_MARKS
+    pieces, ranges, position, start = [], [], 0, 0
+    for piece in re.split(f"({opening}|{closing})", marked):
+        if piece == opening:
+            start = position
+        elif piece == closing:
+            ranges.append([start, position])
+        else:
+            pieces.append(piece)
+            position += len(piece)
+    return "".join(pieces), ranges
 
 
 PROVIDER_CATALOG: dict[str, dict[str, Any]] = {
@@ -0,0 +1,122 @@
+"""Structured logging off the request path: a bounded queue, a writer thread, and sampling.
+
+``QueueLogging.install`` moves a logger's handlers, plus the root handlers it
+would have propagated to, behind a ``QueueHandler``. Request threads only
+enqueue the record and a ``QueueListener`` thread does the formatting and I/O.
+When the buffer is full, records are dropped and counted instead of blocking
+the request.
+
+``EventSampler`` keeps one in N records for chosen high-volume events such as
+``kv_get``. Warnings and errors are never sampled away.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+def parse_sample_rates(spec: str) -> dict[str, int]:
+    """Parse ``"kv_get=100,health=10"`` into keep-one-in-N rates."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, every = item.partition("=")
+        rates[event.strip()] = max(1, int(every))
+    return rates
+
+
+class EventSampler:
+    def __init__(self, rates: dict[str, int] | None = None):
+        self.rates = dict(rates or {})
+        self.sampled_out: dict[str, int] = {}
+        self._seen: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def keep(self, level: int, event: str) -> bool:
+        every = self.rates.get(event)
+        if every is None or every <= 1 or level >= logging.WARNING:
+            return True
+        with self._lock:
+            seen = self._seen.get(event, 0)
+            self._seen[event] = seen + 1
+            if seen % every == 0:
+                return True
+            self.sampled_out[event] = self.sampled_out.get(event, 0) + 1
+            return False
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue, so hand the record over as is and let the writer thread format it.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+
+class _FlushingQueueListener(QueueListener):
+    stop_timeout_seconds = 5.0
+
+    def enqueue_sentinel(self) -> None:
+        # The buffer may be full at shutdown; wait for the writer to free a slot rather than fail.
+        self.queue.put(self._sentinel, timeout=self.stop_timeout_seconds)
+
+
+class QueueLogging:
+    def __init__(self, handler: _DroppingQueueHandler, listener: QueueListener, capacity: int):
+        self.handler = handler
+        self.listener = listener
+        self.capacity = capacity
+
+    @classmethod
+    def install(cls, logger: logging.Logger, capacity: int = 10_000) -> "QueueLogging | None":
+        """Route ``logger`` through a bounded queue; returns None when there is nothing to route."""
+        handlers = list(logger.handlers)
+        if logger.propagate:
+            handlers.extend(handler for handler in logging.getLogger().handlers if handler not in handlers)
+        if not handlers:
+            return None
+        handler = _DroppingQueueHandler(queue.Queue(maxsize=capacity))
+        listener = _FlushingQueueListener(handler.queue, *handlers, respect_handler_level=True)
+        logger.handlers = [handler]
+        logger.propagate = False
+        listener.start()
+        installed = cls(handler, listener, capacity)
+        atexit.register(installed.stop)
+        return installed
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    @property
+    def pending(self) -> int:
+        return self.handler.queue.qsize()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the writer thread; safe to call more than once.
+
+        If the writer stays wedged for the whole stop timeout, the remaining records
+        are abandoned with the daemon writer thread instead of hanging shutdown.
+        """
+        if self.listener._thread is None:
+            return
+        try:
+            self.listener.stop()
+        except queue.Full:
+            pass
+
+
+__all__ = ["EventSampler", "QueueLogging", "parse_sample_rates"]
@@ -0,0 +1,141 @@
+"""Versioned schema migrations recorded in a ``schema_version`` table.
+
+Starting a replica costs one ``SELECT MAX(version)`` when the schema is current.
+Only when migrations are pending does a replica take the migration lock, which
+is ``pg_advisory_xact_lock`` on Postgres and ``BEGIN IMMEDIATE`` on SQLite. It
+then re-reads the version and applies what is still missing in one
+transaction. Replicas that start together therefore queue on the lock instead
+of racing DDL, and all but the first find nothing left to do.
+
+Migrations are append-only: never edit one that has shipped, add a new version.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+
+# Arbitrary constant shared by every replica; spells "unison" in ASCII.
+MIGRATION_LOCK_ID = 0x756E69736F6E
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    # IF NOT EXISTS lets databases created before versioning adopt version 1 in place.
+    Migration(1, "core tables", (
+        "CREATE TABLE IF NOT EXISTS kv (ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (ns, key))",
+        """
+        CREATE TABLE IF NOT EXISTS memory_entries (
+            id SERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            person_id TEXT,
+            payload JSONB,
+            ttl_seconds INTEGER,
+            expires_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS vault_entries (
+            key_id TEXT PRIMARY KEY,
+            cipher_text TEXT NOT NULL,
+            metadata JSONB,
+            version INTEGER DEFAULT 1,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS audit_events (
+            id TEXT PRIMARY KEY,
+            person_id TEXT,
+            actor TEXT,
+            action TEXT,
+            target TEXT,
+            decision_id TEXT,
+            status TEXT,
+            payload_json JSONB,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS objects (
+            id TEXT PRIMARY KEY,
+            person_id TEXT,
+            content_type TEXT,
+            size_bytes BIGINT,
+            storage_backend TEXT,
+            path TEXT,
+            checksum TEXT,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    )),
+    # Memory reads and deletes filter on session_id; reconciliation probes objects by path.
+    Migration(2, "memory session and object path indexes", (
+        "CREATE INDEX IF NOT EXISTS memory_entries_session_id_idx ON memory_entries (session_id)",
+        "CREATE INDEX IF NOT EXISTS objects_path_idx ON objects (path)",
+    )),
+)
+
+_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def current_version(engine: Engine) -> int:
+    """Return the applied schema version, or 0 when the database has never been migrated."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except DBAPIError:
+        return 0
+
+
+def _lock(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    elif conn.dialect.name == "sqlite":
+        # Takes the write lock up front; the pysqlite driver would otherwise defer BEGIN.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def migrate(engine: Engine, migrations: tuple[Migration, ...] = MIGRATIONS) -> list[int]:
+    """Apply pending migrations under the migration lock and return the versions applied here."""
+    if not migrations or current_version(engine) >= migrations[-1].version:
+        return []
+    with engine.connect() as conn:
+        _lock(conn)
+        conn.execute(text(_VERSION_TABLE))
+        current = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+        applied = []
+        for migration in migrations:
+            if migration.version <= current:
+                continue
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                {"version": migration.version, "description": migration.description},
+            )
+            applied.append(migration.version)
+        conn.commit()
+    return applied
+
+
+__all__ = ["MIGRATIONS", "Migration", "current_version", "migrate"]
@@ -0,0 +1,196 @@
+"""Per-handle object key contexts and a bounded, TTL-limited cache of them.
+
+Object payloads are sealed under the principal's opaque ``key_handle``.
+``ObjectKeyBroker`` is the storage side of that: ``context(key_handle)`` derives
+a per-handle AES-GCM key from the service root key with HKDF and returns an
+``ObjectKeyContext`` that seals and opens objects for that handle. Its per-call
+``encrypt``/``decrypt`` derive a fresh context every time. Objects written
+before contexts existed are ``LocalDevelopmentKeyBroker`` ciphertexts, and they
+are still opened by that broker.
+
+``ObjectKeyCache`` keeps the contexts in an LRU that expires entries after a TTL.
+Key material is derived straight into a ``bytearray`` that the context owns, and
+that buffer is overwritten with zeros when the entry is evicted, expired or
+cleared. The AES-GCM backend keeps its own copy of the key, and that copy is
+released with the context rather than wiped.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+ENVELOPE_PREFIX = b"unison-okc1:"
+_NONCE_BYTES = 12
+
+
+class ObjectKeyContext:
+    """AES-GCM sealing for one key handle, with a key buffer that can be wiped."""
+
+    def __init__(self, key_handle: str, key: bytearray, legacy: Any = None):
+        self.key_handle = key_handle
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self.key = key
+        self._aead = AESGCM(key)
+        self._legacy = legacy
+
+    def encrypt(self, *, plaintext: bytes, associated_data: bytes = b"") -> bytes:
+        nonce = os.urandom(_NONCE_BYTES)
+        return ENVELOPE_PREFIX + nonce + self._aead.encrypt(nonce, plaintext, associated_data)
+
+    def decrypt(self, *, ciphertext: bytes, associated_data: bytes = b"") -> bytes:
+        if not ciphertext.startswith(ENVELOPE_PREFIX):
+            if self._legacy is None:
+                raise ValueError("ciphertext was not sealed by an object key context")
+            return self._legacy.decrypt(
+                key_handle=self.key_handle, ciphertext=ciphertext, associated_data=associated_data
+            )
+        body = ciphertext[len(ENVELOPE_PREFIX):]
+        return self._aead.decrypt(body[:_NONCE_BYTES], body[_NONCE_BYTES:], associated_data)
+
+    def wipe(self) -> None:
+        for position in range(len(self.key)):
+            self.key[position] = 0
+
+
+class ObjectKeyBroker:
+    """Derives per-handle object key contexts from the service root key."""
+
+    def __init__(self, root_key: bytes, *, legacy: Any = None):
+        if len(root_key) < 32:
+            raise ValueError("object root key must be at least 256 bits")
+        self._root_key = bytes(root_key)
+        self.legacy = legacy
+
+    def context(self, key_handle: str) -> ObjectKeyContext:
+        if not key_handle:
+            raise ValueError("key_handle required")
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        key = bytearray(32)
+        HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"unison-storage:object-key:v1:" + key_handle.encode(),
+        ).derive_into(self._root_key, key)
+        return ObjectKeyContext(key_handle, key, self.legacy)
+
+    def encrypt(self, *, key_handle: str, plaintext: bytes, associated_data: bytes = b"") -> bytes:
+        context = self.context(key_handle)
+        try:
+            return context.encrypt(plaintext=plaintext, associated_data=associated_data)
+        finally:
+            context.wipe()
+
+    def decrypt(self, *, key_handle: str, ciphertext: bytes, associated_data: bytes = b"") -> bytes:
+        context = self.context(key_handle)
+        try:
+            return context.decrypt(ciphertext=ciphertext, associated_data=associated_data)
+        finally:
+            context.wipe()
+
+
+@dataclass
+class _CachedContext:
+    context: Any
+    expires_at: float
+
+
+class ObjectKeyCache:
+    """Wraps a key broker; reuses its per-handle contexts until they expire or are evicted."""
+
+    def __init__(self, broker: Any, *, max_entries: int = 1024, ttl_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self.broker = broker
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._derive = getattr(broker, "context", None)
+        self._entries: OrderedDict[str, _CachedContext] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.passthrough = 0
+
+    @property
+    def caching(self) -> bool:
+        return callable(self._derive)
+
+    def _context(self, key_handle: str) -> Any:
+        if not key_handle:
+            raise ValueError("key_handle required")
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key_handle)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key_handle)
+                self.hits += 1
+                return entry.context
+            if entry is not None:
+                self._evict(key_handle)
+            self.misses += 1
+        # Derive outside the lock so a slow derivation does not serialise other handles.
+        context = self._derive(key_handle)
+        with self._lock:
+            if key_handle in self._entries:
+                # Another thread derived the same handle meanwhile; keep one context.
+                self._evict(key_handle)
+            self._entries[key_handle] = _CachedContext(context, now + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+        return context
+
+    def _evict(self, key_handle: str) -> None:
+        entry = self._entries.pop(key_handle, None)
+        if entry is None:
+            return
+        self.evictions += 1
+        # Callers already holding the context keep working: AES-GCM has its own key copy.
+        wipe = getattr(entry.context, "wipe", None)
+        if callable(wipe):
+            wipe()
+
+    def encrypt(self, *, key_handle: str, plaintext: bytes, associated_data: bytes = b"") -> bytes:
+        if not self.caching:
+            with self._lock:
+                self.passthrough += 1
+            return self.broker.encrypt(key_handle=key_handle, plaintext=plaintext, associated_data=associated_data)
+        return self._context(key_handle).encrypt(plaintext=plaintext, associated_data=associated_data)
+
+    def decrypt(self, *, key_handle: str, ciphertext: bytes, associated_data: bytes = b"") -> bytes:
+        if not self.caching:
+            with self._lock:
+                self.passthrough += 1
+            return self.broker.decrypt(key_handle=key_handle, ciphertext=ciphertext, associated_data=associated_data)
+        return self._context(key_handle).decrypt(ciphertext=ciphertext, associated_data=associated_data)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key_handle in list(self._entries):
+                self._evict(key_handle)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "passthrough": self.passthrough,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+__all__ = ["ENVELOPE_PREFIX", "ObjectKeyBroker", "ObjectKeyCache", "ObjectKeyContext"]
@@ -0,0 +1,221 @@
+"""Reconcile the object store directory against the ``objects`` table.
+
+A crash between ``write_bytes`` and the metadata insert leaves an orphaned file,
+and a lost file leaves a row that points at nothing. The reconciler walks the
+table with keyset pagination and the directory with ``os.scandir`` in bounded
+batches, so neither side is ever held in memory, and it throttles itself so it
+can run against a live node.
+
+Files and rows are matched by file name, which is ``sha256(stored id)``, never by
+the absolute path string. A directory mounted somewhere other than where the rows
+were written is therefore still recognised. As a last guard, orphan deletion is
+refused for the rest of a run as soon as a whole batch of files matches no row.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+
+Decoder = Callable[[str, bytes], Optional[bytes]]
+
+
+@dataclass
+class ReconcileReport:
+    scanned_rows: int = 0
+    scanned_files: int = 0
+    missing_files: int = 0
+    orphan_files: int = 0
+    deleted_orphans: int = 0
+    size_drift: int = 0
+    checksum_drift: int = 0
+    unverified: int = 0
+    deletion_refused: bool = False
+    samples: dict[str, list[str]] = field(default_factory=lambda: {
+        "missing_files": [], "orphan_files": [], "size_drift": [], "checksum_drift": [],
+    })
+    duration_seconds: float = 0.0
+
+    def note(self, kind: str, value: str, limit: int) -> None:
+        setattr(self, kind, getattr(self, kind) + 1)
+        if len(self.samples[kind]) < limit:
+            self.samples[kind].append(value)
+
+
+class ObjectReconciler:
+    """Streams both sides of the object store and reports or repairs divergence."""
+
+    def __init__(self, engine: Engine, objects_dir: Path, *, batch_size: int = 500,
+                 max_ops_per_second: float = 0.0, min_orphan_age_seconds: float = 3600.0,
+                 sample_limit: int = 100, decode: Decoder | None = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.engine = engine
+        self.objects_dir = Path(objects_dir)
+        self.batch_size = batch_size
+        self.max_ops_per_second = max_ops_per_second
+        self.min_orphan_age_seconds = min_orphan_age_seconds
+        self.sample_limit = sample_limit
+        self.decode = decode
+        self._clock = clock
+        self._sleep = sleep
+        self._window_started = 0.0
+        self._window_ops = 0
+
+    def run(self, *, delete_orphans: bool = False, verify_checksums: bool = False) -> ReconcileReport:
+        report = ReconcileReport()
+        started = self._clock()
+        self._window_started, self._window_ops = started, 0
+        # Directories the rows were written under; normally exactly one.
+        row_dirs: set[str] = set()
+        for rows in self._row_batches():
+            for obj_id, path, size_bytes, checksum in rows:
+                report.scanned_rows += 1
+                if path:
+                    row_dirs.add(os.path.dirname(path))
+                self._check_row(report, obj_id, path, size_bytes, checksum, verify_checksums)
+            self._throttle(len(rows))
+        for entries in self._file_batches():
+            report.scanned_files += len(entries)
+            known = self._known_names(row_dirs, [entry.name for entry in entries])
+            if len(entries) > 1 and not known and report.scanned_rows:
+                # Every file unknown at once points at a misconfigured directory, not at orphans.
+                report.deletion_refused = True
+            for entry in entries:
+                if entry.name in known:
+                    continue
+                try:
+                    age = time.time() - entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age < self.min_orphan_age_seconds:
+                    # Likely an in-flight put that has not inserted its row yet.
+                    continue
+                report.note("orphan_files", entry.name, self.sample_limit)
+                if delete_orphans and not report.deletion_refused and not self._known_names(row_dirs, [entry.name]):
+                    Path(entry.path).unlink(missing_ok=True)
+                    report.deleted_orphans += 1
+            self._throttle(len(entries))
+        report.duration_seconds = self._clock() - started
+        return report
+
+    def _row_batches(self) -> Iterator[list[tuple]]:
+        query = text(
+            """
+            SELECT id, path, size_bytes, checksum FROM objects
+            WHERE storage_backend = 'filesystem' AND id > :after
+            ORDER BY id LIMIT :limit
+            """
+        )
+        after = ""
+        while True:
+            with self.engine.connect() as conn:
+                rows = [tuple(row) for row in conn.execute(query, {"after": after, "limit": self.batch_size})]
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][0]
+
+    def _file_batches(self) -> Iterator[list[os.DirEntry]]:
+        batch: list[os.DirEntry] = []
+        with os.scandir(self.objects_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _known_names(self, row_dirs: set[str], names: list[str]) -> set[str]:
+        if not row_dirs:
+            return set()
+        # Probe the exact paths rows could hold so the lookup stays on the objects(path) index.
+        candidates = [os.path.join(directory, name) for directory in row_dirs for name in names]
+        query = text("SELECT path FROM objects WHERE path IN :paths").bindparams(
+            bindparam("paths", expanding=True)
+        )
+        with self.engine.connect() as conn:
+            return {os.path.basename(row[0]) for row in conn.execute(query, {"paths": candidates})}
+
+    def _check_row(self, report: ReconcileReport, obj_id: str, path: str | None, size_bytes: int | None,
+                   checksum: str | None, verify_checksums: bool) -> None:
+        if not path:
+            return
+        target = self.objects_dir / os.path.basename(path)
+        try:
+            actual_size = target.stat().st_size
+        except FileNotFoundError:
+            report.note("missing_files", obj_id, self.sample_limit)
+            return
+        if size_bytes is not None and actual_size != size_bytes:
+            report.note("size_drift", obj_id, self.sample_limit)
+        if not verify_checksums or not checksum:
+            return
+        data = target.read_bytes()
+        plaintext = data if hashlib.sha256(data).hexdigest() == checksum else None
+        if plaintext is None and self.decode is not None:
+            plaintext = self.decode(obj_id, data)
+        if plaintext is None:
+            report.unverified += 1
+        elif hashlib.sha256(plaintext).hexdigest() != checksum:
+            report.note("checksum_drift", obj_id, self.sample_limit)
+
+    def _throttle(self, operations: int) -> None:
+        if self.max_ops_per_second <= 0:
+            return
+        self._window_ops += operations
+        elapsed = self._clock() - self._window_started
+        budget = self._window_ops / self.max_ops_per_second
+        if budget > elapsed:
+            self._sleep(budget - elapsed)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reconcile stored object files with object metadata.")
+    parser.add_argument("--delete-orphans", action="store_true", help="remove files that have no metadata row")
+    parser.add_argument("--verify-checksums", action="store_true", help="re-hash objects that can be decrypted")
+    parser.add_argument("--rate", type=float, default=200.0, help="maximum rows and files examined per second")
+    parser.add_argument("--min-orphan-age", type=float, default=3600.0, help="seconds before a file can be an orphan")
+    args = parser.parse_args(argv)
+
+    from cryptography.fernet import InvalidToken
+    from server import _get_fernet, _init_engine, _objects_dir
+
+    fernet = _get_fernet()
+
+    def decode(_obj_id: str, data: bytes) -> bytes | None:
+        if fernet is None:
+            return None
+        try:
+            return fernet.decrypt(data)
+        except InvalidToken:
+            return None
+
+    reconciler = ObjectReconciler(
+        _init_engine(), _objects_dir(), max_ops_per_second=args.rate,
+        min_orphan_age_seconds=args.min_orphan_age, decode=decode,
+    )
+    report = reconciler.run(delete_orphans=args.delete_orphans, verify_checksums=args.verify_checksums)
+    print(json.dumps(asdict(report), indent=2))
+    return 1 if report.missing_files or report.size_drift or report.checksum_drift else 0
+
+
+__all__ = ["ObjectReconciler", "ReconcileReport"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
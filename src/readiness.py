@@ -0,0 +1,100 @@
+"""Readiness state refreshed in the background and served from a cache.
+
+Probes hit ``/ready`` far more often than dependencies change state. A single
+background thread runs the checks on an interval and every probe reads the last
+result, so probe traffic never turns into database traffic. If the refresher is
+not running, as in tests or a single script, a stale cache is refreshed inline
+by the probe that notices it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+Check = Callable[[], None]
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    ok: bool
+    latency_ms: float
+    error: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        body: dict[str, Any] = {"ok": self.ok, "latency_ms": round(self.latency_ms, 3)}
+        if self.error:
+            body["error"] = self.error
+        return body
+
+
+class ReadinessMonitor:
+    """Runs named checks on an interval; a check passes unless it raises."""
+
+    def __init__(self, checks: dict[str, Check], *, interval_seconds: float = 5.0,
+                 stale_after_seconds: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.checks = dict(checks)
+        self.interval_seconds = interval_seconds
+        self.stale_after_seconds = stale_after_seconds if stale_after_seconds is not None else 3 * interval_seconds
+        self._clock = clock
+        self._results: dict[str, CheckResult] = {}
+        self._checked_at: float | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> dict[str, CheckResult]:
+        results = {}
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                check()
+            except Exception as exc:
+                # Only the exception type: probe responses are not the place for connection strings.
+                results[name] = CheckResult(False, (time.perf_counter() - started) * 1000, type(exc).__name__)
+            else:
+                results[name] = CheckResult(True, (time.perf_counter() - started) * 1000)
+        with self._lock:
+            self._results, self._checked_at = results, self._clock()
+        return results
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="unison-readiness", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.refresh()
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            results, checked_at = self._results, self._checked_at
+        running = self._thread is not None and self._thread.is_alive()
+        if not running and (checked_at is None or self._clock() - checked_at >= self.interval_seconds):
+            self.refresh()
+            with self._lock:
+                results, checked_at = self._results, self._checked_at
+        age = self._clock() - checked_at
+        stale = age > self.stale_after_seconds
+        return {
+            "ready": not stale and all(result.ok for result in results.values()),
+            "stale": stale,
+            "age_seconds": round(age, 3),
+            "checks": {name: result.as_dict() for name, result in results.items()},
+        }
+
+
+__all__ = ["CheckResult", "ReadinessMonitor"]
@@ -0,0 +1,155 @@
+"""Per-route request latency, status, and in-flight metrics in Prometheus text format.
+
+The middleware is a plain ASGI wrapper so it adds no per-request task or body
+copying. Every series uses a fixed bucket array; observing a request is one
+bisect and a handful of increments on the configured value store.
+"""
+
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from typing import Any, Protocol
+
+from starlette.routing import Match
+
+from shared_metrics import LocalValues, MetricKey
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricValues(Protocol):
+    def inc(self, key: MetricKey, amount: float = 1.0, *, live: bool = False) -> None: ...
+
+    def snapshot(self) -> dict[MetricKey, float]: ...
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def observe_histogram(values: MetricValues, name: str, labels: tuple[str, ...],
+                      buckets: tuple[float, ...], seconds: float) -> None:
+    # One slot per finite bucket plus the +Inf overflow slot, stored non-cumulatively.
+    values.inc((f"{name}_bucket", *labels, str(bisect_left(buckets, seconds))))
+    values.inc((f"{name}_sum", *labels), seconds)
+    values.inc((f"{name}_count", *labels))
+
+
+def histogram_lines(snapshot: dict[MetricKey, float], name: str, label_names: tuple[str, ...],
+                    buckets: tuple[float, ...]) -> list[str]:
+    lines = []
+    series = sorted(key[1:] for key in snapshot if key[0] == f"{name}_count")
+    for labels in series:
+        rendered = ",".join(f'{label}="{escape_label(value)}"' for label, value in zip(label_names, labels))
+        cumulative = 0.0
+        for index, bound in enumerate(buckets):
+            cumulative += snapshot.get((f"{name}_bucket", *labels, str(index)), 0.0)
+            lines.append(f'{name}_bucket{{{rendered},le="{bound}"}} {_number(cumulative)}')
+        count = snapshot[(f"{name}_count", *labels)]
+        lines.append(f'{name}_bucket{{{rendered},le="+Inf"}} {_number(count)}')
+        lines.append(f"{name}_sum{{{rendered}}} {snapshot.get((f'{name}_sum', *labels), 0.0)}")
+        lines.append(f"{name}_count{{{rendered}}} {_number(count)}")
+    return lines
+
+
+def series_lines(snapshot: dict[MetricKey, float], name: str, label_names: tuple[str, ...]) -> list[str]:
+    lines = []
+    for key in sorted(key for key in snapshot if key[0] == name):
+        rendered = ",".join(f'{label}="{escape_label(value)}"' for label, value in zip(label_names, key[1:]))
+        lines.append(f"{name}{{{rendered}}} {_number(snapshot[key])}")
+    return lines
+
+
+class RouteMetrics:
+    def __init__(self, values: MetricValues | None = None, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.values = values if values is not None else LocalValues()
+        self.buckets = tuple(sorted(buckets))
+
+    def started(self, method: str, route: str) -> None:
+        self.values.inc(("unison_storage_requests_in_flight", method, route), live=True)
+
+    def finished(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.values.inc(("unison_storage_requests_in_flight", method, route), -1, live=True)
+        observe_histogram(self.values, "unison_storage_request_duration_seconds", (method, route),
+                          self.buckets, seconds)
+        self.values.inc(("unison_storage_responses_total", method, route, str(status)))
+
+    def render(self, snapshot: dict[MetricKey, float] | None = None) -> list[str]:
+        snapshot = self.values.snapshot() if snapshot is None else snapshot
+        lines = [
+            "# HELP unison_storage_request_duration_seconds Request latency by route",
+            "# TYPE unison_storage_request_duration_seconds histogram",
+        ]
+        lines.extend(histogram_lines(snapshot, "unison_storage_request_duration_seconds",
+                                     ("method", "route"), self.buckets))
+        lines.extend([
+            "",
+            "# HELP unison_storage_responses_total Responses by route and status code",
+            "# TYPE unison_storage_responses_total counter",
+        ])
+        lines.extend(series_lines(snapshot, "unison_storage_responses_total", ("method", "route", "status")))
+        lines.extend([
+            "",
+            "# HELP unison_storage_requests_in_flight Requests currently being served by route",
+            "# TYPE unison_storage_requests_in_flight gauge",
+        ])
+        lines.extend(series_lines(snapshot, "unison_storage_requests_in_flight", ("method", "route")))
+        return lines
+
+
+def route_template(scope: dict[str, Any]) -> str:
+    """Resolve the route template before routing so path parameters never become labels."""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: Any, metrics: RouteMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+        self.metrics.started(method, route)
+        started = time.perf_counter()
+
+        async def send_with_status(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.finished(method, route, status, time.perf_counter() - started)
+
+
+__all__ = [
+    "LATENCY_BUCKETS",
+    "MetricValues",
+    "RequestMetricsMiddleware",
+    "RouteMetrics",
+    "escape_label",
+    "histogram_lines",
+    "observe_histogram",
+    "route_template",
+    "series_lines",
+]
@@ -0,0 +1,221 @@
+"""Opt-in sampling profiles of single requests or of a time window.
+
+Profiling is requested per call with a trusted header carrying the configured
+profiling token. The middleware is only installed when both the token and an
+output directory are configured, so a service without them pays nothing.
+
+Sampling reads ``sys._current_frames()`` from a background thread instead of
+using ``cProfile``. That covers the threadpool threads that run sync endpoints,
+does not conflict with another active profiler, and adds only one frame walk
+per interval while a capture runs. Samples from every thread that is not idle
+are kept, so concurrent requests can show up in the same profile.
+
+Profiles are written in folded-stack format (``frame;frame;frame count``), which
+flamegraph.pl and speedscope read directly.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from request_metrics import route_template
+
+
+PROFILE_HEADER = b"x-unison-profile"
+WINDOW_HEADER = b"x-unison-profile-window"
+MAX_WINDOW_SECONDS = 300.0
+# Innermost frames of threads parked waiting for work: the event loop selector and idle pool workers.
+_IDLE_FILES = frozenset({"selectors.py", "threading.py", "queue.py"})
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+NamespaceResolver = Callable[[dict[str, Any]], str]
+
+
+class SamplingProfiler:
+    """Count folded stacks of every live thread at a fixed interval until stopped."""
+
+    def __init__(self, interval_seconds: float = 0.005, max_depth: int = 128, include_idle: bool = False):
+        self.interval_seconds = interval_seconds
+        self.max_depth = max_depth
+        self.include_idle = include_idle
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="unison-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            self.sample(skip={own})
+
+    def sample(self, skip: set[int] = frozenset()) -> None:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in skip:
+                continue
+            if not self.include_idle and Path(frame.f_code.co_filename).name in _IDLE_FILES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+
+def write_folded(samples: Counter[str], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()), encoding="utf-8")
+    partial.replace(path)
+
+
+def namespace_hash(namespace: str) -> str:
+    return hashlib.sha256(namespace.encode()).hexdigest()[:12]
+
+
+def profile_path(directory: Path, label: str, namespace: str) -> Path:
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    slug = _UNSAFE.sub("_", label).strip("_") or "root"
+    return directory / f"{stamp}-{time.time_ns() % 1_000_000:06d}-{slug}-{namespace_hash(namespace)}.folded"
+
+
+class RequestProfiler:
+    """Owns the output directory, the token check, and the one capture allowed at a time."""
+
+    def __init__(self, directory: Path, token: str, *, interval_seconds: float = 0.005,
+                 max_window_seconds: float = MAX_WINDOW_SECONDS, on_saved: Callable[[Path, int], None] | None = None):
+        if not token:
+            raise ValueError("a profiling token is required")
+        self.directory = Path(directory)
+        self.token = token.encode()
+        self.interval_seconds = interval_seconds
+        self.max_window_seconds = max_window_seconds
+        self.on_saved = on_saved
+        self._busy = threading.Lock()
+
+    def authorized(self, supplied: bytes) -> bool:
+        return hmac.compare_digest(supplied, self.token)
+
+    def begin(self) -> SamplingProfiler | None:
+        """Start a capture, or return None when another capture already owns the profiler."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = SamplingProfiler(self.interval_seconds)
+        profiler.start()
+        return profiler
+
+    def abandon(self, profiler: SamplingProfiler) -> None:
+        """Stop a capture without saving it and free the profiler for the next one."""
+        try:
+            profiler.stop()
+        finally:
+            self._busy.release()
+
+    def finish(self, profiler: SamplingProfiler, path: Path) -> None:
+        try:
+            samples = profiler.stop()
+            write_folded(samples, path)
+        finally:
+            self._busy.release()
+        if self.on_saved is not None:
+            self.on_saved(path, sum(samples.values()))
+
+    def window(self, seconds: float, namespace: str) -> Path | None:
+        """Sample every thread for ``seconds`` in the background and save the profile as a window capture."""
+        profiler = self.begin()
+        if profiler is None:
+            return None
+        path = profile_path(self.directory, "window", namespace)
+        timer = threading.Timer(min(seconds, self.max_window_seconds), self.finish, (profiler, path))
+        timer.daemon = True
+        timer.start()
+        return path
+
+
+class RequestProfilerMiddleware:
+    """Install inside the principal binding middleware so ``namespace`` can see the bound principal."""
+
+    def __init__(self, app: Any, profiler: RequestProfiler, namespace: NamespaceResolver):
+        self.app = app
+        self.profiler = profiler
+        self.namespace = namespace
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        supplied = headers.get(PROFILE_HEADER)
+        if supplied is None or not self.profiler.authorized(supplied):
+            await self.app(scope, receive, send)
+            return
+
+        window = headers.get(WINDOW_HEADER)
+        if window is not None:
+            await self._window(scope, receive, send, window)
+            return
+
+        profiler = self.profiler.begin()
+        if profiler is None:
+            await self.app(scope, receive, self._tagged(send, "busy"))
+            return
+        path = None
+        try:
+            path = profile_path(self.profiler.directory, f"{scope['method']} {route_template(scope)}",
+                                self.namespace(scope))
+            await self.app(scope, receive, self._tagged(send, path.name))
+        finally:
+            # Joining the sampler and writing the file are blocking; keep them off the event loop.
+            if path is None:
+                await run_in_threadpool(self.profiler.abandon, profiler)
+            else:
+                await run_in_threadpool(self.profiler.finish, profiler, path)
+
+    async def _window(self, scope: dict[str, Any], receive: Any, send: Any, window: bytes) -> None:
+        try:
+            seconds = float(window)
+        except ValueError:
+            seconds = 0.0
+        if seconds <= 0:
+            await self.app(scope, receive, self._tagged(send, "invalid-window"))
+            return
+        path = self.profiler.window(seconds, self.namespace(scope))
+        await self.app(scope, receive, self._tagged(send, path.name if path else "busy"))
+
+    @staticmethod
+    def _tagged(send: Any, value: str) -> Any:
+        async def send_with_profile(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_HEADER, value.encode())]}
+            await send(message)
+        return send_with_profile
+
+
+__all__ = [
+    "PROFILE_HEADER",
+    "RequestProfiler",
+    "RequestProfilerMiddleware",
+    "SamplingProfiler",
+    "WINDOW_HEADER",
+    "namespace_hash",
+    "write_folded",
+]
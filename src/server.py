@@ -1,186 +1,324 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Body, HTTPException, Depends
-import uvicorn
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+import asyncio
 import logging
 import json
+import threading
 import time
 from pathlib import Path
-from typing import Any, Optional
-from unison_common.logging import configure_logging, log_json
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+from unison_common.logging import configure_logging, log_json as _emit_log_json
 from unison_common.tracing_middleware import TracingMiddleware
-from unison_common.tracing import initialize_tracing, instrument_fastapi, instrument_httpx
 from unison_common.principal_middleware import PrincipalBindingMiddleware, get_bound_principal
 from unison_common.trust import LocalDevelopmentKeyBroker
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
 import base64
 import os
 import uuid
 import hashlib
-from cryptography.fernet import Fernet, InvalidToken
-from life_operations import ConnectionBroker, ConnectionRejected, IntakeRejected, SourceLibrary
+import tempfile
+from content_scanner import ContentScanner
+from extraction_pool import ExtractionMetrics, ExtractionPool
+from life_operations import (
+    BatchFile, ConnectionBroker, ConnectionRejected, IndexLimits, IntakeRejected, SourceLibrary, UploadConflict,
+)
 from domain_operations import DomainRejected, LifeDomainStore
+from log_queue import EventSampler, QueueLogging, parse_sample_rates
+from object_keys import ObjectKeyBroker, ObjectKeyCache
+from readiness import ReadinessMonitor
+from request_metrics import RequestMetricsMiddleware, RouteMetrics, escape_label, series_lines
+from request_profiler import RequestProfiler, RequestProfilerMiddleware
+from shared_metrics import LocalValues, SharedValues
+from sql_metrics import StatementMetrics, instrument_engine
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+    from sqlalchemy.engine import Engine
 try:
     from unison_common import BatonMiddleware
 except Exception:
     BatonMiddleware = None
-from collections import defaultdict
 
 from settings import StorageServiceSettings
 
-app = FastAPI(title="unison-storage")
+
+def _profile_namespace(scope: dict[str, Any]) -> str:
+    try:
+        return get_bound_principal(Request(scope)).data_namespace
+    except Exception:
+        return "unbound"
+
+
+def _profile_saved(path: Path, samples: int) -> None:
+    log_json(logging.INFO, "profile_saved", service="unison-storage", path=str(path), samples=samples)
+
+
+def _setup_tracing(app: FastAPI) -> None:
+    """P0.3: Initialize tracing and instrument FastAPI/httpx.
+
+    Called from the entrypoint rather than at import, so tests and tooling that only
+    import the module skip the OpenTelemetry setup. It has to run before the app
+    handles its first message, because the FastAPI instrumentation is applied when
+    Starlette builds the middleware stack.
+    """
+    from unison_common.tracing import initialize_tracing, instrument_fastapi, instrument_httpx
+
+    initialize_tracing()
+    instrument_fastapi(app)
+    instrument_httpx()
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # The first refresh runs every check, database included; keep it off the event loop.
+    await run_in_threadpool(_start_readiness)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(_READINESS.stop)
+        if _EXTRACTION_POOL is not None:
+            await run_in_threadpool(_EXTRACTION_POOL.shutdown)
+
+
+SETTINGS = StorageServiceSettings.from_env()
+app = FastAPI(title="unison-storage", lifespan=_lifespan)
 app.add_middleware(TracingMiddleware, service_name="unison-storage")
 if BatonMiddleware:
     app.add_middleware(BatonMiddleware)
+# Only installed when configured, so unprofiled deployments pay nothing per request.
+if SETTINGS.profiling_dir and SETTINGS.profiling_token:
+    app.add_middleware(
+        RequestProfilerMiddleware,
+        profiler=RequestProfiler(
+            SETTINGS.profiling_dir,
+            SETTINGS.profiling_token,
+            interval_seconds=SETTINGS.profiling_interval_ms / 1000,
+            on_saved=_profile_saved,
+        ),
+        namespace=_profile_namespace,
+    )
 app.add_middleware(
     PrincipalBindingMiddleware,
     service_name="storage",
     allow_test_bypass=True,
 )
+# Shared across uvicorn workers when a metrics directory is configured.
+_METRIC_VALUES = SharedValues(SETTINGS.metrics_dir) if SETTINGS.metrics_dir else LocalValues()
+_ROUTE_METRICS = RouteMetrics(_METRIC_VALUES)
+_SQL_METRICS = StatementMetrics(_METRIC_VALUES)
+_EXTRACTION_METRICS = ExtractionMetrics(_METRIC_VALUES)
+# Outermost, so latency covers principal binding and tracing as well.
+app.add_middleware(RequestMetricsMiddleware, metrics=_ROUTE_METRICS)
 
 logger = configure_logging("unison-storage")
+# Handlers run on a writer thread; request threads only enqueue, and drop when the buffer is full.
+_LOG_QUEUE = QueueLogging.install(logger, SETTINGS.log_queue_size) if SETTINGS.log_queue_size > 0 else None
+_LOG_SAMPLER = EventSampler(parse_sample_rates(SETTINGS.log_sample_rates))
 
-# P0.3: Initialize tracing and instrument FastAPI/httpx
-initialize_tracing()
-instrument_fastapi(app)
-instrument_httpx()
-
-# Simple in-memory metrics
-_metrics = defaultdict(int)
 _start_time = time.time()
-SETTINGS = StorageServiceSettings.from_env()
 _ENGINE: Engine | None = None
+# Threadpool workers race on the first request; publish the engine only after its tables exist.
+_ENGINE_LOCK = threading.Lock()
 _FERNET: Optional[Fernet] = None
-_OBJECT_KEY_BROKER: Optional[LocalDevelopmentKeyBroker] = None
+_OBJECT_KEY_BROKER: Optional[ObjectKeyBroker] = None
+_OBJECT_KEY_CACHE: Optional[ObjectKeyCache] = None
 _SOURCE_LIBRARY: SourceLibrary | None = None
+_EXTRACTION_POOL: ExtractionPool | None = None
+# Longest a session status request waits for its sources to finish extracting.
+_MAX_STATUS_WAIT_SECONDS = 30.0
 _CONNECTION_BROKER = ConnectionBroker()
 _DOMAIN_STORE: LifeDomainStore | None = None
 
 
+def log_json(level: int, event: str, **fields: Any) -> None:
+    """``unison_common`` ``log_json`` behind per-event sampling; skipped events are never encoded."""
+    if _LOG_SAMPLER.keep(level, event):
+        _emit_log_json(level, event, **fields)
+
+
+def _sql(statement: str) -> Any:
+    """``sqlalchemy.text(statement)``, with SQLAlchemy imported on first use so importing the service stays cheap."""
+    from sqlalchemy import text
+
+    return text(statement)
+
+
+def _count_request(endpoint: str) -> None:
+    _METRIC_VALUES.inc(("unison_storage_requests_total", endpoint))
+
+
 @app.get("/healthz")
 @app.get("/health")
 def health(request: Request):
-    _metrics["/health"] += 1
+    _count_request("/health")
     event_id = request.headers.get("X-Event-ID")
     log_json(logging.INFO, "health", service="unison-storage", event_id=event_id)
     return {"status": "ok", "service": "unison-storage"}
 
-@app.get("/metrics")
+@app.get("/metrics", response_class=PlainTextResponse)
 def metrics():
     """Prometheus text-format metrics."""
     uptime = time.time() - _start_time
+    snapshot = _METRIC_VALUES.snapshot()
     lines = [
         "# HELP unison_storage_requests_total Total number of requests by endpoint",
         "# TYPE unison_storage_requests_total counter",
     ]
-    for k, v in _metrics.items():
-        lines.append(f'unison_storage_requests_total{{endpoint="{k}"}} {v}')
+    lines.extend(series_lines(snapshot, "unison_storage_requests_total", ("endpoint",)))
     lines.extend([
         "",
         "# HELP unison_storage_uptime_seconds Service uptime in seconds",
         "# TYPE unison_storage_uptime_seconds gauge",
         f"unison_storage_uptime_seconds {uptime}",
+        "",
+    ])
+    lines.extend(_ROUTE_METRICS.render(snapshot))
+    lines.append("")
+    lines.extend(_SQL_METRICS.render(snapshot))
+    lines.append("")
+    lines.extend(_EXTRACTION_METRICS.render(snapshot))
+    if _SOURCE_LIBRARY is not None:
+        scan = _SOURCE_LIBRARY.scanner.stats()
+        lines.extend([
+            "",
+            "# HELP unison_storage_content_scan_bytes_total Imported bytes scanned for security signatures",
+            "# TYPE unison_storage_content_scan_bytes_total counter",
+            f"unison_storage_content_scan_bytes_total {scan['bytes_scanned']}",
+            "# HELP unison_storage_content_scan_seconds_total Time spent scanning imported bytes",
+            "# TYPE unison_storage_content_scan_seconds_total counter",
+            f"unison_storage_content_scan_seconds_total {scan['seconds']}",
+            "# HELP unison_storage_content_scan_signatures Security signatures compiled into the scanner",
+            "# TYPE unison_storage_content_scan_signatures gauge",
+            f"unison_storage_content_scan_signatures {scan['signatures']}",
+        ])
+    if _OBJECT_KEY_CACHE is not None:
+        stats = _OBJECT_KEY_CACHE.stats()
+        lines.extend([
+            "",
+            "# HELP unison_storage_object_key_cache_lookups_total Object key broker context lookups by result",
+            "# TYPE unison_storage_object_key_cache_lookups_total counter",
+            f'unison_storage_object_key_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+            f'unison_storage_object_key_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+            f'unison_storage_object_key_cache_lookups_total{{result="passthrough"}} {stats["passthrough"]}',
+            "# HELP unison_storage_object_key_cache_evictions_total Cached broker contexts dropped by TTL or capacity",
+            "# TYPE unison_storage_object_key_cache_evictions_total counter",
+            f"unison_storage_object_key_cache_evictions_total {stats['evictions']}",
+            "# HELP unison_storage_object_key_cache_entries Broker contexts currently cached",
+            "# TYPE unison_storage_object_key_cache_entries gauge",
+            f"unison_storage_object_key_cache_entries {stats['entries']}",
+        ])
+    lines.extend([
+        "",
+        "# HELP unison_storage_log_sampled_out_total Log events skipped by per-event sampling",
+        "# TYPE unison_storage_log_sampled_out_total counter",
     ])
-    return "\n".join(lines)
+    lines.extend(
+        f'unison_storage_log_sampled_out_total{{event="{escape_label(event)}"}} {count}'
+        for event, count in sorted(_LOG_SAMPLER.sampled_out.items())
+    )
+    if _LOG_QUEUE is not None:
+        lines.extend([
+            "# HELP unison_storage_log_dropped_total Log records dropped because the log queue was full",
+            "# TYPE unison_storage_log_dropped_total counter",
+            f"unison_storage_log_dropped_total {_LOG_QUEUE.dropped}",
+            "# HELP unison_storage_log_queue_depth Log records waiting for the writer thread",
+            "# TYPE unison_storage_log_queue_depth gauge",
+            f"unison_storage_log_queue_depth {_LOG_QUEUE.pending}",
+        ])
+    return "\n".join(lines) + "\n"
+
+def _check_database() -> None:
+    with _init_engine().connect() as conn:
+        conn.execute(_sql("SELECT 1"))
+
+
+def _check_objects_dir() -> None:
+    with tempfile.TemporaryFile(dir=_objects_dir()):
+        pass
+
+
+_LIFE_ROOTS = (SETTINGS.life_operations_root, SETTINGS.life_domains_root)
+
+
+def _check_life_roots() -> None:
+    # Observe only: probes must not create directories. Startup creates them once.
+    for root in _LIFE_ROOTS:
+        if not root.is_dir():
+            raise FileNotFoundError(str(root))
+        if not os.access(root, os.W_OK):
+            raise PermissionError(str(root))
+
+
+def _start_readiness() -> None:
+    for root in _LIFE_ROOTS:
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+        except OSError as exc:
+            # Left to the life_roots check to report; the service still starts and answers probes.
+            log_json(logging.WARNING, "life_root_unavailable", service="unison-storage", root=str(root),
+                     error=type(exc).__name__)
+    _READINESS.start()
+
+
+# Probes answer from the last background refresh instead of querying the database themselves.
+_READINESS = ReadinessMonitor(
+    {"database": _check_database, "objects_dir": _check_objects_dir, "life_roots": _check_life_roots},
+    interval_seconds=SETTINGS.readiness_interval_seconds,
+)
+
 
 @app.get("/readyz")
 @app.get("/ready")
 def ready(request: Request):
     event_id = request.headers.get("X-Event-ID")
-    log_json(logging.INFO, "ready", service="unison-storage", event_id=event_id, ready=True)
-    # Future: check persistence / volumes
-    db_ok = True
-    try:
-        engine = _init_engine()
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-    except Exception:
-        db_ok = False
-    return {"ready": db_ok}
+    status = _READINESS.status()
+    log_json(logging.INFO, "ready", service="unison-storage", event_id=event_id, ready=status["ready"])
+    return status
+
+
+def _log_slow_query(statement: str, seconds: float, rows: int) -> None:
+    log_json(logging.WARNING, "sql_slow", service="unison-storage", statement=statement,
+             duration_ms=round(seconds * 1000, 2), rows=rows if rows >= 0 else None)
+
+
+def _register_sqlite_functions(dbapi_connection: Any, _connection_record: Any) -> None:
+    # Local development databases accept the Postgres NOW() used by the write paths.
+    dbapi_connection.create_function("NOW", 0, lambda: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
 
 
 def _init_engine() -> Engine:
     global _ENGINE
     if _ENGINE:
         return _ENGINE
-    db_url = SETTINGS.database_url or f"sqlite:///{SETTINGS.db_path}"
-    if os.getenv("ENVIRONMENT") == "prod" and db_url.startswith("sqlite"):
-        raise RuntimeError("SQLite is not allowed in production; set STORAGE_DATABASE_URL to Postgres")
-    if db_url.startswith("sqlite:///"):
-        Path(db_url.replace("sqlite:///", "")).parent.mkdir(parents=True, exist_ok=True)
-    _ENGINE = create_engine(db_url, future=True)
-    with _ENGINE.begin() as conn:
-        conn.execute(
-            text(
-                "CREATE TABLE IF NOT EXISTS kv (ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (ns, key))"
-            )
-        )
-        # Core tables for future memory/vault/audit/object storage
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS memory_entries (
-                    id SERIAL PRIMARY KEY,
-                    session_id TEXT NOT NULL,
-                    person_id TEXT,
-                    payload JSONB,
-                    ttl_seconds INTEGER,
-                    expires_at TIMESTAMPTZ,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    updated_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-        )
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS vault_entries (
-                    key_id TEXT PRIMARY KEY,
-                    cipher_text TEXT NOT NULL,
-                    metadata JSONB,
-                    version INTEGER DEFAULT 1,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    updated_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-        )
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS audit_events (
-                    id TEXT PRIMARY KEY,
-                    person_id TEXT,
-                    actor TEXT,
-                    action TEXT,
-                    target TEXT,
-                    decision_id TEXT,
-                    status TEXT,
-                    payload_json JSONB,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
+    with _ENGINE_LOCK:
+        if _ENGINE:
+            return _ENGINE
+        from sqlalchemy import create_engine, event
+
+        from migrations import migrate
+
+        db_url = SETTINGS.database_url or f"sqlite:///{SETTINGS.db_path}"
+        if os.getenv("ENVIRONMENT") == "prod" and db_url.startswith("sqlite"):
+            raise RuntimeError("SQLite is not allowed in production; set STORAGE_DATABASE_URL to Postgres")
+        if db_url.startswith("sqlite:///"):
+            Path(db_url.replace("sqlite:///", "")).parent.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(db_url, future=True)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _register_sqlite_functions)
+        instrument_engine(
+            engine,
+            _SQL_METRICS,
+            slow_threshold_seconds=SETTINGS.sql_slow_query_ms / 1000,
+            on_slow=_log_slow_query,
         )
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS objects (
-                    id TEXT PRIMARY KEY,
-                    person_id TEXT,
-                    content_type TEXT,
-                    size_bytes BIGINT,
-                    storage_backend TEXT,
-                    path TEXT,
-                    checksum TEXT,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-        )
-    return _ENGINE
+        applied = migrate(engine)
+        if applied:
+            log_json(logging.INFO, "schema_migrated", service="unison-storage", versions=applied)
+        _ENGINE = engine
+        return _ENGINE
 
 
 def _get_fernet() -> Optional[Fernet]:
@@ -188,6 +326,8 @@ def _get_fernet() -> Optional[Fernet]:
     if _FERNET is not None:
         return _FERNET
     if SETTINGS.object_enc_key:
+        from cryptography.fernet import Fernet
+
         try:
             _FERNET = Fernet(SETTINGS.object_enc_key.encode())
         except Exception:
@@ -195,21 +335,40 @@ def _get_fernet() -> Optional[Fernet]:
     return _FERNET
 
 
-def _get_object_key_broker() -> Optional[LocalDevelopmentKeyBroker]:
+def _get_object_key_broker() -> Optional[ObjectKeyBroker]:
     global _OBJECT_KEY_BROKER
     if _OBJECT_KEY_BROKER is not None:
         return _OBJECT_KEY_BROKER
     if SETTINGS.object_enc_key:
         try:
             root = base64.urlsafe_b64decode(SETTINGS.object_enc_key.encode())
-            _OBJECT_KEY_BROKER = LocalDevelopmentKeyBroker(root)
+            # Objects sealed before per-handle contexts are still opened by the trust broker.
+            _OBJECT_KEY_BROKER = ObjectKeyBroker(root, legacy=LocalDevelopmentKeyBroker(root))
         except Exception:
             _OBJECT_KEY_BROKER = None
     return _OBJECT_KEY_BROKER
 
 
+def _get_object_key_cache() -> Optional[ObjectKeyCache]:
+    global _OBJECT_KEY_CACHE
+    if _OBJECT_KEY_CACHE is not None:
+        return _OBJECT_KEY_CACHE
+    if not SETTINGS.object_enc_key:
+        return None
+    broker = _get_object_key_broker()
+    if broker is None:
+        # A configured but unusable key must not quietly downgrade principal objects to the service key.
+        raise HTTPException(status_code=503, detail="principal key broker unavailable")
+    _OBJECT_KEY_CACHE = ObjectKeyCache(
+        broker,
+        max_entries=SETTINGS.object_key_cache_size,
+        ttl_seconds=SETTINGS.object_key_cache_ttl_seconds,
+    )
+    return _OBJECT_KEY_CACHE
+
+
 def _source_library() -> SourceLibrary:
-    global _SOURCE_LIBRARY
+    global _SOURCE_LIBRARY, _EXTRACTION_POOL
     if _SOURCE_LIBRARY is None:
         key_value = SETTINGS.object_enc_key
         if not key_value:
@@ -218,10 +377,25 @@ def _source_library() -> SourceLibrary:
             key_path = SETTINGS.life_operations_root / ".development-key"
             key_path.parent.mkdir(parents=True, exist_ok=True)
             if not key_path.exists():
+                from cryptography.fernet import Fernet
+
                 key_path.write_bytes(Fernet.generate_key())
                 key_path.chmod(0o600)
             key_value = key_path.read_text(encoding="ascii").strip()
-        _SOURCE_LIBRARY = SourceLibrary(SETTINGS.life_operations_root, key_value.encode())
+        index_limits = IndexLimits(
+            max_open_shards=SETTINGS.source_open_shards,
+            checkpoint_pages=SETTINGS.source_checkpoint_pages,
+            journal_size_limit_bytes=SETTINGS.source_journal_limit_bytes,
+            extraction_cache_bytes=SETTINGS.extraction_cache_bytes,
+        )
+        # Loaded first: a broken pack fails here, before any worker threads are started.
+        scanner = ContentScanner.with_packs(SETTINGS.signature_packs)
+        if SETTINGS.extraction_workers > 0:
+            _EXTRACTION_POOL = ExtractionPool(SETTINGS.extraction_workers, SETTINGS.extraction_queue_size,
+                                              _EXTRACTION_METRICS)
+        _SOURCE_LIBRARY = SourceLibrary(SETTINGS.life_operations_root, key_value.encode(), index_limits=index_limits,
+                                        extraction=_EXTRACTION_POOL, extraction_metrics=_EXTRACTION_METRICS,
+                                        scanner=scanner)
     return _SOURCE_LIBRARY
 
 
@@ -234,6 +408,8 @@ def _life_key() -> bytes:
     key_path = SETTINGS.life_operations_root / ".development-key"
     key_path.parent.mkdir(parents=True, exist_ok=True)
     if not key_path.exists():
+        from cryptography.fernet import Fernet
+
         key_path.write_bytes(Fernet.generate_key())
         key_path.chmod(0o600)
     return key_path.read_text(encoding="ascii").strip().encode()
@@ -264,7 +440,7 @@ def _check_auth(request: Request):
 
 @app.put("/kv/{namespace}/{key}")
 def kv_put(namespace: str, key: str, request: Request, body: dict = Body(...)):
-    _metrics["/kv/{namespace}/{key}"] += 1
+    _count_request("/kv/{namespace}/{key}")
     event_id = request.headers.get("X-Event-ID")
     if not namespace or not key:
         return {"ok": False, "error": "invalid-path", "event_id": event_id}
@@ -276,7 +452,7 @@ def kv_put(namespace: str, key: str, request: Request, body: dict = Body(...)):
         engine = _init_engine()
         with engine.begin() as conn:
             conn.execute(
-                text(
+                _sql(
                     """
                     INSERT INTO kv(ns, key, value) VALUES(:ns, :key, :val)
                     ON CONFLICT(ns,key) DO UPDATE SET value=excluded.value
@@ -293,7 +469,7 @@ def kv_put(namespace: str, key: str, request: Request, body: dict = Body(...)):
 
 @app.get("/kv/{namespace}/{key}")
 def kv_get(namespace: str, key: str, request: Request):
-    _metrics["/kv/{namespace}/{key}"] += 1
+    _count_request("/kv/{namespace}/{key}")
     event_id = request.headers.get("X-Event-ID")
     try:
         principal = get_bound_principal(request) if not os.getenv("UNISON_PRINCIPAL_BINDING_TEST_BYPASS", "false").lower() == "true" else None
@@ -301,7 +477,7 @@ def kv_get(namespace: str, key: str, request: Request):
         engine = _init_engine()
         with engine.begin() as conn:
             row = conn.execute(
-                text("SELECT value FROM kv WHERE ns=:ns AND key=:key"), {"ns": storage_namespace, "key": key}
+                _sql("SELECT value FROM kv WHERE ns=:ns AND key=:key"), {"ns": storage_namespace, "key": key}
             ).fetchone()
         value = json.loads(row[0]) if row and row[0] is not None else None
         log_json(logging.INFO, "kv_get", service="unison-storage", event_id=event_id, ns=namespace, key=key, hit=value is not None)
@@ -315,7 +491,7 @@ def kv_get(namespace: str, key: str, request: Request):
 @app.post("/memory")
 def memory_put(request: Request, body: dict = Body(...), _: None = Depends(_check_auth)):
     """Store memory payload with optional TTL (seconds)."""
-    _metrics["/memory"] += 1
+    _count_request("/memory")
     session_id = body.get("session_id")
     payload = body.get("data")
     principal = get_bound_principal(request) if _ is not None else None
@@ -332,7 +508,7 @@ def memory_put(request: Request, body: dict = Body(...), _: None = Depends(_chec
     engine = _init_engine()
     with engine.begin() as conn:
         conn.execute(
-            text(
+            _sql(
                 """
                 INSERT INTO memory_entries (session_id, person_id, payload, ttl_seconds, expires_at, created_at, updated_at)
                 VALUES (:sid, :pid, :payload, :ttl, :expires_at, NOW(), NOW())
@@ -344,7 +520,7 @@ def memory_put(request: Request, body: dict = Body(...), _: None = Depends(_chec
                 "pid": person_id,
                 "payload": json.dumps(payload),
                 "ttl": ttl,
-                "expires_at": None if expires_at is None else text("to_timestamp(:ts)").bindparams(ts=expires_at),
+                "expires_at": None if expires_at is None else _sql("to_timestamp(:ts)").bindparams(ts=expires_at),
             },
         )
     return {"ok": True, "session_id": session_id}
@@ -356,7 +532,7 @@ def memory_get(session_id: str, request: Request, principal=Depends(_check_auth)
     engine = _init_engine()
     with engine.begin() as conn:
         row = conn.execute(
-            text(
+            _sql(
                 """
                 SELECT payload, expires_at FROM memory_entries
                 WHERE session_id=:sid
@@ -379,7 +555,7 @@ def memory_delete(session_id: str, request: Request, principal=Depends(_check_au
     stored_session_id = f"{principal.data_namespace}:{session_id}" if principal else session_id
     engine = _init_engine()
     with engine.begin() as conn:
-        conn.execute(text("DELETE FROM memory_entries WHERE session_id=:sid"), {"sid": stored_session_id})
+        conn.execute(_sql("DELETE FROM memory_entries WHERE session_id=:sid"), {"sid": stored_session_id})
     return {"ok": True}
 
 
@@ -395,7 +571,7 @@ def vault_put(request: Request, body: dict = Body(...), principal=Depends(_check
     engine = _init_engine()
     with engine.begin() as conn:
         conn.execute(
-            text(
+            _sql(
                 """
                 INSERT INTO vault_entries (key_id, cipher_text, metadata, created_at, updated_at)
                 VALUES (:key_id, :cipher_text, :metadata, NOW(), NOW())
@@ -417,7 +593,7 @@ def vault_get(key_id: str, request: Request, principal=Depends(_check_auth)):
     engine = _init_engine()
     with engine.begin() as conn:
         row = conn.execute(
-            text("SELECT cipher_text, metadata, version, updated_at FROM vault_entries WHERE key_id=:key_id"),
+            _sql("SELECT cipher_text, metadata, version, updated_at FROM vault_entries WHERE key_id=:key_id"),
             {"key_id": stored_key_id},
         ).fetchone()
     if not row:
@@ -444,7 +620,7 @@ def audit_log(request: Request, body: dict = Body(...), principal=Depends(_check
     engine = _init_engine()
     with engine.begin() as conn:
         conn.execute(
-            text(
+            _sql(
                 """
                 INSERT INTO audit_events (id, person_id, actor, action, target, decision_id, status, payload_json, created_at)
                 VALUES (:id, :person_id, :actor, :action, :target, :decision_id, :status, :payload, NOW())
@@ -491,9 +667,9 @@ def object_put(body: dict = Body(...), request: Request = None, _: None = Depend
         except Exception:
             raise HTTPException(status_code=400, detail="invalid base64 content")
         checksum = hashlib.sha256(data).hexdigest()
-        broker = _get_object_key_broker()
-        if principal and broker and principal.key_handle:
-            data = broker.encrypt(
+        key_cache = _get_object_key_cache() if principal and principal.key_handle else None
+        if key_cache is not None:
+            data = key_cache.encrypt(
                 key_handle=principal.key_handle,
                 plaintext=data,
                 associated_data=f"unison-storage:object:{obj_id}".encode(),
@@ -513,7 +689,7 @@ def object_put(body: dict = Body(...), request: Request = None, _: None = Depend
     engine = _init_engine()
     with engine.begin() as conn:
         conn.execute(
-            text(
+            _sql(
                 """
                 INSERT INTO objects (id, person_id, content_type, size_bytes, storage_backend, path, checksum, created_at)
                 VALUES (:id, :person_id, :content_type, :size_bytes, :backend, :path, :checksum, NOW())
@@ -544,7 +720,7 @@ def object_get(obj_id: str, request: Request, principal=Depends(_check_auth)):
     engine = _init_engine()
     with engine.begin() as conn:
         row = conn.execute(
-            text(
+            _sql(
                 """
                 SELECT person_id, content_type, size_bytes, storage_backend, path, checksum
                 FROM objects WHERE id=:id
@@ -558,10 +734,10 @@ def object_get(obj_id: str, request: Request, principal=Depends(_check_auth)):
     content_b64 = None
     if path and Path(path).exists():
         data = Path(path).read_bytes()
-        broker = _get_object_key_broker()
-        if principal and broker and principal.key_handle:
+        key_cache = _get_object_key_cache() if principal and principal.key_handle else None
+        if key_cache is not None:
             try:
-                data = broker.decrypt(
+                data = key_cache.decrypt(
                     key_handle=principal.key_handle,
                     ciphertext=data,
                     associated_data=f"unison-storage:object:{obj_id}".encode(),
@@ -571,6 +747,8 @@ def object_get(obj_id: str, request: Request, principal=Depends(_check_auth)):
         else:
             fernet = _get_fernet()
         if not principal and fernet:
+            from cryptography.fernet import InvalidToken
+
             try:
                 data = fernet.decrypt(data)
             except InvalidToken:
@@ -609,6 +787,112 @@ def import_source(session_id: str, request: Request, body: dict = Body(...), pri
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
+def _batch_file(item: dict) -> BatchFile:
+    def content() -> bytes:
+        # Decoded by the batch worker that checks the file, so a bad item is reported on its own.
+        try:
+            return base64.b64decode(item.get("content_b64", ""), validate=True)
+        except ValueError as exc:
+            raise IntakeRejected("content is not valid base64") from exc
+
+    return BatchFile(str(item.get("filename", "")), str(item.get("media_type", "")), content)
+
+
+@app.post("/v1/imports/{session_id}/sources/batch")
+def import_source_batch(session_id: str, request: Request, body: dict = Body(...), principal=Depends(_check_auth)):
+    """Ingest ``files`` in one transaction; the response has a result for each file."""
+    person_id = _life_person(request, principal, body.get("person_id"))
+    files = body.get("files")
+    if not isinstance(files, list) or not all(isinstance(item, dict) for item in files):
+        raise HTTPException(status_code=400, detail="files must be a list of objects")
+    try:
+        return _source_library().ingest_batch(session_id, [_batch_file(item) for item in files], person_id)
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.post("/v1/imports/{session_id}/sources/{source_id}/expand")
+def import_archive_expand(session_id: str, source_id: str, request: Request, body: dict = Body(default={}),
+                          principal=Depends(_check_auth)):
+    """Ingest each member of a zip source in the session as its own source."""
+    try:
+        return _source_library().expand_archive(
+            session_id, source_id, _life_person(request, principal, body.get("person_id"))
+        )
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/v1/imports/{session_id}")
+async def import_status(session_id: str, request: Request, wait: float = 0.0, person_id: str | None = None,
+                        principal=Depends(_check_auth)):
+    """The session and its sources' states; with ``wait``, holds until nothing is extracting or it runs out."""
+    bound_person = _life_person(request, principal, person_id)
+    deadline = time.monotonic() + min(max(wait, 0.0), _MAX_STATUS_WAIT_SECONDS)
+    library = await run_in_threadpool(_source_library)
+    while True:
+        try:
+            status = await run_in_threadpool(library.session_status, session_id, bound_person)
+        except IntakeRejected as exc:
+            raise HTTPException(status_code=404, detail=str(exc)) from exc
+        remaining = deadline - time.monotonic()
+        if not status["extracting"] or remaining <= 0:
+            return status
+        # Polls the index, so extractions finished by other workers are seen too.
+        await asyncio.sleep(min(0.25, remaining))
+
+
+@app.post("/v1/imports/{session_id}/uploads")
+def import_upload_start(session_id: str, request: Request, body: dict = Body(...), principal=Depends(_check_auth)):
+    person_id = _life_person(request, principal, body.get("person_id"))
+    try:
+        return _source_library().begin_upload(
+            session_id, body.get("filename", ""), body.get("media_type", ""), int(body.get("size_bytes", 0)), person_id
+        )
+    except (IntakeRejected, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/v1/imports/{session_id}/uploads/{upload_id}")
+def import_upload_status(session_id: str, upload_id: str, request: Request, person_id: str | None = None,
+                         principal=Depends(_check_auth)):
+    try:
+        return _source_library().upload_status(session_id, upload_id, _life_person(request, principal, person_id))
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@app.put("/v1/imports/{session_id}/uploads/{upload_id}")
+async def import_upload_chunk(session_id: str, upload_id: str, offset: int, request: Request,
+                              person_id: str | None = None, principal=Depends(_check_auth)):
+    """Append the raw request body as the chunk starting at ``offset``."""
+    bound_person = _life_person(request, principal, person_id)
+    library = await run_in_threadpool(_source_library)
+    chunk = bytearray()
+    # Read incrementally so an oversized body is refused before it is buffered whole.
+    async for part in request.stream():
+        chunk += part
+        if len(chunk) > library.limits.max_chunk_bytes:
+            raise HTTPException(status_code=413, detail="chunk exceeds the configured limit")
+    try:
+        return await run_in_threadpool(library.upload_chunk, session_id, upload_id, offset, bytes(chunk), bound_person)
+    except UploadConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc), headers={"Upload-Offset": str(exc.received_bytes)}) from exc
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.post("/v1/imports/{session_id}/uploads/{upload_id}/complete")
+def import_upload_complete(session_id: str, upload_id: str, request: Request, body: dict = Body(default={}),
+                           principal=Depends(_check_auth)):
+    try:
+        return _source_library().complete_upload(
+            session_id, upload_id, _life_person(request, principal, body.get("person_id"))
+        )
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
 @app.post("/v1/imports/{session_id}/admit")
 def import_admit(session_id: str, request: Request, body: dict = Body(default={}), principal=Depends(_check_auth)):
     try:
@@ -627,8 +911,31 @@ def import_rollback(session_id: str, request: Request, person_id: str | None = N
 
 
 @app.get("/v1/sources")
-def sources_list(request: Request, person_id: str | None = None, principal=Depends(_check_auth)):
-    return {"sources": _source_library().list_sources(_life_person(request, principal, person_id))}
+def sources_list(request: Request, person_id: str | None = None, limit: int | None = None, cursor: str | None = None,
+                 state: str | None = None, media_type: str | None = None, space_id: str | None = None,
+                 classification: str | None = None, created_after: float | None = None,
+                 created_before: float | None = None, fields: str | None = None, principal=Depends(_check_auth)):
+    """The person's sources, oldest first; pass ``limit`` to page with ``next_cursor``, ``fields`` to project."""
+    filters = {name: value for name, value in (("state", state), ("media_type", media_type), ("space_id", space_id),
+                                               ("classification", classification)) if value is not None}
+    projection = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    try:
+        return _source_library().page_sources(
+            _life_person(request, principal, person_id), limit=limit, cursor=cursor, created_after=created_after,
+            created_before=created_before, projection=projection, **filters
+        )
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/v1/sources/search")
+def sources_search(request: Request, q: str, limit: int = 20, offset: int = 0, person_id: str | None = None,
+                   principal=Depends(_check_auth)):
+    """Fields matching every word of ``q``, ranked, with snippets and cited character ranges."""
+    try:
+        return _source_library().search(_life_person(request, principal, person_id), q, limit, offset)
+    except IntakeRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @app.patch("/v1/sources/{source_id}/fields/{field_id}")
@@ -931,5 +1238,8 @@ def domain_pilot(request: Request, body: dict = Body(...), principal=Depends(_ch
 
 
 if __name__ == "__main__":
+    import uvicorn
+
+    _setup_tracing(app)
     # The container runtime publishes this internal service port intentionally.
     uvicorn.run(app, host="0.0.0.0", port=8082)  # nosec B104
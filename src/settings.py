@@ -18,6 +18,23 @@ class StorageServiceSettings:
     object_enc_key: str = ""
     life_operations_root: Path = Path("/data/life-operations")
     life_domains_root: Path = Path("/data/life-domains")
+    object_key_cache_size: int = 1024
+    object_key_cache_ttl_seconds: float = 300.0
+    sql_slow_query_ms: float = 250.0
+    metrics_dir: Path | None = None
+    profiling_dir: Path | None = None
+    profiling_token: str = ""
+    profiling_interval_ms: float = 5.0
+    readiness_interval_seconds: float = 5.0
+    log_queue_size: int = 10_000
+    log_sample_rates: str = ""
+    source_open_shards: int = 64
+    source_checkpoint_pages: int = 1000
+    source_journal_limit_bytes: int = 4 * 1024 * 1024
+    extraction_workers: int = 0
+    extraction_queue_size: int = 64
+    extraction_cache_bytes: int = 64 * 1024 * 1024
+    signature_packs: tuple[Path, ...] = ()
 
     @classmethod
     def from_env(cls) -> "StorageServiceSettings":
@@ -28,6 +45,23 @@ class StorageServiceSettings:
             object_enc_key=read_secret_setting("STORAGE_OBJECT_ENC_KEY"),
             life_operations_root=Path(os.getenv("UNISON_LIFE_OPERATIONS_ROOT", "/data/life-operations")),
             life_domains_root=Path(os.getenv("UNISON_LIFE_DOMAINS_ROOT", "/data/life-domains")),
+            object_key_cache_size=int(os.getenv("STORAGE_OBJECT_KEY_CACHE_SIZE", "1024")),
+            object_key_cache_ttl_seconds=float(os.getenv("STORAGE_OBJECT_KEY_CACHE_TTL_SECONDS", "300")),
+            sql_slow_query_ms=float(os.getenv("STORAGE_SQL_SLOW_QUERY_MS", "250")),
+            metrics_dir=Path(os.environ["UNISON_METRICS_DIR"]) if os.getenv("UNISON_METRICS_DIR") else None,
+            profiling_dir=Path(os.environ["STORAGE_PROFILING_DIR"]) if os.getenv("STORAGE_PROFILING_DIR") else None,
+            profiling_token=read_secret_setting("STORAGE_PROFILING_TOKEN"),
+            profiling_interval_ms=float(os.getenv("STORAGE_PROFILING_INTERVAL_MS", "5")),
+            readiness_interval_seconds=float(os.getenv("STORAGE_READINESS_INTERVAL_SECONDS", "5")),
+            log_queue_size=int(os.getenv("STORAGE_LOG_QUEUE_SIZE", "10000")),
+            log_sample_rates=os.getenv("STORAGE_LOG_SAMPLE", ""),
+            source_open_shards=int(os.getenv("STORAGE_SOURCE_OPEN_SHARDS", "64")),
+            source_checkpoint_pages=int(os.getenv("STORAGE_SOURCE_CHECKPOINT_PAGES", "1000")),
+            source_journal_limit_bytes=int(os.getenv("STORAGE_SOURCE_JOURNAL_LIMIT_BYTES", str(4 * 1024 * 1024))),
+            extraction_workers=int(os.getenv("STORAGE_EXTRACTION_WORKERS", "0")),
+            extraction_queue_size=int(os.getenv("STORAGE_EXTRACTION_QUEUE_SIZE", "64")),
+            extraction_cache_bytes=int(os.getenv("STORAGE_EXTRACTION_CACHE_BYTES", str(64 * 1024 * 1024))),
+            signature_packs=tuple(Path(item) for item in os.getenv("STORAGE_SIGNATURE_PACKS", "").split(os.pathsep) if item),
         )
 
 
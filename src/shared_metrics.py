@@ -0,0 +1,171 @@
+"""Metric value stores: process-local, or mmap-backed and shared between workers.
+
+With ``uvicorn --workers N`` every worker is a separate process, so counters kept
+in a dict only describe whichever worker answered the scrape. ``SharedValues``
+gives each process its own memory-mapped file in a common directory. A process
+is the only writer of its files, so updates need no cross-process locking, and
+any worker can sum every file when ``/metrics`` is scraped.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator
+
+
+MetricKey = tuple[str, ...]
+
+_HEADER = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_SEPARATOR = "\x1f"
+_FILE_NAME = re.compile(r"^(counter|live)_(\d+)\.db$")
+
+
+def _entry_size(encoded_key: bytes) -> int:
+    # Pad the key so every value lands on an 8-byte boundary.
+    key_part = _KEY_LENGTH.size + len(encoded_key)
+    return key_part + (-key_part % 8) + _VALUE.size
+
+
+def _read_entries(buffer: bytes | mmap.mmap) -> Iterator[tuple[str, int, float]]:
+    used = _HEADER.unpack_from(buffer, 0)[0] if len(buffer) >= _HEADER.size else 0
+    position = _HEADER.size
+    while position < used:
+        (length,) = _KEY_LENGTH.unpack_from(buffer, position)
+        key_start = position + _KEY_LENGTH.size
+        key = bytes(buffer[key_start:key_start + length]).decode()
+        value_offset = position + _entry_size(key.encode()) - _VALUE.size
+        yield key, value_offset, _VALUE.unpack_from(buffer, value_offset)[0]
+        position = value_offset + _VALUE.size
+
+
+class MmapValues:
+    """Append-only key to float64 slots in a memory-mapped file with a single writer."""
+
+    def __init__(self, path: Path, initial_size: int = 64 * 1024):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = os.fstat(self._fd).st_size
+        if size < _HEADER.size:
+            size = max(initial_size, _HEADER.size)
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        if _HEADER.unpack_from(self._map, 0)[0] == 0:
+            _HEADER.pack_into(self._map, 0, _HEADER.size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0]
+        self._offsets = {key: offset for key, offset, _ in _read_entries(self._map)}
+
+    def add(self, key: str, amount: float) -> None:
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._append(key)
+        value = _VALUE.unpack_from(self._map, offset)[0]
+        _VALUE.pack_into(self._map, offset, value + amount)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode()
+        size = _entry_size(encoded)
+        if self._used + size > len(self._map):
+            capacity = len(self._map)
+            while self._used + size > capacity:
+                capacity *= 2
+            os.ftruncate(self._fd, capacity)
+            self._map.resize(capacity)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + _KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        offset = self._used + size - _VALUE.size
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        # Publish the entry only after it is fully written so readers never see half of it.
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    @staticmethod
+    def read(path: Path) -> dict[str, float]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return {}
+        return {key: value for key, _, value in _read_entries(data)}
+
+
+class LocalValues:
+    """Process-local metric values for single-worker deployments and tests."""
+
+    def __init__(self):
+        self._values: dict[MetricKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key: MetricKey, amount: float = 1.0, *, live: bool = False) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict[MetricKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class SharedValues:
+    """Per-process mmap files in a shared directory, aggregated on read.
+
+    ``live`` values (in-flight gauges) are only summed for processes that are still
+    running, so a crashed worker cannot leave a gauge stuck above zero. Point the
+    directory at a location that is emptied when the container starts.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self) -> None:
+        self._pid = os.getpid()
+        self._counters = MmapValues(self.directory / f"counter_{self._pid}.db")
+        self._live = MmapValues(self.directory / f"live_{self._pid}.db")
+
+    def inc(self, key: MetricKey, amount: float = 1.0, *, live: bool = False) -> None:
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked after the store was opened; never write into the parent's files.
+                self._open()
+            (self._live if live else self._counters).add(_SEPARATOR.join(key), amount)
+
+    def snapshot(self) -> dict[MetricKey, float]:
+        totals: dict[MetricKey, float] = {}
+        for path in self.directory.iterdir():
+            match = _FILE_NAME.match(path.name)
+            if not match:
+                continue
+            kind, pid = match.group(1), int(match.group(2))
+            if kind == "live" and not _process_alive(pid):
+                continue
+            for key, value in MmapValues.read(path).items():
+                metric_key = tuple(key.split(_SEPARATOR))
+                totals[metric_key] = totals.get(metric_key, 0.0) + value
+        return totals
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+__all__ = ["LocalValues", "MetricKey", "MmapValues", "SharedValues"]
@@ -0,0 +1,121 @@
+"""Chunk-framed encrypted source files for resumable uploads.
+
+A source ingested in one request is stored as a single Fernet token. A
+source uploaded in chunks is stored as a sequence of frames, one per chunk, so
+each chunk is encrypted and written as it arrives and nothing holds the whole
+file. The file starts with ``FRAME_MAGIC``. Every frame is an 8-byte header,
+the big-endian plaintext length and token length, followed by the Fernet token
+of that chunk.
+
+``FramedReader`` is a seekable, read-only view of the plaintext. It decrypts
+one frame at a time, so ``zipfile`` can inspect an uploaded archive without
+the whole archive being decrypted into memory.
+"""
+
+from __future__ import annotations
+
+import io
+import struct
+from pathlib import Path
+from typing import Any, Iterator
+
+
+FRAME_MAGIC = b"USRCFRM1"
+_HEADER = struct.Struct(">II")
+
+
+def encode_frame(fernet: Any, chunk: bytes) -> bytes:
+    token = fernet.encrypt(chunk)
+    return _HEADER.pack(len(chunk), len(token)) + token
+
+
+def is_framed(path: Path) -> bool:
+    with open(path, "rb") as handle:
+        return handle.read(len(FRAME_MAGIC)) == FRAME_MAGIC
+
+
+def _frame_index(handle: Any) -> list[tuple[int, int, int, int]]:
+    """``(plain_offset, plain_length, token_offset, token_length)`` for each frame."""
+    index = []
+    plain_offset = 0
+    handle.seek(len(FRAME_MAGIC))
+    while header := handle.read(_HEADER.size):
+        if len(header) < _HEADER.size:
+            raise ValueError("truncated source frame header")
+        plain_length, token_length = _HEADER.unpack(header)
+        index.append((plain_offset, plain_length, handle.tell(), token_length))
+        plain_offset += plain_length
+        handle.seek(token_length, io.SEEK_CUR)
+    return index
+
+
+def iter_plaintext(path: Path, fernet: Any) -> Iterator[bytes]:
+    with open(path, "rb") as handle:
+        for _, _, token_offset, token_length in _frame_index(handle):
+            handle.seek(token_offset)
+            yield fernet.decrypt(handle.read(token_length))
+
+
+class FramedReader(io.RawIOBase):
+    """Seekable plaintext of a framed file; keeps at most one decrypted frame in memory."""
+
+    def __init__(self, path: Path, fernet: Any):
+        super().__init__()
+        self._handle = open(path, "rb")
+        self._fernet = fernet
+        self._frames = _frame_index(self._handle)
+        self._size = sum(frame[1] for frame in self._frames)
+        self._position = 0
+        self._cached: tuple[int, bytes] | None = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._position = base + offset
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        if self._position >= self._size:
+            return 0
+        number, plain_offset = self._frame_at(self._position)
+        plaintext = self._plaintext(number)
+        start = self._position - plain_offset
+        count = min(len(buffer), len(plaintext) - start)
+        buffer[:count] = plaintext[start:start + count]
+        self._position += count
+        return count
+
+    def _frame_at(self, position: int) -> tuple[int, int]:
+        low, high = 0, len(self._frames) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._frames[middle][0] <= position:
+                low = middle
+            else:
+                high = middle - 1
+        return low, self._frames[low][0]
+
+    def _plaintext(self, number: int) -> bytes:
+        if self._cached is None or self._cached[0] != number:
+            _, _, token_offset, token_length = self._frames[number]
+            self._handle.seek(token_offset)
+            self._cached = (number, self._fernet.decrypt(self._handle.read(token_length)))
+        return self._cached[1]
+
+    def close(self) -> None:
+        self._handle.close()
+        self._cached = None
+        super().close()
+
+
+__all__ = ["FRAME_MAGIC", "FramedReader", "encode_frame", "is_framed", "iter_plaintext"]
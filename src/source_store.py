@@ -0,0 +1,587 @@
+"""SQLite storage for source intake sessions, sources and extracted fields.
+
+Each session, source and field is a row holding its dict as a JSON document,
+with the columns that are filtered on copied out next to it, so a call reads
+and writes only the rows it touches. Field text is also indexed for search.
+Every person has their own WAL-mode store in their hashed directory;
+``SourceShards`` opens those lazily, keeps a bounded LRU of them, and splits
+older single-store and JSON layouts per person on first start.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+
+# Versioned with PRAGMA user_version: add a new entry at the end for each change, never edit a shipped one.
+SCHEMA: tuple[tuple[str, ...], ...] = (
+    # Version 1: tables.
+    (
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            person_id TEXT NOT NULL,
+            document TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sources (
+            source_id TEXT PRIMARY KEY,
+            person_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            checksum_sha256 TEXT NOT NULL,
+            state TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            document TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS fields (
+            source_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            field_id TEXT NOT NULL,
+            document TEXT NOT NULL,
+            PRIMARY KEY (source_id, field_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS sources_person_idx ON sources (person_id)",
+        "CREATE INDEX IF NOT EXISTS sources_session_idx ON sources (session_id)",
+    ),
+    # Version 2: duplicate and prior-version lookups for ingest.
+    (
+        "CREATE INDEX IF NOT EXISTS sources_person_checksum_idx ON sources (person_id, checksum_sha256)"
+        " WHERE state != 'deleted'",
+        "CREATE INDEX IF NOT EXISTS sources_person_filename_idx ON sources (person_id, filename, version)"
+        " WHERE state != 'deleted'",
+    ),
+    # Version 3: chunked uploads in progress.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            document TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS uploads_session_idx ON uploads (session_id)",
+    ),
+    # Version 4: extracted fields cached by content checksum and processor version.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS extractions (
+            checksum_sha256 TEXT NOT NULL,
+            processor TEXT NOT NULL,
+            fields TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            last_used INTEGER NOT NULL,
+            PRIMARY KEY (checksum_sha256, processor)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS extractions_used_idx ON extractions (last_used)",
+    ),
+    # Version 5: full-text index of field text, one row per searchable field, keyed by the field's rowid.
+    (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS field_text USING fts5 (text, tokenize = 'unicode61')",
+        """
+        INSERT INTO field_text (rowid, text)
+        SELECT rowid, json_extract(document, path) FROM (
+            SELECT rowid, document,
+                   CASE WHEN COALESCE(json_type(document, '$.corrected_value'), 'null') = 'null'
+                        THEN '$.value' ELSE '$.corrected_value' END AS path
+            FROM fields)
+        WHERE json_type(document, path) = 'text'
+        """,
+    ),
+    # Version 6: listing filters copied out of the source document, each with an index.
+    (
+        "ALTER TABLE sources ADD COLUMN media_type TEXT",
+        "ALTER TABLE sources ADD COLUMN space_id TEXT",
+        "ALTER TABLE sources ADD COLUMN classification TEXT",
+        "ALTER TABLE sources ADD COLUMN created_at REAL",
+        "UPDATE sources SET media_type=json_extract(document, '$.media_type'),"
+        " space_id=json_extract(document, '$.space_id'), classification=json_extract(document, '$.classification'),"
+        " created_at=json_extract(document, '$.created_at')",
+        "CREATE INDEX IF NOT EXISTS sources_person_state_idx ON sources (person_id, state)",
+        "CREATE INDEX IF NOT EXISTS sources_person_media_type_idx ON sources (person_id, media_type)",
+        "CREATE INDEX IF NOT EXISTS sources_person_space_idx ON sources (person_id, space_id)",
+        "CREATE INDEX IF NOT EXISTS sources_person_classification_idx ON sources (person_id, classification)",
+        "CREATE INDEX IF NOT EXISTS sources_person_created_idx ON sources (person_id, created_at)",
+    ),
+)
+
+# Filters ``page_sources`` accepts, each an indexed column of ``sources`` compared for equality.
+SOURCE_FILTERS = ("state", "media_type", "space_id", "classification")
+
+
+def person_shard(person_id: str) -> str:
+    """Directory name for a person's sources and index; the person id itself never reaches the disk."""
+    return hashlib.sha256(person_id.encode()).hexdigest()
+
+
+# How long a statement waits for another process's lock before failing.
+BUSY_TIMEOUT_SECONDS = 30.0
+# Connections a store keeps open between transactions; more are opened under load and closed after.
+MAX_IDLE_CONNECTIONS = 4
+
+
+def _connect(path: Path, checkpoint_pages: int, journal_size_limit: int) -> sqlite3.Connection:
+    # Autocommit mode: transactions are opened explicitly by the callers.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # PRAGMA does not take parameters; both values are ints.
+    conn.execute(f"PRAGMA wal_autocheckpoint={int(checkpoint_pages)}")
+    conn.execute(f"PRAGMA journal_size_limit={int(journal_size_limit)}")
+    return conn
+
+
+# A logical clock for the extraction cache's LRU order; wall-clock times can tie or step back.
+_NEXT_USE = "SELECT COALESCE(MAX(last_used), 0) + 1 FROM extractions"
+
+
+def _dump(document: dict[str, Any]) -> str:
+    return json.dumps(document, sort_keys=True, separators=(",", ":"))
+
+
+def field_text(field: dict[str, Any]) -> str | None:
+    """The text a field is searched by: its corrected value if it has one, else its value, if that is text."""
+    value = field.get("value") if field.get("corrected_value") is None else field["corrected_value"]
+    return value if isinstance(value, str) else None
+
+
+class SourceTransaction:
+    """Row-level reads and writes inside one ``SourceStore.transaction``."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def session(self, session_id: str) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT document FROM sessions WHERE session_id=?", (session_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def session_source_ids(self, session_id: str) -> list[str]:
+        return [source_id for (source_id,) in self.conn.execute(
+            "SELECT source_id FROM sources WHERE session_id=? ORDER BY rowid", (session_id,))]
+
+    def session_source_states(self, session_id: str) -> list[dict[str, Any]]:
+        return [{"source_id": source_id, "state": state, "extraction_queued_at": queued_at}
+                for source_id, state, queued_at in self.conn.execute(
+                    "SELECT source_id, state, json_extract(document, '$.extraction_queued_at') FROM sources"
+                    " WHERE session_id=? ORDER BY rowid", (session_id,))]
+
+    def put_session(self, session: dict[str, Any]) -> None:
+        # Membership lives in sources.session_id (see ``session_source_ids``), so a session row
+        # does not grow with its sources.
+        document = {key: value for key, value in session.items() if key != "source_ids"}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, person_id, document) VALUES (?, ?, ?)",
+            (session["session_id"], session["person_id"], _dump(document)),
+        )
+
+    def source(self, source_id: str) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT document FROM sources WHERE source_id=?", (source_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put_source(self, source: dict[str, Any]) -> None:
+        self.conn.execute(
+            "INSERT INTO sources (source_id, person_id, session_id, filename, checksum_sha256, state, version,"
+            " media_type, space_id, classification, created_at, document)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (source_id) DO UPDATE SET person_id=excluded.person_id, session_id=excluded.session_id,"
+            " filename=excluded.filename, checksum_sha256=excluded.checksum_sha256, state=excluded.state,"
+            " version=excluded.version, media_type=excluded.media_type, space_id=excluded.space_id,"
+            " classification=excluded.classification, created_at=excluded.created_at, document=excluded.document",
+            (source["source_id"], source["person_id"], source["import_session_id"], source["filename"],
+             source["checksum_sha256"], source["state"], source["version"], source.get("media_type"),
+             source.get("space_id"), source.get("classification"), source.get("created_at"), _dump(source)),
+        )
+
+    def remove_source(self, source_id: str) -> None:
+        self.conn.execute("DELETE FROM sources WHERE source_id=?", (source_id,))
+        self.remove_fields(source_id)
+
+    def sources(self, person_id: str) -> list[dict[str, Any]]:
+        return [json.loads(document) for (document,) in self.conn.execute(
+            "SELECT document FROM sources WHERE person_id=? AND state != 'deleted' ORDER BY rowid", (person_id,))]
+
+    def page_sources(self, person_id: str, *, after: int = 0, limit: int | None = None,
+                     created_after: float | None = None, created_before: float | None = None,
+                     **filters: str) -> list[tuple[int, dict[str, Any]]]:
+        """``(rowid, source)`` of live sources past rowid ``after`` in rowid order, narrowed by the filters.
+
+        Each filter is a ``SOURCE_FILTERS`` column with an index on ``(person_id, column)``. With one
+        filter, that index range past ``after`` holds only matching rows. Any further filter and the
+        ``created_at`` window are checked per row along it, or along the person's rowids when there is no
+        filter, so a sparse match can read many rows for one page. ``created_after`` is inclusive and
+        ``created_before`` exclusive.
+        """
+        clauses = ["person_id=?", "state != 'deleted'", "rowid > ?"]
+        parameters: list[Any] = [person_id, after]
+        for column, value in filters.items():
+            if column not in SOURCE_FILTERS:
+                raise ValueError(f"unknown source filter {column!r}")
+            clauses.append(f"{column}=?")
+            parameters.append(value)
+        if created_after is not None:
+            clauses.append("created_at >= ?")
+            parameters.append(created_after)
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            parameters.append(created_before)
+        parameters.append(-1 if limit is None else limit)
+        return [(rowid, json.loads(document)) for rowid, document in self.conn.execute(
+            f"SELECT rowid, document FROM sources WHERE {' AND '.join(clauses)} ORDER BY rowid LIMIT ?", parameters)]
+
+    def find_source(self, person_id: str, *, checksum_sha256: str | None = None,
+                    filename: str | None = None) -> dict[str, Any] | None:
+        """The live source with this checksum, or the highest version with this filename."""
+        if checksum_sha256 is not None:
+            row = self.conn.execute(
+                "SELECT document FROM sources WHERE person_id=? AND checksum_sha256=? AND state != 'deleted'"
+                " ORDER BY rowid LIMIT 1", (person_id, checksum_sha256)).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT document FROM sources WHERE person_id=? AND filename=? AND state != 'deleted'"
+                " ORDER BY version DESC LIMIT 1", (person_id, filename)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def fields(self, source_id: str) -> list[dict[str, Any]]:
+        return [json.loads(document) for (document,) in self.conn.execute(
+            "SELECT document FROM fields WHERE source_id=? ORDER BY position", (source_id,))]
+
+    def put_fields(self, source_id: str, fields: list[dict[str, Any]]) -> None:
+        """Replace the source's fields; these methods keep the search index in step with them."""
+        self.remove_fields(source_id)
+        for position, field in enumerate(fields):
+            cursor = self.conn.execute(
+                "INSERT INTO fields (source_id, position, field_id, document) VALUES (?, ?, ?, ?)",
+                (source_id, position, field["field_id"], _dump(field)))
+            self._index_field(cursor.lastrowid, field)
+
+    def put_field(self, field: dict[str, Any]) -> None:
+        row = self.conn.execute("SELECT rowid FROM fields WHERE source_id=? AND field_id=?",
+                                (field["source_id"], field["field_id"])).fetchone()
+        if row is None:
+            return
+        self.conn.execute("UPDATE fields SET document=? WHERE rowid=?", (_dump(field), row[0]))
+        self.conn.execute("DELETE FROM field_text WHERE rowid=?", row)
+        self._index_field(row[0], field)
+
+    def remove_fields(self, source_id: str) -> None:
+        self.conn.execute("DELETE FROM field_text WHERE rowid IN (SELECT rowid FROM fields WHERE source_id=?)",
+                          (source_id,))
+        self.conn.execute("DELETE FROM fields WHERE source_id=?", (source_id,))
+
+    def _index_field(self, rowid: int, field: dict[str, Any]) -> None:
+        # The full-text row shares the field row's rowid; nothing here runs VACUUM, which could renumber it.
+        text = field_text(field)
+        if text:
+            self.conn.execute("INSERT INTO field_text (rowid, text) VALUES (?, ?)", (rowid, text))
+
+    def search_fields(self, person_id: str, match: str, limit: int, offset: int,
+                      marks: tuple[str, str]) -> list[tuple[dict[str, Any], dict[str, Any], float, str, str]]:
+        """``(field, source, bm25 score, snippet, highlighted text)`` for fields matching the FTS5 ``match``.
+
+        Best matches first; in the snippet and the highlighted text each matched term is wrapped in ``marks``.
+        """
+        return [(json.loads(field), json.loads(source), score, snippet, highlighted)
+                for field, source, score, snippet, highlighted in self.conn.execute(
+                    "SELECT fields.document, sources.document, bm25(field_text),"
+                    " snippet(field_text, 0, ?, ?, '…', 24), highlight(field_text, 0, ?, ?)"
+                    " FROM field_text JOIN fields ON fields.rowid = field_text.rowid"
+                    " JOIN sources ON sources.source_id = fields.source_id"
+                    " WHERE field_text MATCH ? AND sources.person_id=? AND sources.state != 'deleted'"
+                    " ORDER BY bm25(field_text), field_text.rowid LIMIT ? OFFSET ?",
+                    (*marks, *marks, match, person_id, limit, offset))]
+
+    def cached_fields(self, checksum_sha256: str, processor: str) -> list[dict[str, Any]] | None:
+        """Cached fields for these bytes and processor version, marking them recently used."""
+        row = self.conn.execute("SELECT fields FROM extractions WHERE checksum_sha256=? AND processor=?",
+                                (checksum_sha256, processor)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(f"UPDATE extractions SET last_used=({_NEXT_USE}) WHERE checksum_sha256=? AND processor=?",
+                          (checksum_sha256, processor))
+        return json.loads(row[0])
+
+    def put_cached_fields(self, checksum_sha256: str, processor: str, fields: list[dict[str, Any]],
+                          max_bytes: int) -> None:
+        """Cache fields unless already cached; other processor versions' results for these bytes are dropped.
+
+        The least recently used entries are then evicted until the cache fits in ``max_bytes``.
+        """
+        if self.conn.execute("SELECT 1 FROM extractions WHERE checksum_sha256=? AND processor=?",
+                             (checksum_sha256, processor)).fetchone():
+            return
+        document = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+        self.conn.execute("DELETE FROM extractions WHERE checksum_sha256=?", (checksum_sha256,))
+        self.conn.execute(
+            f"INSERT INTO extractions (checksum_sha256, processor, fields, size_bytes, last_used)"
+            f" VALUES (?, ?, ?, ?, ({_NEXT_USE}))", (checksum_sha256, processor, document, len(document)))
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extractions").fetchone()
+        if total <= max_bytes:
+            return
+        evicted = []
+        for rowid, size_bytes in self.conn.execute("SELECT rowid, size_bytes FROM extractions ORDER BY last_used"):
+            if total <= max_bytes:
+                break
+            evicted.append((rowid,))
+            total -= size_bytes
+        self.conn.executemany("DELETE FROM extractions WHERE rowid=?", evicted)
+
+    def drop_cached_fields(self, checksum_sha256: str) -> None:
+        self.conn.execute("DELETE FROM extractions WHERE checksum_sha256=?", (checksum_sha256,))
+
+    def upload(self, upload_id: str) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT document FROM uploads WHERE upload_id=?", (upload_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def session_uploads(self, session_id: str) -> list[dict[str, Any]]:
+        return [json.loads(document) for (document,) in self.conn.execute(
+            "SELECT document FROM uploads WHERE session_id=? ORDER BY rowid", (session_id,))]
+
+    def put_upload(self, upload: dict[str, Any]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO uploads (upload_id, session_id, document) VALUES (?, ?, ?)",
+                          (upload["upload_id"], upload["session_id"], _dump(upload)))
+
+    def remove_upload(self, upload_id: str) -> None:
+        self.conn.execute("DELETE FROM uploads WHERE upload_id=?", (upload_id,))
+
+
+class SourceStore:
+    """One SQLite file shared by threads in this process and by other processes.
+
+    Connections are pooled per store. Reads borrow one and, under WAL, run
+    concurrently with each other and with a writer. Writers in this process queue
+    on ``_write_lock`` rather than spinning on SQLite's busy handler. Writers in
+    other processes are serialised by SQLite's file lock, which ``BEGIN
+    IMMEDIATE`` takes before the first read, so a read-modify-write cannot lose
+    a concurrent update.
+    """
+
+    def __init__(self, path: Path, legacy_index: Path | None = None, *, checkpoint_pages: int = 1000,
+                 journal_size_limit: int = 4 * 1024 * 1024):
+        self.path = path
+        self.checkpoint_pages = checkpoint_pages
+        self.journal_size_limit = journal_size_limit
+        self._idle: list[sqlite3.Connection] = []
+        self._active = 0
+        self._closed = False
+        self._state = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._migrate()
+        if legacy_index is not None and legacy_index.exists():
+            self._import_legacy(legacy_index)
+
+    @contextmanager
+    def transaction(self) -> Iterator[SourceTransaction]:
+        """A write transaction: rolled back if the block raises, committed otherwise."""
+        with self._write_lock, self._begin("BEGIN IMMEDIATE") as tx:
+            yield tx
+
+    @contextmanager
+    def read(self) -> Iterator[SourceTransaction]:
+        """A consistent snapshot for reads that does not take the database write lock."""
+        with self._begin("BEGIN") as tx:
+            yield tx
+
+    @contextmanager
+    def _begin(self, statement: str) -> Iterator[SourceTransaction]:
+        with self._connection() as conn:
+            conn.execute(statement)
+            try:
+                yield SourceTransaction(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        with self._state:
+            self._active += 1
+            conn = self._idle.pop() if self._idle else None
+        try:
+            if conn is None:
+                conn = _connect(self.path, self.checkpoint_pages, self.journal_size_limit)
+            yield conn
+        finally:
+            with self._state:
+                self._active -= 1
+                if conn is not None and not self._closed and len(self._idle) < MAX_IDLE_CONNECTIONS:
+                    self._idle.append(conn)
+                elif conn is not None:
+                    conn.close()
+                self._state.notify_all()
+
+    def _migrate(self) -> None:
+        with self.transaction() as tx:
+            (version,) = tx.conn.execute("PRAGMA user_version").fetchone()
+            for statements in SCHEMA[version:]:
+                for statement in statements:
+                    tx.conn.execute(statement)
+            # PRAGMA does not take parameters; the value is an int from len().
+            tx.conn.execute(f"PRAGMA user_version = {len(SCHEMA)}")
+
+    def _import_legacy(self, legacy_index: Path) -> None:
+        with self.transaction() as tx:
+            migrated = tx.conn.execute("SELECT 1 FROM meta WHERE name='legacy_json_migrated'").fetchone()
+            if migrated is None:
+                index = json.loads(legacy_index.read_text(encoding="utf-8"))
+                for source in index.get("sources", {}).values():
+                    tx.put_source(source)
+                    tx.put_fields(source["source_id"], index.get("fields", {}).get(source["source_id"], []))
+                for session in index.get("sessions", {}).values():
+                    tx.put_session(session)
+                tx.conn.execute("INSERT INTO meta (name, value) VALUES ('legacy_json_migrated', ?)",
+                                (legacy_index.name,))
+        # Only after the import has committed; a crash before this just finds the marker next time.
+        legacy_index.unlink()
+
+    def compact(self) -> None:
+        """Fold the whole journal into the database file and truncate it."""
+        with self._connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        """Wait for transactions in flight, then compact and close.
+
+        Later use still works, on a connection that is closed again when it is released.
+        """
+        with self._state:
+            self._closed = True
+            self._state.wait_for(lambda: self._active == 0)
+            if self._idle:
+                self._idle[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+    def _reopen(self) -> None:
+        with self._state:
+            self._closed = False
+
+
+class SourceShards:
+    """Per-person ``SourceStore``s under ``root``, opened lazily and kept in an LRU."""
+
+    def __init__(self, root: Path, *, max_open: int = 64, checkpoint_pages: int = 1000,
+                 journal_size_limit: int = 4 * 1024 * 1024):
+        if max_open < 1:
+            raise ValueError("max_open must be positive")
+        self.root = root
+        self.max_open = max_open
+        self.checkpoint_pages = checkpoint_pages
+        self.journal_size_limit = journal_size_limit
+        self._open: OrderedDict[str, SourceStore] = OrderedDict()
+        # Evicted stores that a caller still holds, so that reopening the shard hands back the same store
+        # and its write lock instead of a second one for the same file.
+        self._evicted: weakref.WeakValueDictionary[str, SourceStore] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._catalog = _connect(root / "source-catalog.sqlite3", checkpoint_pages, journal_size_limit)
+        self._catalog.execute(
+            "CREATE TABLE IF NOT EXISTS session_shards (session_id TEXT PRIMARY KEY, shard TEXT NOT NULL)")
+        self._split_unsharded(root / "source-index.sqlite3", root / "source-index.json")
+
+    def for_person(self, person_id: str, *, create: bool = True) -> SourceStore | None:
+        """The person's store; None when ``create`` is false and the person has none yet."""
+        return self._shard(person_shard(person_id), create)
+
+    def for_session(self, session_id: str) -> SourceStore | None:
+        with self._lock:
+            row = self._catalog.execute("SELECT shard FROM session_shards WHERE session_id=?",
+                                        (session_id,)).fetchone()
+        return None if row is None else self._shard(row[0], create=False)
+
+    def register_session(self, session_id: str, person_id: str) -> None:
+        with self._lock:
+            self._catalog.execute("INSERT OR REPLACE INTO session_shards (session_id, shard) VALUES (?, ?)",
+                                  (session_id, person_shard(person_id)))
+
+    def open_count(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def _shard(self, shard: str, create: bool) -> SourceStore | None:
+        evicted = []
+        with self._lock:
+            store = self._open.get(shard)
+            if store is not None:
+                self._open.move_to_end(shard)
+                return store
+            store = self._evicted.pop(shard, None)
+            if store is not None:
+                store._reopen()
+                self._open[shard] = store
+            else:
+                directory = self.root / shard
+                if not create and not (directory / "source-index.sqlite3").exists():
+                    return None
+                directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+                store = self._open[shard] = SourceStore(directory / "source-index.sqlite3",
+                                                        checkpoint_pages=self.checkpoint_pages,
+                                                        journal_size_limit=self.journal_size_limit)
+            while len(self._open) > self.max_open:
+                old_shard, old = self._open.popitem(last=False)
+                self._evicted[old_shard] = old
+                evicted.append((old_shard, old))
+        # Closing waits for the evicted store's transactions, so it happens outside the lock. A caller
+        # still holding an evicted store keeps working on unpooled connections.
+        for old_shard, old in evicted:
+            old.close()
+            with self._lock:
+                if self._open.get(old_shard) is old:
+                    # Reopened while it was closing.
+                    old._reopen()
+        return store
+
+    def _split_unsharded(self, database: Path, legacy_json: Path) -> None:
+        if not database.exists() and not legacy_json.exists():
+            return
+        # Workers of one deployment start together; only one of them splits, the rest find it done.
+        with open(self.root / "source-catalog.lock", "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if database.exists() or legacy_json.exists():
+                self._split_locked(database, legacy_json)
+
+    def _split_locked(self, database: Path, legacy_json: Path) -> None:
+        unsharded = SourceStore(database, legacy_index=legacy_json)
+        with unsharded.read() as old:
+            people = [person_id for (person_id,) in old.conn.execute(
+                "SELECT person_id FROM sessions UNION SELECT person_id FROM sources")]
+        for person_id in people:
+            with unsharded.read() as old, self.for_person(person_id).transaction() as tx:
+                for (document,) in old.conn.execute("SELECT document FROM sessions WHERE person_id=?",
+                                                    (person_id,)):
+                    session = json.loads(document)
+                    tx.put_session(session)
+                    self.register_session(session["session_id"], person_id)
+                for (document,) in old.conn.execute("SELECT document FROM sources WHERE person_id=? ORDER BY rowid",
+                                                    (person_id,)):
+                    source = json.loads(document)
+                    tx.put_source(source)
+                    tx.put_fields(source["source_id"], old.fields(source["source_id"]))
+        unsharded.close()
+        for leftover in (database, *(database.with_name(database.name + suffix)
+                                     for suffix in ("-journal", "-wal", "-shm"))):
+            leftover.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self._lock:
+            for store in self._open.values():
+                store.close()
+            self._open.clear()
+            self._catalog.close()
+
+
+__all__ = ["SOURCE_FILTERS", "SourceShards", "SourceStore", "SourceTransaction", "field_text", "person_shard"]
@@ -0,0 +1,133 @@
+"""SQL statement timing hooked into SQLAlchemy cursor execution events.
+
+Statements are grouped by their normalized template (the bound-parameter text,
+never the values), so ``/metrics`` shows whether a slow request is spending its
+time in the database. Each statement also becomes a tracing span.
+
+Row counts cover only statements without a result set (INSERT, UPDATE, DELETE),
+from the cursor's ``rowcount``. For a SELECT, the DB-API leaves ``rowcount`` at
+-1 or at a driver-specific value until the rows are fetched, which happens after
+these hooks run. Those statements are therefore timed but not counted.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+from request_metrics import LATENCY_BUCKETS, MetricValues, histogram_lines, observe_histogram, series_lines
+from shared_metrics import LocalValues, MetricKey
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+
+OTHER_STATEMENT = "other"
+_WHITESPACE = re.compile(r"\s+")
+
+SlowQueryHook = Callable[[str, float, int], None]
+
+
+def statement_template(statement: str, limit: int = 160) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()[:limit]
+
+
+class StatementMetrics:
+    def __init__(self, values: MetricValues | None = None, buckets: tuple[float, ...] = LATENCY_BUCKETS,
+                 max_templates: int = 256):
+        self.values = values if values is not None else LocalValues()
+        self.buckets = tuple(sorted(buckets))
+        self.max_templates = max_templates
+        self._templates: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _key(self, template: str) -> str:
+        with self._lock:
+            if template in self._templates:
+                return template
+            if len(self._templates) < self.max_templates:
+                self._templates.add(template)
+                return template
+        return OTHER_STATEMENT
+
+    def observe(self, template: str, seconds: float, rows: int, slow: bool) -> None:
+        key = self._key(template)
+        observe_histogram(self.values, "unison_storage_sql_duration_seconds", (key,), self.buckets, seconds)
+        if rows > 0:
+            self.values.inc(("unison_storage_sql_rows_total", key), rows)
+        if slow:
+            self.values.inc(("unison_storage_sql_slow_total", key))
+
+    def failed(self, template: str) -> None:
+        self.values.inc(("unison_storage_sql_errors_total", self._key(template)))
+
+    def render(self, snapshot: dict[MetricKey, float] | None = None) -> list[str]:
+        snapshot = self.values.snapshot() if snapshot is None else snapshot
+        lines = [
+            "# HELP unison_storage_sql_duration_seconds SQL statement latency by statement template",
+            "# TYPE unison_storage_sql_duration_seconds histogram",
+        ]
+        lines.extend(histogram_lines(snapshot, "unison_storage_sql_duration_seconds", ("statement",), self.buckets))
+        for name, help_text in (
+            ("unison_storage_sql_rows_total", "Rows affected by INSERT, UPDATE and DELETE statements by template"),
+            ("unison_storage_sql_slow_total", "Statements slower than the slow-query threshold"),
+            ("unison_storage_sql_errors_total", "Statements that raised a database error"),
+        ):
+            lines.extend(["", f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+            lines.extend(series_lines(snapshot, name, ("statement",)))
+        return lines
+
+
+def instrument_engine(engine: Engine, metrics: StatementMetrics, *, slow_threshold_seconds: float = 0.25,
+                      on_slow: SlowQueryHook | None = None, tracer: Any | None = None) -> None:
+    """Attach cursor execution listeners that time every statement run on ``engine``."""
+    from sqlalchemy import event
+
+    if tracer is None:
+        from opentelemetry import trace
+
+        tracer = trace.get_tracer("unison-storage.sql")
+    system = engine.dialect.name
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        template = statement_template(statement)
+        span = tracer.start_span(
+            f"sql {template.split(' ', 1)[0].upper()}",
+            attributes={"db.system": system, "db.statement": template},
+        )
+        conn.info.setdefault("unison_sql_timing", []).append((template, span, time.perf_counter()))
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("unison_sql_timing")
+        if not stack:
+            return
+        template, span, started = stack.pop()
+        elapsed = time.perf_counter() - started
+        # -1 means unknown: statements that return rows are not counted (see the module docstring).
+        rows = cursor.rowcount if cursor.description is None and cursor.rowcount is not None else -1
+        slow = elapsed >= slow_threshold_seconds
+        metrics.observe(template, elapsed, rows, slow)
+        if rows >= 0:
+            span.set_attribute("db.row_count", rows)
+        span.end()
+        if slow and on_slow is not None:
+            on_slow(template, elapsed, rows)
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("unison_sql_timing") if conn is not None else None
+        if not stack:
+            return
+        template, span, _ = stack.pop()
+        metrics.failed(template)
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+__all__ = ["StatementMetrics", "instrument_engine", "statement_template"]
@@ -3,5 +3,7 @@ import sys
 
 CURRENT_DIR = os.path.dirname(__file__)
 SERVICE_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
-if SERVICE_ROOT not in sys.path:
-    sys.path.insert(0, SERVICE_ROOT)
+# Service modules import their siblings by bare name, as they do when server.py runs from src/.
+for path in (os.path.join(SERVICE_ROOT, "src"), SERVICE_ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
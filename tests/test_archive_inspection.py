@@ -0,0 +1,72 @@
+import io
+import struct
+import tracemalloc
+import zipfile
+
+import pytest
+
+from src.archive_inspection import ArchiveRejected, inspect_zip
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    payload = io.BytesIO()
+    with zipfile.ZipFile(payload, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return payload.getvalue()
+
+
+def _forge_size(data, size):
+    """Rewrite the single member's uncompressed size in its local header and central directory entry."""
+    data = bytearray(data)
+    struct.pack_into("<L", data, 22, size)
+    directory = data.rindex(b"PK\x01\x02")
+    struct.pack_into("<L", data, directory + 24, size)
+    return bytes(data)
+
+
+def test_honest_archive_is_fully_read_and_summarised():
+    data = _zip({"a.txt": b"a" * 100_000, "b/c.txt": b"c" * 5})
+
+    summary = inspect_zip(io.BytesIO(data), max_members=2, max_expanded_bytes=100_005)
+
+    assert (summary.members, summary.expanded_bytes) == (2, 100_005)
+    with pytest.raises(ArchiveRejected, match="too many members"):
+        inspect_zip(io.BytesIO(data), max_members=1, max_expanded_bytes=10**9)
+    with pytest.raises(ArchiveRejected, match="expansion limit"):
+        inspect_zip(io.BytesIO(data), max_members=2, max_expanded_bytes=100_004)
+
+
+@pytest.mark.parametrize("declared", [10, 2_000_000])
+def test_forged_member_sizes_are_caught_by_actual_decompression(declared):
+    data = _forge_size(_zip({"bomb.txt": b"\0" * 1_000_000}), declared)
+    assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].file_size == declared
+
+    with pytest.raises(ArchiveRejected, match="invalid archive|forged"):
+        inspect_zip(io.BytesIO(data), max_members=1, max_expanded_bytes=10_000_000)
+
+
+def test_traversal_is_rejected_before_anything_is_decompressed():
+    data = _zip({"ok.txt": b"x", "..\\escape.txt": b"y"})
+
+    with pytest.raises(ArchiveRejected, match="traversal"):
+        inspect_zip(io.BytesIO(data), max_members=5, max_expanded_bytes=10)
+
+
+def test_memory_stays_flat_while_a_large_archive_expands(tmp_path):
+    path = tmp_path / "large.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("zeros.bin", "w") as member:
+            for _ in range(64):
+                member.write(b"\0" * 1024 * 1024)
+
+    tracemalloc.start()
+    try:
+        with open(path, "rb") as handle:
+            summary = inspect_zip(handle, max_members=1, max_expanded_bytes=64 * 1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert summary.expanded_bytes == 64 * 1024 * 1024
+    assert peak < 2 * 1024 * 1024
@@ -0,0 +1,45 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("unison_common")
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+# Cumulative `python -X importtime` budget for `import server`; FastAPI itself is most of it.
+IMPORT_BUDGET_US = int(os.getenv("STORAGE_IMPORT_BUDGET_MS", "1500")) * 1000
+DEFERRED_MODULES = ("sqlalchemy", "cryptography", "uvicorn", "boto3", "opentelemetry.instrumentation")
+
+
+def _import_server(tmp_path):
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT / "src"), os.getenv("PYTHONPATH")])),
+        "OTEL_SDK_DISABLED": "true",
+        "UNISON_STORAGE_DB": str(tmp_path / "store.db"),
+    }
+    script = (
+        "import sys, server; "
+        f"print(' '.join(m for m in sys.modules if m.startswith({DEFERRED_MODULES!r})))"
+    )
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", script], env=env, cwd=tmp_path,
+                          capture_output=True, text=True, check=True)
+
+
+def test_importing_server_defers_heavy_subsystems(tmp_path):
+    result = _import_server(tmp_path)
+
+    assert result.stdout.strip() == ""
+
+
+def test_importing_server_stays_within_budget(tmp_path):
+    result = _import_server(tmp_path)
+
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[2].strip() == "server"
+    )
+    assert cumulative <= IMPORT_BUDGET_US, f"import server took {cumulative / 1000:.0f} ms"
@@ -0,0 +1,56 @@
+import logging
+import threading
+
+from src.log_queue import EventSampler, QueueLogging, parse_sample_rates
+
+
+class BlockingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.threads = set()
+        self.messages = []
+
+    def emit(self, record):
+        self.gate.wait(5)
+        self.threads.add(threading.get_ident())
+        self.messages.append(record.getMessage())
+
+
+def test_records_are_written_off_thread_and_overflow_is_counted():
+    logger = logging.getLogger("test-log-queue")
+    logger.propagate = False
+    handler = BlockingHandler()
+    logger.handlers = [handler]
+    installed = QueueLogging.install(logger, capacity=2)
+    try:
+        # The writer takes one record and blocks on it, leaving room for two more.
+        for index in range(10):
+            logger.warning("event %d", index)
+        assert installed.dropped >= 5
+        # Stop while the buffer is still full: the stop marker has to wait for a slot, not fail.
+        stopping = threading.Thread(target=installed.stop)
+        stopping.start()
+        handler.gate.set()
+        stopping.join(10)
+        assert not stopping.is_alive()
+        assert installed.listener._thread is None
+    finally:
+        handler.gate.set()
+        installed.stop()
+
+    assert handler.messages[0] == "event 0"
+    assert len(handler.messages) + installed.dropped == 10
+    assert threading.get_ident() not in handler.threads
+
+
+def test_sampler_keeps_one_in_n_and_never_samples_warnings():
+    sampler = EventSampler(parse_sample_rates("kv_get=4, health=1"))
+
+    kept = [sampler.keep(logging.INFO, "kv_get") for _ in range(8)]
+
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert sampler.sampled_out == {"kv_get": 6}
+    assert all(sampler.keep(logging.ERROR, "kv_get") for _ in range(3))
+    assert all(sampler.keep(logging.INFO, "health") for _ in range(3))
+    assert all(sampler.keep(logging.INFO, "kv_put") for _ in range(3))
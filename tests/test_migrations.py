@@ -0,0 +1,73 @@
+import threading
+
+from sqlalchemy import create_engine, event, inspect, text
+
+from src.migrations import MIGRATIONS, Migration, current_version, migrate
+
+
+def _engine(path):
+    return create_engine(f"sqlite:///{path}", future=True)
+
+
+def test_fresh_database_applies_every_migration_once(tmp_path):
+    engine = _engine(tmp_path / "store.db")
+
+    assert migrate(engine) == [migration.version for migration in MIGRATIONS]
+    assert current_version(engine) == MIGRATIONS[-1].version
+    assert {"kv", "memory_entries", "vault_entries", "audit_events", "objects"} <= set(inspect(engine).get_table_names())
+    assert "memory_entries_session_id_idx" in {index["name"] for index in inspect(engine).get_indexes("memory_entries")}
+    assert "objects_path_idx" in {index["name"] for index in inspect(engine).get_indexes("objects")}
+
+
+def test_current_schema_costs_one_query(tmp_path):
+    engine = _engine(tmp_path / "store.db")
+    migrate(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert migrate(engine) == []
+    assert statements == ["SELECT MAX(version) FROM schema_version"]
+
+
+def test_pre_versioning_database_adopts_baseline_and_keeps_rows(tmp_path):
+    engine = _engine(tmp_path / "store.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE kv (ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (ns, key))"))
+        conn.execute(text("INSERT INTO kv VALUES ('n', 'k', '1')"))
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT value FROM kv")).scalar() == "1"
+
+
+def test_new_migrations_apply_on_top_of_recorded_version(tmp_path):
+    engine = _engine(tmp_path / "store.db")
+    migrate(engine)
+    extra = Migration(MIGRATIONS[-1].version + 1, "kv updated_at", ("ALTER TABLE kv ADD COLUMN updated_at TEXT",))
+
+    assert migrate(engine, (*MIGRATIONS, extra)) == [extra.version]
+    assert migrate(engine, (*MIGRATIONS, extra)) == []
+    assert "updated_at" in {column["name"] for column in inspect(engine).get_columns("kv")}
+
+
+def test_replicas_starting_together_apply_each_migration_once(tmp_path):
+    path = tmp_path / "store.db"
+    barrier = threading.Barrier(6)
+    results = []
+
+    def replica():
+        engine = _engine(path)
+        barrier.wait()
+        results.append(migrate(engine))
+
+    threads = [threading.Thread(target=replica) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    applied = [version for result in results for version in result]
+    assert sorted(applied) == [migration.version for migration in MIGRATIONS]
+    with _engine(path).connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == len(MIGRATIONS)
@@ -0,0 +1,115 @@
+import pytest
+
+from src.object_keys import ENVELOPE_PREFIX, ObjectKeyBroker, ObjectKeyCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HandleContext:
+    def __init__(self, key_handle):
+        self.key_handle = key_handle
+
+    def encrypt(self, *, plaintext, associated_data):
+        return b"|".join([self.key_handle.encode(), associated_data, plaintext[::-1]])
+
+    def decrypt(self, *, ciphertext, associated_data):
+        handle, aad, body = ciphertext.split(b"|", 2)
+        if handle != self.key_handle.encode() or aad != associated_data:
+            raise ValueError("wrong key or associated data")
+        return body[::-1]
+
+
+class ContextBroker:
+    def __init__(self):
+        self.derived = []
+
+    def context(self, key_handle):
+        self.derived.append(key_handle)
+        return HandleContext(key_handle)
+
+
+class CallBroker:
+    """A broker with only per-call encrypt/decrypt."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encrypt(self, *, key_handle, plaintext, associated_data):
+        self.calls += 1
+        return HandleContext(key_handle).encrypt(plaintext=plaintext, associated_data=associated_data)
+
+    def decrypt(self, *, key_handle, ciphertext, associated_data):
+        self.calls += 1
+        return HandleContext(key_handle).decrypt(ciphertext=ciphertext, associated_data=associated_data)
+
+
+def test_broker_contexts_are_derived_once_and_keep_the_broker_format():
+    broker = ContextBroker()
+    cache = ObjectKeyCache(broker)
+
+    sealed = cache.encrypt(key_handle="kh-a", plaintext=b"object body", associated_data=b"obj-1")
+
+    assert sealed == HandleContext("kh-a").encrypt(plaintext=b"object body", associated_data=b"obj-1")
+    assert cache.decrypt(key_handle="kh-a", ciphertext=sealed, associated_data=b"obj-1") == b"object body"
+    assert broker.derived == ["kh-a"]
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+    with pytest.raises(ValueError):
+        cache.decrypt(key_handle="kh-b", ciphertext=sealed, associated_data=b"obj-1")
+
+
+def test_ttl_and_capacity_evict_contexts():
+    clock = FakeClock()
+    broker = ContextBroker()
+    cache = ObjectKeyCache(broker, max_entries=2, ttl_seconds=10, clock=clock)
+    sealed = cache.encrypt(key_handle="kh-a", plaintext=b"a")
+    clock.now = 11
+
+    assert cache.decrypt(key_handle="kh-a", ciphertext=sealed) == b"a"
+    assert broker.derived == ["kh-a", "kh-a"] and cache.stats()["evictions"] == 1
+    cache.encrypt(key_handle="kh-b", plaintext=b"b")
+    cache.encrypt(key_handle="kh-c", plaintext=b"c")
+    assert set(cache._entries) == {"kh-b", "kh-c"} and cache.stats()["evictions"] == 2
+
+
+def test_broker_without_contexts_is_passed_through():
+    broker = CallBroker()
+    cache = ObjectKeyCache(broker)
+
+    sealed = cache.encrypt(key_handle="kh-a", plaintext=b"a", associated_data=b"x")
+
+    assert cache.decrypt(key_handle="kh-a", ciphertext=sealed, associated_data=b"x") == b"a"
+    assert broker.calls == 2
+    assert cache.stats()["passthrough"] == 2 and cache.stats()["entries"] == 0
+
+
+def test_object_key_broker_contexts_are_cached_and_wiped_on_eviction():
+    legacy = CallBroker()
+    broker = ObjectKeyBroker(bytes(range(32)), legacy=legacy)
+    clock = FakeClock()
+    cache = ObjectKeyCache(broker, max_entries=1, ttl_seconds=10, clock=clock)
+
+    sealed = cache.encrypt(key_handle="kh-a", plaintext=b"object body", associated_data=b"obj-1")
+    context = cache._entries["kh-a"].context
+
+    assert sealed.startswith(ENVELOPE_PREFIX)
+    assert broker.decrypt(key_handle="kh-a", ciphertext=sealed, associated_data=b"obj-1") == b"object body"
+    assert cache.decrypt(key_handle="kh-a", ciphertext=sealed, associated_data=b"obj-1") == b"object body"
+    assert cache.stats()["hits"] == 1 and any(context.key)
+    with pytest.raises(Exception):
+        cache.decrypt(key_handle="kh-b", ciphertext=sealed, associated_data=b"obj-1")
+    assert set(cache._entries) == {"kh-b"} and not any(context.key)
+
+
+def test_object_key_broker_opens_objects_sealed_by_the_trust_broker():
+    legacy = CallBroker()
+    cache = ObjectKeyCache(ObjectKeyBroker(bytes(range(32)), legacy=legacy))
+    sealed = legacy.encrypt(key_handle="kh-a", plaintext=b"old object", associated_data=b"obj-1")
+
+    assert cache.decrypt(key_handle="kh-a", ciphertext=sealed, associated_data=b"obj-1") == b"old object"
+    assert legacy.calls == 2
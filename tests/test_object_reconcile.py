@@ -0,0 +1,94 @@
+import hashlib
+import os
+import time
+
+from sqlalchemy import create_engine, text
+
+from src.object_reconcile import ObjectReconciler
+
+
+def _store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}", future=True)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE objects (id TEXT PRIMARY KEY, person_id TEXT, content_type TEXT, size_bytes BIGINT, "
+            "storage_backend TEXT, path TEXT, checksum TEXT)"
+        ))
+    objects = tmp_path / "objects"
+    objects.mkdir()
+    return engine, objects
+
+
+def _put(engine, objects, obj_id, data, *, row=True, file=True, checksum=None):
+    target = objects / hashlib.sha256(obj_id.encode()).hexdigest()
+    if file:
+        target.write_bytes(data)
+    if row:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO objects (id, size_bytes, storage_backend, path, checksum) "
+                "VALUES (:id, :size, 'filesystem', :path, :checksum)"
+            ), {"id": obj_id, "size": len(data), "path": str(target),
+                "checksum": checksum or hashlib.sha256(data).hexdigest()})
+    return target
+
+
+def test_reconcile_reports_missing_drift_and_deletes_only_aged_orphans(tmp_path):
+    engine, objects = _store(tmp_path)
+    for index in range(7):
+        _put(engine, objects, f"ok-{index}", b"payload")
+    _put(engine, objects, "missing", b"gone", file=False)
+    _put(engine, objects, "drifted", b"original", checksum=hashlib.sha256(b"other").hexdigest())
+    _put(engine, objects, "resized", b"abc").write_bytes(b"abcdef")
+    old_orphan = _put(engine, objects, "old-orphan", b"x", row=False)
+    stale = time.time() - 7200
+    os.utime(old_orphan, (stale, stale))
+    young_orphan = _put(engine, objects, "young-orphan", b"y", row=False)
+
+    reconciler = ObjectReconciler(engine, objects, batch_size=3, decode=lambda _obj_id, data: data)
+    report = reconciler.run(delete_orphans=True, verify_checksums=True)
+
+    assert report.scanned_rows == 10 and report.scanned_files == 11
+    assert report.samples["missing_files"] == ["missing"]
+    assert report.samples["checksum_drift"] == ["drifted", "resized"]
+    assert report.samples["size_drift"] == ["resized"]
+    assert report.orphan_files == 1 and report.deleted_orphans == 1
+    assert not old_orphan.exists() and young_orphan.exists()
+
+
+def test_reconcile_throttles_to_the_configured_rate(tmp_path):
+    engine, objects = _store(tmp_path)
+    for index in range(4):
+        _put(engine, objects, f"obj-{index}", b"payload")
+    slept = []
+    reconciler = ObjectReconciler(engine, objects, batch_size=2, max_ops_per_second=2,
+                                  clock=lambda: 0.0, sleep=slept.append)
+    reconciler.run()
+    assert slept == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_rows_written_under_another_mount_still_match_by_file_name(tmp_path):
+    engine, objects = _store(tmp_path)
+    for index in range(4):
+        target = _put(engine, objects, f"obj-{index}", b"payload")
+        os.utime(target, (time.time() - 7200,) * 2)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE objects SET path = '/old/mount/objects/' || substr(path, length(path) - 63)"))
+
+    report = ObjectReconciler(engine, objects, batch_size=2).run(delete_orphans=True)
+
+    assert report.missing_files == 0 and report.orphan_files == 0
+    assert len(list(objects.iterdir())) == 4
+
+
+def test_deletion_is_refused_when_a_whole_batch_is_unknown(tmp_path):
+    engine, objects = _store(tmp_path)
+    _put(engine, objects, "listed", b"x", file=False)
+    for index in range(3):
+        target = _put(engine, objects, f"unlisted-{index}", b"y", row=False)
+        os.utime(target, (time.time() - 7200,) * 2)
+
+    report = ObjectReconciler(engine, objects, batch_size=3).run(delete_orphans=True)
+
+    assert report.deletion_refused and report.orphan_files == 3 and report.deleted_orphans == 0
+    assert len(list(objects.iterdir())) == 3
@@ -0,0 +1,61 @@
+from src.readiness import ReadinessMonitor
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_probes_answer_from_cache_until_the_interval_passes():
+    calls = []
+    clock = Clock()
+    monitor = ReadinessMonitor({"database": lambda: calls.append("db")}, interval_seconds=5, clock=clock)
+
+    first = monitor.status()
+    clock.now += 1
+    second = monitor.status()
+
+    assert calls == ["db"]
+    assert first["ready"] and second["ready"]
+    assert second["age_seconds"] == 1.0
+    assert set(second["checks"]["database"]) == {"ok", "latency_ms"}
+
+    clock.now += 5
+    monitor.status()
+    assert calls == ["db", "db"]
+
+
+def test_failing_check_reports_type_only_and_not_ready():
+    def database():
+        raise ConnectionError("postgresql://user:secret@db/storage refused")
+
+    monitor = ReadinessMonitor({"database": database, "objects_dir": lambda: None}, clock=Clock())
+
+    status = monitor.status()
+
+    assert status["ready"] is False
+    assert status["checks"]["database"]["ok"] is False
+    assert status["checks"]["database"]["error"] == "ConnectionError"
+    assert status["checks"]["objects_dir"]["ok"] is True
+    assert "secret" not in str(status)
+
+
+def test_background_refresh_serves_probes_and_stale_results_are_not_ready():
+    calls = []
+    clock = Clock()
+    monitor = ReadinessMonitor({"database": lambda: calls.append("db")}, interval_seconds=60,
+                               stale_after_seconds=10, clock=clock)
+    monitor.start()
+    try:
+        assert monitor.status()["ready"]
+        clock.now += 30
+        status = monitor.status()
+    finally:
+        monitor.stop()
+
+    # The refresher owns refreshing while it runs, so a stalled refresher shows up as stale.
+    assert calls == ["db"]
+    assert status["stale"] is True and status["ready"] is False
@@ -0,0 +1,36 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from src.request_metrics import RequestMetricsMiddleware, RouteMetrics
+
+
+def _client():
+    metrics = RouteMetrics(buckets=(0.1, 1.0))
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(RequestMetricsMiddleware, metrics=metrics)
+    return TestClient(app), metrics
+
+
+def test_latency_status_and_in_flight_use_route_templates():
+    client, metrics = _client()
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/items/missing")
+    client.get("/nowhere")
+
+    rendered = "\n".join(metrics.render())
+    labels = 'method="GET",route="/items/{item_id}"'
+    assert f'unison_storage_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in rendered
+    assert f'unison_storage_request_duration_seconds_count{{{labels}}} 3' in rendered
+    assert f'unison_storage_responses_total{{{labels},status="200"}} 2' in rendered
+    assert f'unison_storage_responses_total{{{labels},status="404"}} 1' in rendered
+    assert 'unison_storage_responses_total{method="GET",route="unmatched",status="404"} 1' in rendered
+    assert f'unison_storage_requests_in_flight{{{labels}}} 0' in rendered
+    assert "/items/a" not in rendered
@@ -0,0 +1,89 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.request_profiler import PROFILE_HEADER, RequestProfiler, RequestProfilerMiddleware, namespace_hash
+
+
+def _busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def _client(tmp_path):
+    saved = []
+    app = FastAPI()
+
+    @app.get("/slow/{item_id}")
+    def slow(item_id: str):
+        _busy_work(0.05)
+        return {"id": item_id}
+
+    profiler = RequestProfiler(tmp_path, "s3cret", interval_seconds=0.001,
+                               on_saved=lambda path, samples: saved.append((path, samples)))
+    app.add_middleware(RequestProfilerMiddleware, profiler=profiler, namespace=lambda scope: "ns-alice")
+    return TestClient(app), saved
+
+
+def test_trusted_header_profiles_one_request_to_folded_file(tmp_path):
+    client, saved = _client(tmp_path)
+
+    response = client.get("/slow/a", headers={"X-Unison-Profile": "s3cret"})
+
+    assert response.status_code == 200
+    (path, samples), = saved
+    assert response.headers[PROFILE_HEADER.decode()] == path.name
+    assert "GET_slow_item_id" in path.name and path.name.endswith(f"-{namespace_hash('ns-alice')}.folded")
+    assert "ns-alice" not in path.name
+    assert samples > 0
+    assert "_busy_work" in path.read_text(encoding="utf-8")
+
+
+def test_missing_or_wrong_token_is_not_profiled(tmp_path):
+    client, saved = _client(tmp_path)
+
+    plain = client.get("/slow/a")
+    forged = client.get("/slow/a", headers={"X-Unison-Profile": "guess"})
+
+    assert PROFILE_HEADER.decode() not in plain.headers
+    assert PROFILE_HEADER.decode() not in forged.headers
+    assert saved == [] and list(tmp_path.iterdir()) == []
+
+
+def test_window_mode_samples_in_background_and_refuses_overlap(tmp_path):
+    client, saved = _client(tmp_path)
+    headers = {"X-Unison-Profile": "s3cret", "X-Unison-Profile-Window": "0.2"}
+
+    started = client.get("/slow/a", headers=headers)
+    overlapping = client.get("/slow/b", headers={"X-Unison-Profile": "s3cret"})
+
+    assert "-window-" in started.headers[PROFILE_HEADER.decode()]
+    assert overlapping.headers[PROFILE_HEADER.decode()] == "busy"
+    deadline = time.monotonic() + 5
+    while not saved and time.monotonic() < deadline:
+        time.sleep(0.02)
+    (path, _), = saved
+    assert path.name == started.headers[PROFILE_HEADER.decode()]
+    assert path.exists()
+
+
+def test_failed_namespace_lookup_releases_the_profiler(tmp_path):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    def namespace(scope):
+        raise RuntimeError("principal lookup failed")
+
+    profiler = RequestProfiler(tmp_path, "s3cret", interval_seconds=0.001)
+    app.add_middleware(RequestProfilerMiddleware, profiler=profiler, namespace=namespace)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    assert client.get("/ping", headers={"X-Unison-Profile": "s3cret"}).status_code == 500
+    capture = profiler.begin()
+    assert capture is not None
+    profiler.abandon(capture)
@@ -0,0 +1,40 @@
+import multiprocessing
+import os
+
+from src.shared_metrics import MmapValues, SharedValues
+
+
+def _worker(directory, count):
+    values = SharedValues(directory)
+    for _ in range(count):
+        values.inc(("requests", "/kv"))
+    values.inc(("in_flight", "/kv"), 1, live=True)
+
+
+def test_worker_processes_aggregate_on_scrape_and_dead_workers_drop_live_gauges(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_worker, args=(tmp_path, 500)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    scraper = SharedValues(tmp_path)
+    scraper.inc(("in_flight", "/kv"), 2, live=True)
+
+    snapshot = scraper.snapshot()
+
+    assert snapshot[("requests", "/kv")] == 1500
+    assert snapshot[("in_flight", "/kv")] == 2
+
+
+def test_mmap_file_grows_and_reopens_existing_slots(tmp_path):
+    path = tmp_path / f"counter_{os.getpid()}.db"
+    values = MmapValues(path, initial_size=64)
+    for index in range(200):
+        values.add(f"series-{index}", index)
+    values.add("series-7", 1)
+    values.close()
+    reopened = MmapValues(path)
+    reopened.add("series-7", 1)
+    assert MmapValues.read(path)["series-7"] == 9
+    assert len(MmapValues.read(path)) == 200
@@ -0,0 +1,206 @@
+import json
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+from src.source_store import SCHEMA, SourceShards, SourceStore, person_shard
+
+
+def _source(source_id, filename="a.txt", checksum="c1", version=1, state="quarantined", person_id="person-a"):
+    return {"source_id": source_id, "person_id": person_id, "import_session_id": "imp_1", "filename": filename,
+            "checksum_sha256": checksum, "state": state, "version": version}
+
+
+def test_duplicate_and_prior_lookups_use_person_indexes(tmp_path):
+    store = SourceStore(tmp_path / "index.sqlite3")
+    with store.transaction() as tx:
+        tx.put_source(_source("src_1"))
+        tx.put_source(_source("src_2", checksum="c2", version=2))
+        tx.put_source(_source("src_3", checksum="c3", version=3, state="deleted"))
+
+    with store.read() as tx:
+        assert tx.find_source("person-a", checksum_sha256="c2")["source_id"] == "src_2"
+        assert tx.find_source("person-a", checksum_sha256="c3") is None
+        assert tx.find_source("person-a", filename="a.txt")["source_id"] == "src_2"
+        plans = [
+            " ".join(row[3] for row in tx.conn.execute(f"EXPLAIN QUERY PLAN {query}", ("person-a", "x")))
+            for query in (
+                "SELECT document FROM sources WHERE person_id=? AND checksum_sha256=? AND state != 'deleted'"
+                " ORDER BY rowid LIMIT 1",
+                "SELECT document FROM sources WHERE person_id=? AND filename=? AND state != 'deleted'"
+                " ORDER BY version DESC LIMIT 1",
+            )
+        ]
+    assert "sources_person_checksum_idx" in plans[0]
+    assert "sources_person_filename_idx" in plans[1] and "TEMP B-TREE" not in plans[1]
+
+
+def test_filtered_source_pages_are_served_from_person_indexes(tmp_path):
+    store = SourceStore(tmp_path / "index.sqlite3")
+    with store.transaction() as tx:
+        for index in range(6):
+            tx.put_source({**_source(f"src_{index}", checksum=f"c{index}"), "media_type": "text/plain",
+                           "space_id": "private-a", "created_at": float(index)})
+
+    with store.read() as tx:
+        after_two = tx.page_sources("person-a", after=2, limit=2, media_type="text/plain")
+        plans = {
+            column: " ".join(row[3] for row in tx.conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT rowid, document FROM sources WHERE person_id=? AND state != 'deleted'"
+                f" AND rowid > ? AND {column}=? ORDER BY rowid LIMIT ?", ("person-a", 0, "x", 10)))
+            for column in ("state", "media_type", "space_id", "classification")
+        }
+    assert [source["source_id"] for _, source in after_two] == ["src_2", "src_3"]
+    for column, plan in plans.items():
+        assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, (column, plan)
+
+
+def test_older_schema_is_upgraded_in_place(tmp_path):
+    path = tmp_path / "index.sqlite3"
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA[0]:
+        conn.execute(statement)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    store = SourceStore(path)
+
+    with store.read() as tx:
+        indexes = {name for (name,) in tx.conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert tx.conn.execute("PRAGMA user_version").fetchone()[0] == len(SCHEMA)
+    assert {"sources_person_checksum_idx", "sources_person_filename_idx"} <= indexes
+
+
+def test_search_index_and_listing_columns_are_filled_for_rows_stored_before_them(tmp_path):
+    path = tmp_path / "index.sqlite3"
+    conn = sqlite3.connect(path)
+    for statements in SCHEMA[:4]:
+        for statement in statements:
+            conn.execute(statement)
+    source = {**_source("src_1"), "media_type": "text/plain", "space_id": "private-a", "created_at": 5.0}
+    conn.execute("INSERT INTO sources (source_id, person_id, session_id, filename, checksum_sha256, state, version,"
+                 " document) VALUES ('src_1', 'person-a', 'imp_1', 'a.txt', 'c1', 'quarantined', 1, ?)",
+                 (json.dumps(source),))
+    fields = [{"field_id": "fld_text", "value": "Insurance renewal notice", "corrected_value": None},
+              {"field_id": "fld_fixed", "value": "Insurence", "corrected_value": "Insurance policy"},
+              {"field_id": "fld_table", "value": [["renewal"]], "corrected_value": None}]
+    conn.executemany("INSERT INTO fields (source_id, position, field_id, document) VALUES ('src_1', ?, ?, ?)",
+                     [(position, field["field_id"], json.dumps(field)) for position, field in enumerate(fields)])
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    conn.close()
+
+    store = SourceStore(path)
+
+    with store.read() as tx:
+        renewal = tx.search_fields("person-a", '"renewal"', 10, 0, ("[", "]"))
+        insurance = tx.search_fields("person-a", '"insurance"', 10, 0, ("[", "]"))
+        listed = tx.page_sources("person-a", media_type="text/plain", space_id="private-a", created_after=5.0)
+    assert [(field["field_id"], highlighted) for field, _, _, _, highlighted in renewal] == [
+        ("fld_text", "Insurance [renewal] notice")]
+    assert {field["field_id"] for field, *_ in insurance} == {"fld_text", "fld_fixed"}
+    assert [source["source_id"] for _, source in listed] == ["src_1"]
+
+
+def test_each_person_gets_a_lazily_opened_shard_in_a_bounded_lru(tmp_path):
+    shards = SourceShards(tmp_path, max_open=2)
+
+    assert shards.for_person("person-a", create=False) is None
+    assert not (tmp_path / person_shard("person-a")).exists()
+    first = shards.for_person("person-a")
+    with first.transaction() as tx:
+        tx.put_source(_source("src_a"))
+    for person in ("person-b", "person-c"):
+        with shards.for_person(person).transaction() as tx:
+            tx.put_source(_source(f"src_{person}", person_id=person))
+
+    assert shards.open_count() == 2
+    assert (tmp_path / person_shard("person-a") / "source-index.sqlite3").exists()
+    # The evicted store's connection was closed; holding on to it still works without pooling again.
+    with first.read() as tx:
+        assert [source["source_id"] for source in tx.sources("person-a")] == ["src_a"]
+    assert first._idle == []
+    with shards.for_person("person-b").read() as tx:
+        assert tx.source("src_a") is None
+    # Reopening the shard hands back the held store, so there is one write lock per file.
+    assert shards.for_person("person-a") is first
+    with first.read() as tx:
+        assert tx.source("src_a") is not None
+    assert len(first._idle) == 1 and shards.open_count() == 2
+
+
+def test_unsharded_store_is_split_per_person_and_removed(tmp_path):
+    unsharded = SourceStore(tmp_path / "source-index.sqlite3")
+    with unsharded.transaction() as tx:
+        for person in ("person-a", "person-b"):
+            tx.put_session({"session_id": f"imp_{person}", "person_id": person, "state": "preview"})
+            tx.put_source({**_source(f"src_{person}", person_id=person), "import_session_id": f"imp_{person}"})
+            tx.put_fields(f"src_{person}", [{"field_id": "fld_1", "source_id": f"src_{person}"}])
+    unsharded.close()
+
+    shards = SourceShards(tmp_path)
+
+    assert not (tmp_path / "source-index.sqlite3").exists()
+    for person in ("person-a", "person-b"):
+        store = shards.for_session(f"imp_{person}")
+        assert store is shards.for_person(person)
+        with store.read() as tx:
+            assert tx.session_source_ids(f"imp_{person}") == [f"src_{person}"]
+            assert tx.fields(f"src_{person}") == [{"field_id": "fld_1", "source_id": f"src_{person}"}]
+            assert [source["person_id"] for source in tx.sources(person)] == [person]
+
+
+def test_extraction_cache_evicts_least_recently_used_and_replaces_old_processor_versions(tmp_path):
+    store = SourceStore(tmp_path / "index.sqlite3")
+    field = [{"field_id": "_text", "value": "x" * 100}]
+    with store.transaction() as tx:
+        tx.put_cached_fields("c1", "ocr+1", field, max_bytes=300)
+        tx.put_cached_fields("c2", "ocr+1", field, max_bytes=300)
+        assert tx.cached_fields("c1", "ocr+1") == field
+        tx.put_cached_fields("c3", "ocr+1", field, max_bytes=300)
+        assert tx.cached_fields("c2", "ocr+1") is None
+        tx.put_cached_fields("c1", "ocr+2", field, max_bytes=300)
+        assert tx.cached_fields("c1", "ocr+1") is None
+        assert [row[0] for row in tx.conn.execute("SELECT checksum_sha256 FROM extractions ORDER BY 1")] == ["c1", "c3"]
+
+
+def test_commits_append_to_the_journal_and_close_compacts_it(tmp_path):
+    store = SourceStore(tmp_path / "index.sqlite3", checkpoint_pages=10_000)
+    wal = tmp_path / "index.sqlite3-wal"
+    with store.transaction() as tx:
+        tx.put_source(_source("src_1"))
+        assert tx.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert tx.conn.execute("PRAGMA wal_autocheckpoint").fetchone()[0] == 10_000
+    size = wal.stat().st_size
+    with store.transaction() as tx:
+        tx.put_source(_source("src_2", checksum="c2"))
+    assert wal.stat().st_size > size
+
+    store.close()
+
+    assert not wal.exists() or wal.stat().st_size == 0
+    with SourceStore(tmp_path / "index.sqlite3").read() as tx:
+        assert [source["source_id"] for source in tx.sources("person-a")] == ["src_1", "src_2"]
+
+
+def test_committed_journal_is_replayed_after_a_crash(tmp_path):
+    # The child commits and exits without closing or checkpointing, as a killed worker would.
+    script = """
+import os, sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+from source_store import SourceStore
+store = SourceStore(Path(sys.argv[2]), checkpoint_pages=10_000)
+with store.transaction() as tx:
+    tx.put_source({"source_id": "src_1", "person_id": "person-a", "import_session_id": "imp_1",
+                   "filename": "a.txt", "checksum_sha256": "c1", "state": "quarantined", "version": 1})
+os._exit(0)
+"""
+    src = Path(__file__).resolve().parents[1] / "src"
+    subprocess.run([sys.executable, "-c", script, str(src), str(tmp_path / "index.sqlite3")], check=True)
+    assert (tmp_path / "index.sqlite3-wal").stat().st_size > 0
+
+    with SourceStore(tmp_path / "index.sqlite3").read() as tx:
+        assert tx.source("src_1")["checksum_sha256"] == "c1"
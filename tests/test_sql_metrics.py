@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, text
+
+from src.sql_metrics import StatementMetrics, instrument_engine
+
+
+class RecordingSpan:
+    def __init__(self, name, attributes):
+        self.name, self.attributes, self.ended = name, dict(attributes), False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.attributes["exception"] = type(exc).__name__
+
+    def end(self):
+        self.ended = True
+
+
+class RecordingTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes):
+        self.spans.append(RecordingSpan(name, attributes))
+        return self.spans[-1]
+
+
+def test_statements_are_timed_by_template_traced_and_slow_logged():
+    engine = create_engine("sqlite://", future=True)
+    metrics, tracer, slow = StatementMetrics(), RecordingTracer(), []
+    instrument_engine(engine, metrics, slow_threshold_seconds=0, on_slow=lambda *args: slow.append(args),
+                      tracer=tracer)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE kv (ns TEXT, key TEXT, value TEXT)"))
+        for key in ("a", "b"):
+            conn.execute(text("INSERT INTO kv VALUES (:ns,\n  :key, :val)"), {"ns": "n", "key": key, "val": "1"})
+        conn.execute(text("SELECT * FROM kv")).fetchall()
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            pass
+
+    rendered = "\n".join(metrics.render())
+    assert 'unison_storage_sql_duration_seconds_count{statement="INSERT INTO kv VALUES (?, ?, ?)"} 2' in rendered
+    assert 'unison_storage_sql_rows_total{statement="INSERT INTO kv VALUES (?, ?, ?)"} 2' in rendered
+    assert 'unison_storage_sql_duration_seconds_count{statement="SELECT * FROM kv"} 1' in rendered
+    assert 'unison_storage_sql_rows_total{statement="SELECT * FROM kv"}' not in rendered
+    assert "db.row_count" not in tracer.spans[3].attributes
+    assert 'unison_storage_sql_errors_total{statement="SELECT * FROM missing_table"} 1' in rendered
+    assert all(span.ended for span in tracer.spans)
+    assert tracer.spans[1].name == "sql INSERT" and tracer.spans[1].attributes["db.system"] == "sqlite"
+    assert slow and "'a'" not in rendered